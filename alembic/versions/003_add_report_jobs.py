@@ -0,0 +1,54 @@
+"""Add report jobs queue
+
+Revision ID: 003_report_jobs
+Revises: 002_separate_tests
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '003_report_jobs'
+down_revision = '002_separate_tests'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Таблица очереди задач генерации отчетов
+    op.create_table(
+        'report_jobs',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('telegram_id', sa.Integer(), nullable=False),
+        sa.Column('report_type', sa.String(20), nullable=False),
+        sa.Column('status', sa.Enum('QUEUED', 'RUNNING', 'COMPLETED', 'FAILED', name='reportjobstatus'), nullable=False),
+        sa.Column('priority', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('max_attempts', sa.Integer(), nullable=False, server_default='1'),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('worker_id', sa.String(100), nullable=True),
+        sa.Column('lease_expires_at', sa.DateTime(), nullable=True),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_report_jobs_id', 'report_jobs', ['id'])
+    op.create_index('ix_report_jobs_telegram_id', 'report_jobs', ['telegram_id'])
+    op.create_index('ix_report_jobs_status_priority', 'report_jobs', ['status', 'priority', 'created_at'])
+    # Не больше одной активной задачи на пользователя и тип отчета
+    op.create_index(
+        'ux_report_jobs_active', 'report_jobs', ['telegram_id', 'report_type'], unique=True,
+        sqlite_where=sa.text("status IN ('QUEUED', 'RUNNING')"),
+        postgresql_where=sa.text("status IN ('QUEUED', 'RUNNING')")
+    )
+
+
+def downgrade():
+    op.drop_index('ux_report_jobs_active', table_name='report_jobs')
+    op.drop_index('ix_report_jobs_status_priority', table_name='report_jobs')
+    op.drop_index('ix_report_jobs_telegram_id', table_name='report_jobs')
+    op.drop_index('ix_report_jobs_id', table_name='report_jobs')
+    op.drop_table('report_jobs')
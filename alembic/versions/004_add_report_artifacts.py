@@ -0,0 +1,100 @@
+"""Add report artifacts registry
+
+Revision ID: 004_report_artifacts
+Revises: 003_report_jobs
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import hashlib
+import re
+from datetime import datetime
+from pathlib import Path
+
+
+# revision identifiers, used by Alembic.
+revision = '004_report_artifacts'
+down_revision = '003_report_jobs'
+branch_labels = None
+depends_on = None
+
+# prizma_report_{telegram_id}_{YYYYmmdd}_{HHMMSS}[_{suffix}].pdf / prizma_premium_report_...
+REPORT_FILENAME_RE = re.compile(r'^prizma_(premium_)?report_(\d+)_(\d{8}_\d{6})(?:_[0-9a-f]+)?\.pdf$')
+
+
+def upgrade():
+    op.create_table(
+        'report_artifacts',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('kind', sa.String(20), nullable=False),
+        sa.Column('path', sa.String(500), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=True),
+        sa.Column('sha256', sa.String(64), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('test_completed_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_report_artifacts_id', 'report_artifacts', ['id'])
+    op.create_index('ix_report_artifacts_user_kind_created', 'report_artifacts', ['user_id', 'kind', 'created_at'])
+
+    # Регистрируем уже существующие PDF отчеты из папки reports
+    reports_dir = Path("reports")
+    if not reports_dir.exists():
+        return
+
+    connection = op.get_bind()
+    users_table = sa.table(
+        'users',
+        sa.column('id', sa.Integer),
+        sa.column('telegram_id', sa.Integer),
+        sa.column('test_completed_at', sa.DateTime),
+    )
+    users = {
+        row.telegram_id: (row.id, row.test_completed_at)
+        for row in connection.execute(sa.select(users_table))
+    }
+
+    artifacts = sa.table(
+        'report_artifacts',
+        sa.column('user_id', sa.Integer),
+        sa.column('kind', sa.String),
+        sa.column('path', sa.String),
+        sa.column('size', sa.Integer),
+        sa.column('sha256', sa.String),
+        sa.column('created_at', sa.DateTime),
+        sa.column('test_completed_at', sa.DateTime),
+    )
+
+    rows = []
+    for report_file in reports_dir.glob("prizma_*report_*.pdf"):
+        match = REPORT_FILENAME_RE.match(report_file.name)
+        if not match:
+            continue
+        user = users.get(int(match.group(2)))
+        if not user:
+            continue
+
+        sha256 = hashlib.sha256()
+        with open(report_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha256.update(chunk)
+
+        rows.append({
+            'user_id': user[0],
+            'kind': 'premium' if match.group(1) else 'free',
+            'path': str(report_file),
+            'size': report_file.stat().st_size,
+            'sha256': sha256.hexdigest(),
+            'created_at': datetime.strptime(match.group(3), "%Y%m%d_%H%M%S"),
+            'test_completed_at': user[1],
+        })
+
+    if rows:
+        op.bulk_insert(artifacts, rows)
+
+
+def downgrade():
+    op.drop_index('ix_report_artifacts_user_kind_created', table_name='report_artifacts')
+    op.drop_index('ix_report_artifacts_id', table_name='report_artifacts')
+    op.drop_table('report_artifacts')
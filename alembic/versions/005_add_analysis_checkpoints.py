@@ -0,0 +1,40 @@
+"""Add premium analysis checkpoints
+
+Revision ID: 005_analysis_checkpoints
+Revises: 004_report_artifacts
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '005_analysis_checkpoints'
+down_revision = '004_report_artifacts'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Сохраненные разделы платного анализа для продолжения после сбоя
+    op.create_table(
+        'analysis_checkpoints',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('answers_hash', sa.String(64), nullable=False),
+        sa.Column('section_key', sa.String(50), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_analysis_checkpoints_id', 'analysis_checkpoints', ['id'])
+    op.create_index(
+        'ix_analysis_checkpoints_user_hash_section', 'analysis_checkpoints',
+        ['user_id', 'answers_hash', 'section_key'], unique=True
+    )
+
+
+def downgrade():
+    op.drop_index('ix_analysis_checkpoints_user_hash_section', table_name='analysis_checkpoints')
+    op.drop_index('ix_analysis_checkpoints_id', table_name='analysis_checkpoints')
+    op.drop_table('analysis_checkpoints')
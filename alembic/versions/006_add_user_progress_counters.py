@@ -0,0 +1,50 @@
+"""Add denormalized user progress counters
+
+Revision ID: 006_progress_counters
+Revises: 005_analysis_checkpoints
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '006_progress_counters'
+down_revision = '005_analysis_checkpoints'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Счетчики ответов и последний отвеченный вопрос по версиям теста
+    op.add_column('users', sa.Column('free_answers_count', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('users', sa.Column('premium_answers_count', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('users', sa.Column('last_free_answered_question_id', sa.Integer(), nullable=True))
+    op.add_column('users', sa.Column('last_premium_answered_question_id', sa.Integer(), nullable=True))
+
+    # Заполняем счетчики по уже сохраненным ответам
+    for version in ('free', 'premium'):
+        op.execute(f"""
+            UPDATE users SET
+                {version}_answers_count = (
+                    SELECT COUNT(*) FROM answers
+                    JOIN questions ON questions.id = answers.question_id
+                    WHERE answers.user_id = users.id AND questions.test_version = '{version}'
+                ),
+                last_{version}_answered_question_id = (
+                    SELECT questions.id FROM answers
+                    JOIN questions ON questions.id = answers.question_id
+                    WHERE answers.user_id = users.id AND questions.test_version = '{version}'
+                    ORDER BY questions.order_number DESC
+                    LIMIT 1
+                )
+        """)
+
+
+def downgrade():
+    # Удаляем добавленные колонки
+    op.drop_column('users', 'last_premium_answered_question_id')
+    op.drop_column('users', 'last_free_answered_question_id')
+    op.drop_column('users', 'premium_answers_count')
+    op.drop_column('users', 'free_answers_count')
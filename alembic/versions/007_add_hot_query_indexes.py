@@ -0,0 +1,45 @@
+"""Add indexes for hot query paths
+
+Revision ID: 007_hot_query_indexes
+Revises: 006_progress_counters
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '007_hot_query_indexes'
+down_revision = '006_progress_counters'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Ответы пользователя и join с questions для фильтра по версии теста
+    op.create_index('ix_answers_user_question', 'answers', ['user_id', 'question_id'])
+    
+    # Частичный индекс: в фоновой проверке нужны только запущенные таймеры
+    op.create_index(
+        'ix_users_special_offer_started_at', 'users', ['special_offer_started_at'],
+        sqlite_where=sa.text('special_offer_started_at IS NOT NULL'),
+        postgresql_where=sa.text('special_offer_started_at IS NOT NULL')
+    )
+    
+    # Статусы генерации отчетов
+    op.create_index('ix_users_free_report_status', 'users', ['free_report_status'])
+    op.create_index('ix_users_premium_report_status', 'users', ['premium_report_status'])
+    
+    # Платежи: по пользователю и по статусу
+    op.create_index('ix_payments_user_status', 'payments', ['user_id', 'status'])
+    op.create_index('ix_payments_status_user', 'payments', ['status', 'user_id'])
+
+
+def downgrade():
+    op.drop_index('ix_payments_status_user', table_name='payments')
+    op.drop_index('ix_payments_user_status', table_name='payments')
+    op.drop_index('ix_users_premium_report_status', table_name='users')
+    op.drop_index('ix_users_free_report_status', table_name='users')
+    op.drop_index('ix_users_special_offer_started_at', table_name='users')
+    op.drop_index('ix_answers_user_question', table_name='answers')
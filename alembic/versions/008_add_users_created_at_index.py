@@ -0,0 +1,24 @@
+"""Add users (created_at, id) index for admin pagination
+
+Revision ID: 008_users_created_at_index
+Revises: 007_hot_query_indexes
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '008_users_created_at_index'
+down_revision = '007_hot_query_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Список пользователей в админке: сортировка и курсор по (created_at, id)
+    op.create_index('ix_users_created_at_id', 'users', ['created_at', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_users_created_at_id', table_name='users')
@@ -0,0 +1,29 @@
+"""Backfill NULL users.created_at for admin keyset pagination
+
+Revision ID: 009_backfill_users_created_at
+Revises: 008_users_created_at_index
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '009_backfill_users_created_at'
+down_revision = '008_users_created_at_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Строки без created_at не попадают в пагинацию по ключу (created_at, id):
+    # сравнение с NULL ложно. Берем ближайшую известную дату пользователя.
+    op.execute(
+        "UPDATE users SET created_at = COALESCE(updated_at, test_started_at, CURRENT_TIMESTAMP) "
+        "WHERE created_at IS NULL"
+    )
+
+
+def downgrade():
+    # Исходные NULL не восстановить - данные остаются заполненными
+    pass
@@ -14,6 +14,21 @@ DATABASE_DIR.mkdir(exist_ok=True)
 # Конфигурация базы данных
 DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite+aiosqlite:///{DATABASE_DIR}/bot.db")
 
+# Пул соединений и режим SQLite
+DB_POOL_MODE = os.getenv("DB_POOL_MODE", "queue").lower()  # queue - пул соединений, null - новое соединение на каждую сессию
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))  # Постоянных соединений в пуле
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))  # Дополнительных соединений при пиковой нагрузке
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # Ожидание свободного соединения, секунд
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")  # WAL: читатели не блокируют писателя
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # NORMAL безопасен в режиме WAL
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))  # Ожидание блокировки вместо "database is locked"
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "20000"))  # Кэш страниц на соединение
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # Размер memory-mapped I/O, байт
+
+# Кэш пользователей по telegram_id в DatabaseService
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "5"))  # Время жизни записи (0 - кэш отключен)
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "2048"))  # Максимум пользователей в кэше
+
 # Telegram Bot (для Mini App - не обязательно)
 # BOT_TOKEN = os.getenv("BOT_TOKEN")
 
@@ -21,6 +36,16 @@ DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite+aiosqlite:///{DATABASE_DIR}/bo
 PERPLEXITY_API_KEY = os.getenv("PERPLEXITY_API_KEY")
 PERPLEXITY_MODEL = os.getenv("PERPLEXITY_MODEL", "sonar-pro")
 PERPLEXITY_ENABLED = os.getenv("PERPLEXITY_ENABLED", "false").lower() == "true"
+PERPLEXITY_TIMEOUT_SECONDS = float(os.getenv("PERPLEXITY_TIMEOUT_SECONDS", "600"))  # Таймаут ответа API (длинные премиум разделы)
+PERPLEXITY_CONNECT_TIMEOUT_SECONDS = float(os.getenv("PERPLEXITY_CONNECT_TIMEOUT_SECONDS", "10"))  # Таймаут установки соединения
+PERPLEXITY_MAX_CONNECTIONS = int(os.getenv("PERPLEXITY_MAX_CONNECTIONS", "20"))  # Максимум одновременных соединений к API
+PERPLEXITY_MAX_KEEPALIVE = int(os.getenv("PERPLEXITY_MAX_KEEPALIVE", "10"))  # Сколько соединений держать открытыми
+PERPLEXITY_KEEPALIVE_EXPIRY = float(os.getenv("PERPLEXITY_KEEPALIVE_EXPIRY", "60"))  # Время жизни простаивающего соединения
+PERPLEXITY_HTTP2 = os.getenv("PERPLEXITY_HTTP2", "false").lower() == "true"  # HTTP/2 (нужен пакет h2)
+PERPLEXITY_MAX_CONCURRENCY = int(os.getenv("PERPLEXITY_MAX_CONCURRENCY", "6"))  # Максимум одновременных запросов к API на процесс
+PERPLEXITY_RATE_PER_MINUTE = float(os.getenv("PERPLEXITY_RATE_PER_MINUTE", "50"))  # Квота запросов в минуту
+PERPLEXITY_RATE_BURST = int(os.getenv("PERPLEXITY_RATE_BURST", "5"))  # Сколько запросов можно отправить разом
+PREMIUM_SECTIONS_CONCURRENCY = int(os.getenv("PREMIUM_SECTIONS_CONCURRENCY", "3"))  # Сколько разделов платного отчета генерируется параллельно
 
 # Настройки логирования
 SQL_ECHO = os.getenv("SQL_ECHO", "false").lower() == "true"
@@ -36,6 +61,10 @@ ROBOKASSA_TEST = os.getenv("ROBOKASSA_TEST", "1") == "1"
 FREE_QUESTIONS_LIMIT = int(os.getenv("FREE_QUESTIONS_LIMIT", "8"))  # Количество бесплатных вопросов
 PREMIUM_QUESTIONS_COUNT = int(os.getenv("PREMIUM_QUESTIONS_COUNT", "38"))  # Количество платных вопросов
 
+# Каталог вопросов в памяти
+QUESTIONS_VERSION_FILE = DATABASE_DIR / "questions.version"  # Маркер версии вопросов (обновляет seed_data)
+QUESTION_CATALOG_CHECK_SECONDS = float(os.getenv("QUESTION_CATALOG_CHECK_SECONDS", "5"))  # Как часто проверять маркер версии
+
 # Администраторы бота (список ID через запятую)
 ADMIN_IDS = [int(id.strip()) for id in os.getenv("ADMIN_IDS", "").split(",") if id.strip()]
 
@@ -43,6 +72,24 @@ ADMIN_IDS = [int(id.strip()) for id in os.getenv("ADMIN_IDS", "").split(",") if
 PREMIUM_PRICE_ORIGINAL = float(os.getenv("PREMIUM_PRICE_ORIGINAL", "1.00"))  # Полная цена премиум отчета (тестовая цена)
 PREMIUM_PRICE_DISCOUNT = float(os.getenv("PREMIUM_PRICE_DISCOUNT", "1.00"))  # Цена со скидкой (спецпредложение) (тестовая цена)
 
+# Очередь генерации отчетов
+REPORT_WORKERS_COUNT = int(os.getenv("REPORT_WORKERS_COUNT", "2"))  # Сколько отчетов генерируется одновременно
+REPORT_JOB_LEASE_SECONDS = int(os.getenv("REPORT_JOB_LEASE_SECONDS", "120"))  # Срок аренды задачи без heartbeat
+REPORT_JOB_HEARTBEAT_SECONDS = int(os.getenv("REPORT_JOB_HEARTBEAT_SECONDS", "30"))  # Период продления аренды
+REPORT_JOB_MAX_ATTEMPTS = int(os.getenv("REPORT_JOB_MAX_ATTEMPTS", "2"))  # Максимум попыток на задачу
+REPORT_QUEUE_POLL_SECONDS = float(os.getenv("REPORT_QUEUE_POLL_SECONDS", "2"))  # Период опроса очереди воркером
+REPORT_EVENTS_QUEUE_SIZE = int(os.getenv("REPORT_EVENTS_QUEUE_SIZE", "32"))  # Буфер событий на одно SSE соединение
+REPORT_EVENTS_HEARTBEAT_SECONDS = float(os.getenv("REPORT_EVENTS_HEARTBEAT_SECONDS", "15"))  # Период keep-alive комментариев в SSE
+REPORT_EVENTS_RESYNC_SECONDS = float(os.getenv("REPORT_EVENTS_RESYNC_SECONDS", "300"))  # Сверка статуса без событий (сброс зависших отчетов)
+REPORT_EVENTS_MAX_SECONDS = float(os.getenv("REPORT_EVENTS_MAX_SECONDS", "900"))  # Максимальная длительность SSE соединения (клиент переподключится)
+PAYMENT_STATUS_MAX_WAIT_SECONDS = float(os.getenv("PAYMENT_STATUS_MAX_WAIT_SECONDS", "30"))  # Максимальное ожидание long-poll /payment-status
+REPORT_DOWNLOAD_RETRY_AFTER_SECONDS = int(os.getenv("REPORT_DOWNLOAD_RETRY_AFTER_SECONDS", "15"))  # Retry-After в ответе 202, пока отчет генерируется
+
+# Рендеринг PDF в отдельных процессах
+PDF_RENDER_POOL_SIZE = int(os.getenv("PDF_RENDER_POOL_SIZE", "2"))  # Количество процессов (0 - рендер в потоке)
+PDF_RENDER_TIMEOUT_SECONDS = int(os.getenv("PDF_RENDER_TIMEOUT_SECONDS", "180"))  # Максимальное время рендера одного отчета
+PDF_TEMPLATE_CACHE_MMAP = os.getenv("PDF_TEMPLATE_CACHE_MMAP", "false").lower() == "true"  # Читать шаблоны через mmap вместо копии в памяти
+
 class Settings(BaseSettings):
     # BOT_TOKEN: str  # Не нужен для веб-приложения
     WEBAPP_URL: str = "https://your-domain.com"  # URL вашего веб-приложения
@@ -1,16 +1,56 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import NullPool
-from bot.config import DATABASE_URL, SQL_ECHO
+from sqlalchemy.pool import NullPool, AsyncAdaptedQueuePool
+from sqlalchemy import event
+from bot.config import (
+    DATABASE_URL, SQL_ECHO, DB_POOL_MODE, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+    SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_BUSY_TIMEOUT_MS, SQLITE_CACHE_SIZE_KB, SQLITE_MMAP_SIZE
+)
 from bot.database.models import Base
 from sqlalchemy import text # Добавляем импорт text
 
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Настройки SQLite для каждого нового соединения"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")  # отрицательное значение - в KiB
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.close()
+
+
+def build_engine(database_url: str = DATABASE_URL, pool_mode: str = DB_POOL_MODE):
+    """Создать асинхронный движок.
+
+    pool_mode="queue" - пул соединений (соединение и поток aiosqlite переиспользуются),
+    pool_mode="null" - новое соединение на каждую сессию (прежнее поведение).
+    """
+    if pool_mode == "null":
+        pool_options = {"poolclass": NullPool}
+    else:
+        pool_options = {
+            "poolclass": AsyncAdaptedQueuePool,
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+        }
+
+    new_engine = create_async_engine(
+        database_url,
+        echo=SQL_ECHO,  # Логирование SQL-запросов только если включено
+        **pool_options
+    )
+
+    if new_engine.dialect.name == "sqlite":
+        event.listen(new_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+
+    return new_engine
+
+
 # Создаем асинхронный движок SQLAlchemy
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=SQL_ECHO,  # Логирование SQL-запросов только если включено
-    poolclass=NullPool  # Отключаем пул соединений для SQLite
-)
+engine = build_engine()
 
 # Создаем фабрику сессий
 async_session = sessionmaker(
@@ -27,4 +67,4 @@ async def init_db():
 async def get_session() -> AsyncSession:
     """Получение сессии базы данных"""
     async with async_session() as session:
-        yield session 
\ No newline at end of file
+        yield session
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Enum as SQLEnum
+from sqlalchemy import text, Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Index, Enum as SQLEnum
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -22,8 +22,27 @@ class ReportGenerationStatus(Enum):
     COMPLETED = "COMPLETED"
     FAILED = "FAILED"
 
+class ReportJobStatus(Enum):
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    COMPLETED = "COMPLETED"
+    FAILED = "FAILED"
+
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Фоновая проверка таймеров: только пользователи с запущенным спецпредложением
+        Index(
+            "ix_users_special_offer_started_at", "special_offer_started_at",
+            sqlite_where=text("special_offer_started_at IS NOT NULL"),
+            postgresql_where=text("special_offer_started_at IS NOT NULL")
+        ),
+        # Выборки и подсчеты по статусам генерации отчетов
+        Index("ix_users_free_report_status", "free_report_status"),
+        Index("ix_users_premium_report_status", "premium_report_status"),
+        # Список пользователей в админке: новые сверху, пагинация по ключу (created_at, id)
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     telegram_id = Column(Integer, unique=True, index=True, nullable=False)
@@ -50,6 +69,13 @@ class User(Base):
     current_free_question_id = Column(Integer, nullable=True)
     current_premium_question_id = Column(Integer, nullable=True)
     
+    # Счетчики ответов и последний отвеченный вопрос по версиям теста
+    # (обновляются в одной транзакции со вставкой ответа)
+    free_answers_count = Column(Integer, default=0, nullable=False)
+    premium_answers_count = Column(Integer, default=0, nullable=False)
+    last_free_answered_question_id = Column(Integer, nullable=True)
+    last_premium_answered_question_id = Column(Integer, nullable=True)
+    
     # Статусы генерации отчетов
     free_report_status = Column(SQLEnum(ReportGenerationStatus), default=ReportGenerationStatus.PENDING)
     premium_report_status = Column(SQLEnum(ReportGenerationStatus), default=ReportGenerationStatus.PENDING)
@@ -107,6 +133,10 @@ class Question(Base):
 
 class Answer(Base):
     __tablename__ = "answers"
+    __table_args__ = (
+        # Ответы пользователя (и join с questions по question_id для фильтра test_version)
+        Index("ix_answers_user_question", "user_id", "question_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -134,6 +164,12 @@ class Answer(Base):
 
 class Payment(Base):
     __tablename__ = "payments"
+    __table_args__ = (
+        # Платежи пользователя с фильтром по статусу
+        Index("ix_payments_user_status", "user_id", "status"),
+        # Пользователи с оплатой: status = COMPLETED -> user_id без обращения к таблице
+        Index("ix_payments_status_user", "status", "user_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -180,4 +216,75 @@ class Report(Base):
     generated_at = Column(DateTime, nullable=True)
     
     # Связи
-    user = relationship("User") 
\ No newline at end of file
+    user = relationship("User") 
+
+class ReportArtifact(Base):
+    __tablename__ = "report_artifacts"
+    __table_args__ = (
+        # Поиск последнего отчета пользователя нужного типа
+        Index("ix_report_artifacts_user_kind_created", "user_id", "kind", "created_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    kind = Column(String(20), nullable=False)  # free, premium
+    
+    # Файл отчета
+    path = Column(String(500), nullable=False)
+    size = Column(Integer, nullable=True)  # размер в байтах
+    sha256 = Column(String(64), nullable=True)
+    
+    # Временные метки
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    test_completed_at = Column(DateTime, nullable=True)  # test_completed_at пользователя на момент генерации
+    
+    # Связи
+    user = relationship("User")
+
+class AnalysisCheckpoint(Base):
+    __tablename__ = "analysis_checkpoints"
+    __table_args__ = (
+        # Один сохраненный результат на раздел для набора ответов пользователя
+        Index("ix_analysis_checkpoints_user_hash_section", "user_id", "answers_hash", "section_key", unique=True),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    answers_hash = Column(String(64), nullable=False)  # sha256 ответов, по которым шел анализ
+    section_key = Column(String(50), nullable=False)  # initial, premium_analysis, ...
+    content = Column(Text, nullable=False)  # Текст ответа ИИ или JSON страниц раздела
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ReportJob(Base):
+    __tablename__ = "report_jobs"
+    __table_args__ = (
+        # Выборка следующей задачи воркером: статус -> приоритет -> очередность
+        Index("ix_report_jobs_status_priority", "status", "priority", "created_at"),
+        # Не больше одной активной задачи на пользователя и тип отчета (защита enqueue от гонки)
+        Index(
+            "ux_report_jobs_active", "telegram_id", "report_type", unique=True,
+            sqlite_where=text("status IN ('QUEUED', 'RUNNING')"),
+            postgresql_where=text("status IN ('QUEUED', 'RUNNING')")
+        ),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    telegram_id = Column(Integer, nullable=False, index=True)
+    report_type = Column(String(20), nullable=False)  # free, premium
+    
+    # Состояние задачи
+    status = Column(SQLEnum(ReportJobStatus), default=ReportJobStatus.QUEUED, nullable=False)
+    priority = Column(Integer, default=0, nullable=False)  # Больше - раньше
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=1, nullable=False)
+    error = Column(Text, nullable=True)
+    
+    # Аренда задачи воркером
+    worker_id = Column(String(100), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    
+    # Временные метки
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
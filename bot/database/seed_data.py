@@ -7,6 +7,7 @@
 import asyncio
 import json
 import sys
+from datetime import datetime
 from pathlib import Path
 from sqlalchemy import delete
 
@@ -14,6 +15,7 @@ from sqlalchemy import delete
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
+from bot.config import QUESTIONS_VERSION_FILE
 from bot.database.database import init_db, async_session
 from bot.database.models import Question, QuestionType
 
@@ -95,6 +97,9 @@ async def load_questions():
             
             await session.commit()
             
+            # Обновляем маркер версии - запущенное приложение перечитает каталог вопросов
+            QUESTIONS_VERSION_FILE.write_text(datetime.utcnow().isoformat())
+            
             print("✅ Вопросы успешно загружены!")
             print(f"🆓 Бесплатных (free): {free_count}")
             print(f"💎 Платных (premium): {premium_count}")
@@ -12,9 +12,8 @@ from bot.services.telegram_service import telegram_service
 from bot.config import ADMIN_IDS
 from bot.utils.logger import get_logger
 from bot.database.models import ReportGenerationStatus, User
-from bot.database.database import async_session
-from sqlalchemy import select
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Optional
 import os
 
 logger = get_logger(__name__)
@@ -30,6 +29,33 @@ def is_admin(telegram_id: int) -> bool:
     return telegram_id in ADMIN_IDS
 
 
+# Курсор страницы пользователей: (created_at, id) в base36, чтобы уложиться в 64 байта callback_data
+CURSOR_EPOCH = datetime(1970, 1, 1)
+
+
+def _to_base36(value: int) -> str:
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    result = ""
+    while True:
+        value, remainder = divmod(value, 36)
+        result = digits[remainder] + result
+        if value == 0:
+            return result
+
+
+def encode_user_cursor(user: User) -> Optional[str]:
+    """Курсор по пользователю: created_at в микросекундах и id (None, если created_at не заполнен)"""
+    if user.created_at is None:
+        return None
+    micros = (user.created_at - CURSOR_EPOCH) // timedelta(microseconds=1)
+    return f"{_to_base36(micros)}:{_to_base36(user.id)}"
+
+
+def decode_user_cursor(created_at: str, user_id: str) -> tuple:
+    """(created_at, id) из курсора callback_data"""
+    return CURSOR_EPOCH + timedelta(microseconds=int(created_at, 36)), int(user_id, 36)
+
+
 @router.message(Command("admin"))
 async def cmd_admin(message: Message):
     """Обработка команды /admin"""
@@ -112,10 +138,13 @@ async def admin_all_users(callback: CallbackQuery):
     
     try:
         # Получаем параметры из callback_data
-        # Формат: admin_all_users:page:filter_premium:filter_free_report
+        # Формат: admin_all_users:page:filter_premium:filter_free_report[:direction:cursor_ts:cursor_id]
+        # direction: a - страница после курсора, b - страница перед курсором
         page = 1
         filter_premium = "all"  # all, yes, no
         filter_free_report = "all"  # all, yes, no
+        after = None
+        before = None
         
         if ":" in callback.data:
             parts = callback.data.split(":")
@@ -128,49 +157,33 @@ async def admin_all_users(callback: CallbackQuery):
                 filter_premium = parts[2]
             if len(parts) >= 4:
                 filter_free_report = parts[3]
-        
-        users = await db_service.get_all_users()
-        
-        # Получаем информацию о платежах для определения премиум пользователей
-        async with async_session() as session:
-            from bot.database.models import Payment, PaymentStatus
-            payments_stmt = (
-                select(Payment.user_id)
-                .where(Payment.status == PaymentStatus.COMPLETED)
-                .distinct()
-            )
-            payments_result = await session.execute(payments_stmt)
-            users_with_payments = {row.user_id for row in payments_result.all()}
-        
-        # Применяем фильтры
-        filtered_users = []
-        for user in users:
-            # Определяем, купил ли пользователь премиум (проверяем несколько признаков)
-            has_premium = (
-                user.is_premium_paid or  # Новый способ
-                (user.is_paid and user.id in users_with_payments) or  # Старый способ - есть оплата
-                bool(user.premium_report_path)  # Есть премиум отчет
-            )
-            
-            # Фильтр по премиум
-            if filter_premium == "yes" and not has_premium:
-                continue
-            if filter_premium == "no" and has_premium:
-                continue
-            
-            # Фильтр по бесплатному отчету
-            if filter_free_report == "yes" and not user.free_report_path:
-                continue
-            if filter_free_report == "no" and user.free_report_path:
-                continue
-            
-            filtered_users.append(user)
+            if len(parts) >= 7:
+                try:
+                    cursor = decode_user_cursor(parts[5], parts[6])
+                    if parts[4] == "a":
+                        after = cursor
+                    elif parts[4] == "b":
+                        before = cursor
+                except ValueError:
+                    pass
         
         users_per_page = 5  # Меньше пользователей на страницу из-за подробной информации
-        total_pages = (len(filtered_users) + users_per_page - 1) // users_per_page if filtered_users else 1
+        
+        # Фильтры, сортировка и подсчет - в БД; без курсора (старые кнопки) - по номеру страницы
+        result = await db_service.get_users_page(
+            filter_premium=filter_premium,
+            filter_free_report=filter_free_report,
+            limit=users_per_page,
+            after=after,
+            before=before,
+            offset=0 if (after or before) else (page - 1) * users_per_page
+        )
+        page_items = result["items"]
+        total = result["total"]
+        total_pages = (total + users_per_page - 1) // users_per_page if total else 1
         webapp_url = os.getenv("WEBAPP_URL", "").rstrip("/")
         
-        if not filtered_users:
+        if not page_items:
             text = "👥 <b>Пользователи</b>\n\n"
             if filter_premium != "all" or filter_free_report != "all":
                 text += "Пользователей с выбранными фильтрами не найдено."
@@ -187,7 +200,7 @@ async def admin_all_users(callback: CallbackQuery):
             if filter_free_report != "all":
                 filter_text += f" | Бесп. отчет: {'Есть' if filter_free_report == 'yes' else 'Нет'}"
             
-            text = f"👥 <b>Все пользователи</b>\n\nВсего: {len(filtered_users)} из {len(users)}{filter_text} | Страница {page}/{total_pages}\n\n"
+            text = f"👥 <b>Все пользователи</b>\n\nВсего: {total} из {result['total_all']}{filter_text} | Страница {page}/{total_pages}\n\n"
             
             # Функция для форматирования даты
             def format_date(dt):
@@ -220,130 +233,98 @@ async def admin_all_users(callback: CallbackQuery):
                 except:
                     return "—"
             
-            # Вычисляем диапазон пользователей для текущей страницы
+            # Номер первого пользователя на странице
             start_idx = (page - 1) * users_per_page
-            end_idx = start_idx + users_per_page
-            page_users = filtered_users[start_idx:end_idx]
             
-            # Получаем количество ответов и информацию о платежах для всех пользователей на странице
-            async with async_session() as session:
-                from bot.database.models import Answer, Payment, PaymentStatus
-                from sqlalchemy import func
+            # Показываем пользователей текущей страницы
+            for i, (user, has_premium) in enumerate(page_items, start=start_idx + 1):
+                # Количество ответов - из счетчиков пользователя
+                answers_count = db_service.get_answer_counts(user)["total"]
                 
-                # Получаем ID пользователей на странице
-                user_ids = [user.id for user in page_users]
+                text += f"<b>{i}. ID: <code>{user.telegram_id}</code></b>"
+                if user.first_name:
+                    text += f" ({user.first_name}"
+                    if user.last_name:
+                        text += f" {user.last_name}"
+                    text += ")"
+                if user.username:
+                    text += f" @{user.username}"
+                text += "\n"
                 
-                # Получаем количество ответов для всех пользователей одним запросом
-                answers_count_stmt = (
-                    select(Answer.user_id, func.count(Answer.id).label('count'))
-                    .where(Answer.user_id.in_(user_ids))
-                    .group_by(Answer.user_id)
-                )
-                answers_count_result = await session.execute(answers_count_stmt)
-                answers_counts = {row.user_id: row.count for row in answers_count_result.all()}
+                # Дата регистрации
+                reg_date = format_date(user.created_at)
+                text += f"   📅 Регистрация: {reg_date}"
+                if user.created_at:
+                    text += f" ({format_relative_time(user.created_at)})"
+                text += "\n"
                 
-                # Получаем информацию о завершенных платежах для определения премиум пользователей
-                payments_stmt = (
-                    select(Payment.user_id)
-                    .where(
-                        Payment.user_id.in_(user_ids),
-                        Payment.status == PaymentStatus.COMPLETED
-                    )
-                    .distinct()
-                )
-                payments_result = await session.execute(payments_stmt)
-                users_with_payments = {row.user_id for row in payments_result.all()}
+                # Последняя активность (updated_at)
+                last_active = format_date(user.updated_at)
+                text += f"   🔄 Последняя активность: {last_active}"
+                if user.updated_at:
+                    text += f" ({format_relative_time(user.updated_at)})"
+                text += "\n"
                 
-                # Показываем пользователей текущей страницы
-                for i, user in enumerate(page_users, start=start_idx + 1):
-                    # Получаем количество ответов пользователя
-                    answers_count = answers_counts.get(user.id, 0)
-                    
-                    # Определяем, купил ли пользователь премиум (проверяем несколько признаков)
-                    has_premium = (
-                        user.is_premium_paid or  # Новый способ
-                        (user.is_paid and user.id in users_with_payments) or  # Старый способ - есть оплата
-                        bool(user.premium_report_path)  # Есть премиум отчет
-                    )
-                    
-                    text += f"<b>{i}. ID: <code>{user.telegram_id}</code></b>"
-                    if user.first_name:
-                        text += f" ({user.first_name}"
-                        if user.last_name:
-                            text += f" {user.last_name}"
-                        text += ")"
-                    if user.username:
-                        text += f" @{user.username}"
-                    text += "\n"
-                    
-                    # Дата регистрации
-                    reg_date = format_date(user.created_at)
-                    text += f"   📅 Регистрация: {reg_date}"
-                    if user.created_at:
-                        text += f" ({format_relative_time(user.created_at)})"
-                    text += "\n"
-                    
-                    # Последняя активность (updated_at)
-                    last_active = format_date(user.updated_at)
-                    text += f"   🔄 Последняя активность: {last_active}"
-                    if user.updated_at:
-                        text += f" ({format_relative_time(user.updated_at)})"
+                # Статус теста
+                if user.test_started_at:
+                    test_start = format_date(user.test_started_at)
+                    text += f"   🧪 Тест начат: {test_start}"
+                    if user.test_completed_at:
+                        test_end = format_date(user.test_completed_at)
+                        text += f" | Завершен: {test_end}"
+                    else:
+                        text += " | В процессе"
                     text += "\n"
-                    
-                    # Статус теста
-                    if user.test_started_at:
-                        test_start = format_date(user.test_started_at)
-                        text += f"   🧪 Тест начат: {test_start}"
-                        if user.test_completed_at:
-                            test_end = format_date(user.test_completed_at)
-                            text += f" | Завершен: {test_end}"
-                        else:
-                            text += " | В процессе"
-                        text += "\n"
-                    
-                    # Статус оплаты
-                    if user.is_paid or user.is_premium_paid:
-                        text += "   💎 Платный пользователь"
-                        if user.is_premium_paid:
-                            text += " (Премиум)"
-                        text += "\n"
-                    
-                    # Купил премиум (используем вычисленное значение)
-                    premium_status = "Да" if has_premium else "Нет"
-                    text += f"   💰 Купил премиум: {premium_status}\n"
-                    
-                    # Количество ответов
-                    text += f"   📝 Количество ответов: {answers_count}\n"
-                    
-                    # Ссылки на отчеты
-                    if user.free_report_path:
-                        if webapp_url:
-                            free_report_url = f"{webapp_url}/api/download/report/{user.telegram_id}?download=1"
-                            text += f"   📊 Бесплатный отчет: <code>{free_report_url}</code>\n"
-                        else:
-                            text += f"   📊 Бесплатный отчет: {user.free_report_path}\n"
-                    
-                    if user.premium_report_path:
-                        if webapp_url:
-                            premium_report_url = f"{webapp_url}/api/download/premium-report/{user.telegram_id}?download=1"
-                            text += f"   💎 Платный отчет: <code>{premium_report_url}</code>\n"
-                        else:
-                            text += f"   💎 Платный отчет: {user.premium_report_path}\n"
-                    
+                
+                # Статус оплаты
+                if user.is_paid or user.is_premium_paid:
+                    text += "   💎 Платный пользователь"
+                    if user.is_premium_paid:
+                        text += " (Премиум)"
                     text += "\n"
-            
+                
+                # Купил премиум (используем вычисленное значение)
+                premium_status = "Да" if has_premium else "Нет"
+                text += f"   💰 Купил премиум: {premium_status}\n"
+                
+                # Количество ответов
+                text += f"   📝 Количество ответов: {answers_count}\n"
+                
+                # Ссылки на отчеты
+                if user.free_report_path:
+                    if webapp_url:
+                        free_report_url = f"{webapp_url}/api/download/report/{user.telegram_id}?download=1"
+                        text += f"   📊 Бесплатный отчет: <code>{free_report_url}</code>\n"
+                    else:
+                        text += f"   📊 Бесплатный отчет: {user.free_report_path}\n"
+                
+                if user.premium_report_path:
+                    if webapp_url:
+                        premium_report_url = f"{webapp_url}/api/download/premium-report/{user.telegram_id}?download=1"
+                        text += f"   💎 Платный отчет: <code>{premium_report_url}</code>\n"
+                    else:
+                        text += f"   💎 Платный отчет: {user.premium_report_path}\n"
+                
+                text += "\n"
+        
             # Кнопки пагинации
             keyboard_buttons = []
             nav_buttons = []
             
             # Формируем callback_data с фильтрами
-            def build_callback(page_num):
-                return f"admin_all_users:{page_num}:{filter_premium}:{filter_free_report}"
-            
+            def build_callback(page_num, direction, user):
+                cursor = encode_user_cursor(user)
+                if cursor is None:
+                    # Без created_at курсор не построить - переход по номеру страницы
+                    return f"admin_all_users:{page_num}:{filter_premium}:{filter_free_report}"
+                return f"admin_all_users:{page_num}:{filter_premium}:{filter_free_report}:{direction}:{cursor}"
+            
+            # При переходе назад строки дальше точно есть; при переходе вперед - по лишней строке запроса
+            has_next = True if before is not None else result["has_more"]
             if page > 1:
-                nav_buttons.append(InlineKeyboardButton(text="◀️ Назад", callback_data=build_callback(page-1)))
-            if page < total_pages:
-                nav_buttons.append(InlineKeyboardButton(text="Вперед ▶️", callback_data=build_callback(page+1)))
+                nav_buttons.append(InlineKeyboardButton(text="◀️ Назад", callback_data=build_callback(page-1, "b", page_items[0][0])))
+            if has_next and page < total_pages:
+                nav_buttons.append(InlineKeyboardButton(text="Вперед ▶️", callback_data=build_callback(page+1, "a", page_items[-1][0])))
             
             if nav_buttons:
                 keyboard_buttons.append(nav_buttons)
@@ -470,25 +451,15 @@ async def admin_free_reports(callback: CallbackQuery):
             except:
                 page = 1
         
-        count = await db_service.get_free_reports_count()
-        
-        # Получаем детальную информацию
-        async with async_session() as session:
-            stmt = select(User).where(
-                User.free_report_status.in_([
-                    ReportGenerationStatus.PROCESSING,
-                    ReportGenerationStatus.COMPLETED
-                ])
-            )
-            result = await session.execute(stmt)
-            users = result.scalars().all()
-            
-            processing = sum(1 for u in users if u.free_report_status == ReportGenerationStatus.PROCESSING)
-            completed = sum(1 for u in users if u.free_report_status == ReportGenerationStatus.COMPLETED)
+        users_per_page = 20
+        start_idx = (page - 1) * users_per_page
         
-        # Группируем по статусу
-        processing_users = [u for u in users if u.free_report_status == ReportGenerationStatus.PROCESSING]
-        completed_users = [u for u in users if u.free_report_status == ReportGenerationStatus.COMPLETED]
+        # Счетчики и списки - из одной выборки, чтобы заголовок совпадал со списками
+        overview = await db_service.get_report_status_overview("free", limit=users_per_page, offset=start_idx)
+        count = overview["launched"]
+        processing = overview["processing"]
+        completed = overview["completed"]
+        processing_users = overview["processing_users"]
         
         text = f"""
 📊 <b>Бесплатные отчеты</b>
@@ -500,7 +471,6 @@ async def admin_free_reports(callback: CallbackQuery):
 <b>Пользователи:</b>
         """.strip()
         
-        users_per_page = 20  # Уменьшаем из-за добавления даты
         keyboard_buttons = []
         
         # Функция для форматирования даты
@@ -517,14 +487,12 @@ async def admin_free_reports(callback: CallbackQuery):
             for i, user in enumerate(processing_users, 1):
                 text += f"\n{i}. ID: <code>{user.telegram_id}</code>"
         
-        if completed_users:
-            # Пагинация для завершенных пользователей
-            total_pages = (len(completed_users) + users_per_page - 1) // users_per_page
-            start_idx = (page - 1) * users_per_page
-            end_idx = start_idx + users_per_page
-            page_users = completed_users[start_idx:end_idx]
+        if completed:
+            # Пагинация для завершенных пользователей - страница читается из БД
+            total_pages = (completed + users_per_page - 1) // users_per_page
+            page_users = overview["completed_users"]
             
-            text += f"\n\n<b>Завершено ({len(completed_users)}):</b>"
+            text += f"\n\n<b>Завершено ({completed}):</b>"
             if total_pages > 1:
                 text += f" Страница {page}/{total_pages}"
             text += "\n"
@@ -543,7 +511,7 @@ async def admin_free_reports(callback: CallbackQuery):
                 if nav_buttons:
                     keyboard_buttons.append(nav_buttons)
         
-        if not users:
+        if not count:
             text += "\n\nПользователей пока нет."
         
         keyboard_buttons.append([InlineKeyboardButton(text="🔙 Назад", callback_data="admin_menu")])
@@ -578,25 +546,15 @@ async def admin_premium_reports(callback: CallbackQuery):
             except:
                 page = 1
         
-        count = await db_service.get_premium_reports_count()
-        
-        # Получаем детальную информацию
-        async with async_session() as session:
-            stmt = select(User).where(
-                User.premium_report_status.in_([
-                    ReportGenerationStatus.PROCESSING,
-                    ReportGenerationStatus.COMPLETED
-                ])
-            )
-            result = await session.execute(stmt)
-            users = result.scalars().all()
-            
-            processing = sum(1 for u in users if u.premium_report_status == ReportGenerationStatus.PROCESSING)
-            completed = sum(1 for u in users if u.premium_report_status == ReportGenerationStatus.COMPLETED)
+        users_per_page = 20
+        start_idx = (page - 1) * users_per_page
         
-        # Группируем по статусу
-        processing_users = [u for u in users if u.premium_report_status == ReportGenerationStatus.PROCESSING]
-        completed_users = [u for u in users if u.premium_report_status == ReportGenerationStatus.COMPLETED]
+        # Счетчики и списки - из одной выборки, чтобы заголовок совпадал со списками
+        overview = await db_service.get_report_status_overview("premium", limit=users_per_page, offset=start_idx)
+        count = overview["launched"]
+        processing = overview["processing"]
+        completed = overview["completed"]
+        processing_users = overview["processing_users"]
         
         text = f"""
 💎 <b>Премиум отчеты</b>
@@ -608,7 +566,6 @@ async def admin_premium_reports(callback: CallbackQuery):
 <b>Пользователи:</b>
         """.strip()
         
-        users_per_page = 20
         keyboard_buttons = []
         
         # Функция для форматирования даты
@@ -625,14 +582,12 @@ async def admin_premium_reports(callback: CallbackQuery):
             for i, user in enumerate(processing_users, 1):
                 text += f"\n{i}. ID: <code>{user.telegram_id}</code>"
         
-        if completed_users:
-            # Пагинация для завершенных пользователей
-            total_pages = (len(completed_users) + users_per_page - 1) // users_per_page
-            start_idx = (page - 1) * users_per_page
-            end_idx = start_idx + users_per_page
-            page_users = completed_users[start_idx:end_idx]
+        if completed:
+            # Пагинация для завершенных пользователей - страница читается из БД
+            total_pages = (completed + users_per_page - 1) // users_per_page
+            page_users = overview["completed_users"]
             
-            text += f"\n\n<b>Завершено ({len(completed_users)}):</b>"
+            text += f"\n\n<b>Завершено ({completed}):</b>"
             if total_pages > 1:
                 text += f" Страница {page}/{total_pages}"
             text += "\n"
@@ -651,7 +606,7 @@ async def admin_premium_reports(callback: CallbackQuery):
                 if nav_buttons:
                     keyboard_buttons.append(nav_buttons)
         
-        if not users:
+        if not count:
             text += "\n\nПользователей пока нет."
         
         keyboard_buttons.append([InlineKeyboardButton(text="🔙 Назад", callback_data="admin_menu")])
@@ -1,17 +1,49 @@
 from typing import Optional, List
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, and_
+from sqlalchemy import select, update, and_, or_, not_, exists, true, tuple_, func, inspect as sa_inspect
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import selectinload
+from sqlalchemy.exc import NoResultFound
 from datetime import datetime
+from pathlib import Path
+from typing import Tuple
 import decimal
+import functools
 
-from bot.database.models import User, Question, Answer, Payment, Report, QuestionType, PaymentStatus, ReportGenerationStatus
-from bot.database.database import async_session
+from bot.database.models import User, Question, Answer, Payment, Report, ReportArtifact, AnalysisCheckpoint, QuestionType, PaymentStatus, ReportGenerationStatus
+from bot.database.database import async_session, engine
+from bot.services.question_catalog import question_catalog
+from bot.services.user_cache import user_cache
+from bot.services.report_events import report_events
+from bot.services.payment_events import payment_events
 from bot.config import FREE_QUESTIONS_LIMIT, PREMIUM_QUESTIONS_COUNT
 from bot.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+
+def invalidates_user(method):
+    """Сбросить пользователя в user_cache после пишущего метода (первый аргумент - telegram_id)"""
+    @functools.wraps(method)
+    async def wrapper(self, telegram_id: int, *args, **kwargs):
+        try:
+            return await method(self, telegram_id, *args, **kwargs)
+        finally:
+            # После commit (или ошибки) - следующее чтение возьмет строку из БД
+            user_cache.invalidate(telegram_id)
+    return wrapper
+
+
+def upsert_insert(model):
+    """INSERT с поддержкой ON CONFLICT для диалекта текущей БД"""
+    dialect = postgresql if engine.dialect.name == "postgresql" else sqlite
+    return dialect.insert(model)
+
+
+# Колонки пользователя, которые можно менять через update_user
+USER_COLUMN_KEYS = frozenset(attr.key for attr in sa_inspect(User).column_attrs)
+
+
 class DatabaseService:
     
     async def get_session(self) -> AsyncSession:
@@ -22,34 +54,68 @@ class DatabaseService:
     # --- Работа с пользователями ---
     
     async def get_or_create_user(self, telegram_id: int, **user_data) -> User:
-        """Получить пользователя или создать нового"""
+        """Получить пользователя или создать нового (через user_cache)"""
+        return await user_cache.get_or_load(
+            telegram_id, lambda: self._load_or_create_user(telegram_id, **user_data)
+        )
+    
+    async def _load_or_create_user(self, telegram_id: int, **user_data) -> User:
+        """Прочитать пользователя из БД или создать нового"""
         async with async_session() as session:
-            try:
-                # Ищем существующего пользователя
-                stmt = select(User).where(User.telegram_id == telegram_id)
-                result = await session.execute(stmt)
-                user = result.scalar_one_or_none()
-                
-                if not user:
-                    # Создаем нового пользователя
-                    user = User(
-                        telegram_id=telegram_id,
-                        first_name=user_data.get('first_name', ''),
-                        last_name=user_data.get('last_name'),
-                        username=user_data.get('username'),
-                        language_code=user_data.get('language_code')
-                    )
-                    session.add(user)
-                    await session.commit()
-                    await session.refresh(user)
-                else:
-                    # Если пользователь найден, просто возвращаем его без коммита
-                    await session.refresh(user)
-                
+            stmt = select(User).where(User.telegram_id == telegram_id)
+            user = (await session.execute(stmt)).scalar_one_or_none()
+            if user:
                 return user
-            except Exception as e:
-                await session.rollback()
-                raise e
+            
+            # Создаем нового пользователя; при одновременном создании выигрывает первый INSERT
+            insert_stmt = (
+                upsert_insert(User)
+                .values(
+                    telegram_id=telegram_id,
+                    first_name=user_data.get('first_name', ''),
+                    last_name=user_data.get('last_name'),
+                    username=user_data.get('username'),
+                    language_code=user_data.get('language_code')
+                )
+                .on_conflict_do_nothing(index_elements=[User.telegram_id])
+                .returning(User)
+            )
+            user = (await session.execute(insert_stmt)).scalar_one_or_none()
+            await session.commit()
+            
+            if user is None:
+                # Пользователя создал параллельный запрос
+                user = (await session.execute(stmt)).scalar_one()
+            return user
+    
+    async def _update_user_returning(self, telegram_id: int, values: dict) -> User:
+        """UPDATE users ... RETURNING одним запросом (NoResultFound, если пользователя нет)"""
+        async with async_session() as session:
+            stmt = (
+                update(User)
+                .where(User.telegram_id == telegram_id)
+                .values(**values, updated_at=datetime.utcnow())
+                .returning(User)
+            )
+            user = (await session.execute(stmt)).scalar_one()
+            await session.commit()
+            return user
+    
+    async def get_user(self, telegram_id: int) -> Optional[User]:
+        """Получить пользователя по telegram_id без создания (через user_cache)"""
+        async def load():
+            async with async_session() as session:
+                result = await session.execute(select(User).where(User.telegram_id == telegram_id))
+                return result.scalar_one_or_none()
+        
+        return await user_cache.get_or_load(telegram_id, load)
+    
+    async def _get_user_id(self, telegram_id: int) -> int:
+        """id пользователя по telegram_id (NoResultFound, если пользователя нет)"""
+        user = await self.get_user(telegram_id)
+        if user is None:
+            raise NoResultFound(f"User {telegram_id} not found")
+        return user.id
     
     async def get_user_by_id(self, user_id: int) -> Optional[User]:
         """Получить пользователя по ID"""
@@ -58,6 +124,7 @@ class DatabaseService:
             result = await session.execute(stmt)
             return result.scalar_one_or_none()
     
+    @invalidates_user
     async def delete_user(self, telegram_id: int) -> bool:
         """Удалить пользователя и все связанные данные"""
         async with async_session() as session:
@@ -81,6 +148,8 @@ class DatabaseService:
                 
                 # Удаляем отчеты
                 await session.execute(Report.__table__.delete().where(Report.user_id == user.id))
+                await session.execute(ReportArtifact.__table__.delete().where(ReportArtifact.user_id == user.id))
+                await session.execute(AnalysisCheckpoint.__table__.delete().where(AnalysisCheckpoint.user_id == user.id))
                 
                 # Удаляем пользователя
                 await session.delete(user)
@@ -91,6 +160,7 @@ class DatabaseService:
                 await session.rollback()
                 raise e
     
+    @invalidates_user
     async def update_user_profile(self, telegram_id: int, name: str = None, age: int = None, gender: str = None) -> User:
         """Обновить профиль пользователя"""
         async with async_session() as session:
@@ -109,6 +179,7 @@ class DatabaseService:
             await session.commit()
             return user
     
+    @invalidates_user
     async def start_test(self, telegram_id: int) -> User:
         """Начать тест для пользователя"""
         async with async_session() as session:
@@ -139,55 +210,43 @@ class DatabaseService:
             await session.commit()
             return user
     
+    @staticmethod
+    def _complete_test_values(test_version: str) -> dict:
+        """Поля пользователя при завершении теста указанной версии"""
+        if test_version == "free":
+            values = {"free_test_completed": True, "current_free_question_id": None}
+        else:
+            values = {"premium_test_completed": True, "current_premium_question_id": None}
+        
+        # Обратная совместимость
+        values.update({
+            "test_completed": True,
+            "test_completed_at": datetime.utcnow(),
+            "current_question_id": None,
+        })
+        return values
+    
+    @invalidates_user
     async def complete_test(self, telegram_id: int, test_version: str = "free") -> User:
         """Завершить тест для пользователя (с указанием версии теста)"""
         async with async_session() as session:
-            stmt = select(User).where(User.telegram_id == telegram_id)
-            result = await session.execute(stmt)
-            user = result.scalar_one()
-            
-            # Удаляем старые отчеты при новом прохождении теста
-            import glob
-            from pathlib import Path
-            reports_dir = Path("reports")
-            
-            # Удаляем старые бесплатные отчеты
-            if test_version == "free":
-                pattern = f"prizma_report_{telegram_id}_*.pdf"
-                old_reports = glob.glob(str(reports_dir / pattern))
-                for old_report in old_reports:
-                    try:
-                        Path(old_report).unlink()
-                        logger.info(f"🗑️ Удален старый бесплатный отчет: {old_report}")
-                    except Exception as e:
-                        logger.warning(f"⚠️ Не удалось удалить старый отчет {old_report}: {e}")
-            
-            # Удаляем старые премиум отчеты
-            if test_version == "premium":
-                pattern = f"prizma_premium_report_{telegram_id}_*.pdf"
-                old_reports = glob.glob(str(reports_dir / pattern))
-                for old_report in old_reports:
-                    try:
-                        Path(old_report).unlink()
-                        logger.info(f"🗑️ Удален старый премиум отчет: {old_report}")
-                    except Exception as e:
-                        logger.warning(f"⚠️ Не удалось удалить старый отчет {old_report}: {e}")
-            
-            if test_version == "free":
-                user.free_test_completed = True
-                user.current_free_question_id = None
-            else:
-                user.premium_test_completed = True
-                user.current_premium_question_id = None
+            # Удаляем старые отчеты этой версии теста при новом прохождении
+            report_paths = await self._delete_report_artifacts(session, telegram_id, test_version)
             
-            # Обратная совместимость
-            user.test_completed = True
-            user.test_completed_at = datetime.utcnow()
-            user.current_question_id = None
+            stmt = (
+                update(User)
+                .where(User.telegram_id == telegram_id)
+                .values(**self._complete_test_values(test_version))
+                .returning(User)
+            )
+            user = (await session.execute(stmt)).scalar_one()
             
             await session.commit()
-            return user
+        
+        self._unlink_report_files(report_paths, test_version)
+        return user
     
+    @invalidates_user
     async def upgrade_to_paid(self, telegram_id: int) -> User:
         """Обновить пользователя до платной версии"""
         async with async_session() as session:
@@ -201,142 +260,76 @@ class DatabaseService:
             await session.commit()
             return user
     
+    @invalidates_user
     async def upgrade_to_premium_and_continue_test(self, telegram_id: int) -> User:
         """Обновить пользователя до премиум версии и продолжить тест"""
-        async with async_session() as session:
-            stmt = select(User).where(User.telegram_id == telegram_id)
-            result = await session.execute(stmt)
-            user = result.scalar_one()
-            
+        values = {
             # Обновляем статус на премиум
-            user.is_paid = True
-            user.is_premium_paid = True  # Устанавливаем флаг покупки премиум отчета
-            user.updated_at = datetime.utcnow()
-            
+            "is_paid": True,
+            "is_premium_paid": True,  # Устанавливаем флаг покупки премиум отчета
             # Сбрасываем флаг завершения теста, чтобы пользователь мог продолжить
-            user.test_completed = False
-            user.test_completed_at = None
-            
-            # Находим следующий вопрос после последнего отвеченного
-            answers = await self.get_user_answers(telegram_id)
-            if answers:
-                # Получаем все вопросы, на которые пользователь ответил
-                answered_questions = []
-                for answer in answers:
-                    question = await self.get_question(answer.question_id)
-                    if question:
-                        answered_questions.append(question)
-                
-                if answered_questions:
-                    # Находим вопрос с максимальным order_number
-                    last_question = max(answered_questions, key=lambda x: x.order_number)
-                    
-                    if last_question:
-                        next_question = await self.get_next_question(last_question.id, True)  # is_paid=True
-                        if next_question:
-                            # Устанавливаем следующий вопрос как текущий
-                            user.current_question_id = next_question.id
-                            from loguru import logger
-                            logger.info(f"🔄 Пользователь {telegram_id} продолжает премиум тест с вопроса {next_question.order_number}")
-                        else:
-                            # Если следующего вопроса нет, тест завершен
-                            user.test_completed = True
-                            user.test_completed_at = datetime.utcnow()
-                            from loguru import logger
-                            logger.info(f"✅ Премиум тест для пользователя {telegram_id} завершен")
-            
-            await session.commit()
-            return user
+            "test_completed": False,
+            "test_completed_at": None
+        }
+        
+        # Находим следующий вопрос после последнего отвеченного
+        last_question = await self.get_last_answered_question(telegram_id)
+        if last_question:
+            next_question = await self.get_next_question(last_question.id, "premium")
+            if next_question:
+                # Устанавливаем следующий вопрос как текущий
+                values["current_question_id"] = next_question.id
+                logger.info(f"🔄 Пользователь {telegram_id} продолжает премиум тест с вопроса {next_question.order_number}")
+            else:
+                # Если следующего вопроса нет, тест завершен
+                values["test_completed"] = True
+                values["test_completed_at"] = datetime.utcnow()
+                logger.info(f"✅ Премиум тест для пользователя {telegram_id} завершен")
+        
+        user = await self._update_user_returning(telegram_id, values)
+        # Ответить ожидающим /payment-status только после commit апгрейда:
+        # до него оплата для пользователя еще не завершена (is_paid)
+        payment_events.notify(user.id, PaymentStatus.COMPLETED.value)
+        return user
     
+    @invalidates_user
     async def update_user_test_status(self, telegram_id: int, test_completed: bool) -> User:
         """Обновить статус завершения теста пользователя"""
-        async with async_session() as session:
-            stmt = select(User).where(User.telegram_id == telegram_id)
-            result = await session.execute(stmt)
-            user = result.scalar_one()
-            
-            user.test_completed = test_completed
-            if test_completed:
-                user.test_completed_at = datetime.utcnow()
-            else:
-                user.test_completed_at = None
-            
-            user.updated_at = datetime.utcnow()
-            await session.commit()
-            return user
+        return await self._update_user_returning(telegram_id, {
+            "test_completed": test_completed,
+            "test_completed_at": datetime.utcnow() if test_completed else None
+        })
     
+
+    @invalidates_user
     async def update_user_premium_status(self, telegram_id: int, is_premium_paid: bool) -> User:
         """Обновить статус is_premium_paid пользователя"""
-        async with async_session() as session:
-            stmt = select(User).where(User.telegram_id == telegram_id)
-            result = await session.execute(stmt)
-            user = result.scalar_one()
-            
-            user.is_premium_paid = is_premium_paid
-            user.updated_at = datetime.utcnow()
-            
-            await session.commit()
-            return user
+        return await self._update_user_returning(telegram_id, {"is_premium_paid": is_premium_paid})
+
 
+    @invalidates_user
     async def update_user(self, telegram_id: int, update_data: dict) -> User:
         """Обновить пользователя с произвольными полями"""
-        async with async_session() as session:
-            stmt = select(User).where(User.telegram_id == telegram_id)
-            result = await session.execute(stmt)
-            user = result.scalar_one()
-            
-            # Обновляем поля из словаря
-            for field, value in update_data.items():
-                if hasattr(user, field):
-                    setattr(user, field, value)
-            
-            user.updated_at = datetime.utcnow()
-            
-            await session.commit()
-            return user
+        # Неизвестные поля игнорируются, как и раньше
+        values = {field: value for field, value in update_data.items() if field in USER_COLUMN_KEYS}
+        values.pop("updated_at", None)
+        return await self._update_user_returning(telegram_id, values)
+
 
-    # --- Работа с вопросами ---
-    
     async def get_first_question(self, test_version: str = "free") -> Question:
         """Получить первый вопрос указанного теста"""
-        async with async_session() as session:
-            stmt = select(Question).where(
-                and_(
-                    Question.is_active == True,
-                    Question.test_version == test_version
-                )
-            ).order_by(Question.order_number).limit(1)
-            result = await session.execute(stmt)
-            return result.scalar_one()
+        question = (await question_catalog.get()).first(test_version)
+        if question is None:
+            raise NoResultFound(f"Нет активных вопросов для теста {test_version}")
+        return question
     
     async def get_question(self, question_id: int) -> Optional[Question]:
         """Получить вопрос по ID"""
-        async with async_session() as session:
-            stmt = select(Question).where(Question.id == question_id)
-            result = await session.execute(stmt)
-            return result.scalar_one_or_none()
+        return (await question_catalog.get()).get(question_id)
     
     async def get_next_question(self, current_question_id: int, test_version: str = "free") -> Optional[Question]:
         """Получить следующий вопрос в рамках указанного теста"""
-        async with async_session() as session:
-            # Получаем текущий вопрос для определения order_number
-            current_stmt = select(Question).where(Question.id == current_question_id)
-            current_result = await session.execute(current_stmt)
-            current_question = current_result.scalar_one_or_none()
-            
-            if not current_question:
-                return None
-            
-            # Формируем условия для поиска следующего вопроса в том же тесте
-            conditions = [
-                Question.order_number > current_question.order_number,
-                Question.is_active == True,
-                Question.test_version == test_version
-            ]
-            
-            stmt = select(Question).where(and_(*conditions)).order_by(Question.order_number).limit(1)
-            result = await session.execute(stmt)
-            return result.scalar_one_or_none()
+        return (await question_catalog.get()).next(current_question_id, test_version)
     
     async def get_total_questions(self, test_version: str = "free") -> int:
         """Получить общее количество вопросов для указанного теста"""
@@ -346,34 +339,16 @@ class DatabaseService:
             return PREMIUM_QUESTIONS_COUNT
             
     async def get_total_questions_by_version(self, test_version: str) -> int:
-        """Получить реальное количество вопросов из БД для указанного теста"""
-        async with async_session() as session:
-            conditions = [
-                Question.is_active == True,
-                Question.test_version == test_version
-            ]
-            
-            stmt = select(Question).where(and_(*conditions))
-            result = await session.execute(stmt)
-            questions = result.scalars().all()
-            return len(questions)
+        """Получить реальное количество активных вопросов указанного теста"""
+        return (await question_catalog.get()).count(test_version)
     
     async def get_questions(self) -> List[Question]:
         """Получить все активные вопросы"""
-        async with async_session() as session:
-            stmt = select(Question).where(Question.is_active == True).order_by(Question.order_number)
-            result = await session.execute(stmt)
-            return result.scalars().all()
+        return list((await question_catalog.get()).all_active())
 
     async def get_questions_by_version(self, test_version: str) -> List[Question]:
         """Получить вопросы только указанной версии теста (free или premium)"""
-        async with async_session() as session:
-            stmt = select(Question).where(
-                Question.is_active == True,
-                Question.test_version == test_version
-            ).order_by(Question.order_number)
-            result = await session.execute(stmt)
-            return result.scalars().all()
+        return list((await question_catalog.get()).by_version.get(test_version, ()))
     
     async def create_question(self, text: str, question_type: QuestionType, order_number: int) -> Question:
         """Создать новый вопрос"""
@@ -386,10 +361,46 @@ class DatabaseService:
             session.add(question)
             await session.commit()
             await session.refresh(question)
+            question_catalog.invalidate()
             return question
     
     # --- Работа с ответами ---
     
+    @staticmethod
+    def _answer_counter_values(question: Optional[Question]) -> dict:
+        """Значения UPDATE users для счетчиков прогресса после ответа на question"""
+        if question is None or question.test_version not in ("free", "premium"):
+            return {}
+        return {
+            f"{question.test_version}_answers_count": getattr(User, f"{question.test_version}_answers_count") + 1,
+            f"last_{question.test_version}_answered_question_id": question.id
+        }
+    
+    # Сброс счетчиков прогресса при удалении ответов пользователя
+    RESET_ANSWER_COUNTERS = {
+        "free_answers_count": 0,
+        "premium_answers_count": 0,
+        "last_free_answered_question_id": None,
+        "last_premium_answered_question_id": None
+    }
+    
+    @staticmethod
+    def get_answer_counts(user: User) -> dict:
+        """Количество ответов пользователя по версиям теста (без запроса к БД)"""
+        free_count = user.free_answers_count or 0
+        premium_count = user.premium_answers_count or 0
+        return {"free": free_count, "premium": premium_count, "total": free_count + premium_count}
+    
+    @staticmethod
+    def get_last_answered_question_id(user: User, test_version: str = None) -> Optional[int]:
+        """Последний отвеченный вопрос указанного теста (без версии - самый поздний по тесту)"""
+        if test_version == "free":
+            return user.last_free_answered_question_id
+        if test_version == "premium":
+            return user.last_premium_answered_question_id
+        return user.last_premium_answered_question_id or user.last_free_answered_question_id
+    
+    @invalidates_user
     async def save_answer(self, telegram_id: int, question_id: int, text_answer: str = None, 
                          voice_file_id: str = None, answer_type: str = "text") -> Answer:
         """Сохранить ответ пользователя"""
@@ -408,10 +419,87 @@ class DatabaseService:
             )
             
             session.add(answer)
+            
+            # Счетчики прогресса обновляются в той же транзакции
+            counter_values = self._answer_counter_values((await question_catalog.get()).get(question_id))
+            if counter_values:
+                await session.execute(update(User).where(User.id == user.id).values(**counter_values))
+            
             await session.commit()
             await session.refresh(answer)
             return answer
     
+    @invalidates_user
+    async def submit_answer(self, telegram_id: int, text_answer: str = None, answer_type: str = "text",
+                            voice_file_id: str = None) -> dict:
+        """Сохранить ответ на текущий вопрос и перейти к следующему - одной транзакцией
+        (вопросы берутся из каталога в памяти).
+        
+        Возвращает словарь со статусом:
+        - no_active_question / question_not_found - ответ не сохранен
+        - next_question - ответ сохранен, у пользователя новый текущий вопрос (next_question, answered)
+        - test_finished - ответ сохранен, вопросов больше нет, тест завершен в той же транзакции
+        """
+        report_paths = []
+        async with async_session() as session:
+            user_row = (await session.execute(
+                select(User.id, User.is_paid, User.current_question_id).where(User.telegram_id == telegram_id)
+            )).one_or_none()
+            
+            if user_row is None or not user_row.current_question_id:
+                return {"status": "no_active_question"}
+            
+            catalog = await question_catalog.get()
+            current_question = catalog.get(user_row.current_question_id)
+            
+            if current_question is None:
+                return {"status": "question_not_found"}
+            
+            answer = Answer(
+                user_id=user_row.id,
+                question_id=current_question.id,
+                text_answer=text_answer,
+                voice_file_id=voice_file_id,
+                answer_type=answer_type
+            )
+            session.add(answer)
+            await session.flush()
+            
+            # Следующий вопрос в рамках того же теста
+            test_version = "premium" if user_row.is_paid else "free"
+            next_question = catalog.next(current_question.id, test_version)
+            
+            result = {
+                "answer": answer,
+                "current_question": current_question,
+                "next_question": next_question,
+                "test_version": test_version,
+                "is_paid": user_row.is_paid
+            }
+            
+            # Счетчики прогресса и текущий вопрос - одним UPDATE в той же транзакции
+            values = self._answer_counter_values(current_question)
+            if next_question is not None:
+                values["current_question_id"] = next_question.id
+                values["updated_at"] = datetime.utcnow()
+            else:
+                # Последний ответ и завершение теста (как complete_test) - одним commit:
+                # пользователь не может остаться с ответом, но без завершенного теста
+                report_paths = await self._delete_report_artifacts(session, telegram_id, "free")
+                values.update(self._complete_test_values("free"))
+            
+            counters = (await session.execute(
+                update(User).where(User.id == user_row.id).values(**values)
+                .returning(User.free_answers_count, User.premium_answers_count)
+            )).one()
+            result["answered"] = counters.free_answers_count + counters.premium_answers_count
+            
+            await session.commit()
+        
+        self._unlink_report_files(report_paths, "free")
+        result["status"] = "next_question" if next_question is not None else "test_finished"
+        return result
+    
     async def update_answer_analysis(self, answer_id: int, ai_analysis: str) -> Answer:
         """Обновить анализ ответа"""
         async with async_session() as session:
@@ -426,6 +514,7 @@ class DatabaseService:
             await session.commit()
             return answer
     
+    @invalidates_user
     async def clear_user_answers(self, telegram_id: int) -> int:
         """Удалить все ответы пользователя"""
         async with async_session() as session:
@@ -440,9 +529,12 @@ class DatabaseService:
             result = await session.execute(stmt)
             deleted_count = result.rowcount
             
+            await session.execute(update(User).where(User.id == user.id).values(**self.RESET_ANSWER_COUNTERS))
+            
             await session.commit()
             return deleted_count
     
+    @invalidates_user
     async def clear_user_data_after_report_generation(self, telegram_id: int) -> int:
         """Очистить данные пользователя после успешной генерации отчета"""
         async with async_session() as session:
@@ -465,31 +557,25 @@ class DatabaseService:
 
     async def get_user_answers(self, telegram_id: int) -> List[Answer]:
         """Получить все ответы пользователя"""
+        user_id = await self._get_user_id(telegram_id)
         async with async_session() as session:
-            user_stmt = select(User).where(User.telegram_id == telegram_id)
-            user_result = await session.execute(user_stmt)
-            user = user_result.scalar_one()
-            
             stmt = select(Answer).options(
                 selectinload(Answer.question)
-            ).where(Answer.user_id == user.id).order_by(Answer.created_at)
+            ).where(Answer.user_id == user_id).order_by(Answer.created_at)
             
             result = await session.execute(stmt)
             return result.scalars().all()
 
     async def get_user_answers_by_test_version(self, telegram_id: int, test_version: str) -> List[Answer]:
         """Получить ответы пользователя только по вопросам указанной версии теста (free или premium)"""
+        user_id = await self._get_user_id(telegram_id)
         async with async_session() as session:
-            user_stmt = select(User).where(User.telegram_id == telegram_id)
-            user_result = await session.execute(user_stmt)
-            user = user_result.scalar_one()
-            
             stmt = (
                 select(Answer)
                 .options(selectinload(Answer.question))
                 .join(Question, Answer.question_id == Question.id)
                 .where(
-                    Answer.user_id == user.id,
+                    Answer.user_id == user_id,
                     Question.test_version == test_version,
                     Question.is_active == True
                 )
@@ -498,6 +584,28 @@ class DatabaseService:
             result = await session.execute(stmt)
             return result.scalars().all()
     
+    async def get_last_answered_question(self, telegram_id: int) -> Optional[Question]:
+        """Последний отвеченный вопрос (с максимальным order_number)"""
+        user = await self.get_user(telegram_id)
+        if user is None:
+            return None
+        
+        catalog = await question_catalog.get()
+        question_id = self.get_last_answered_question_id(user)
+        if question_id is None:
+            # Указатель не заполнен (ответы добавлены в обход сервиса) - один запрос
+            stmt = (
+                select(Answer.question_id)
+                .join(Question, Answer.question_id == Question.id)
+                .where(Answer.user_id == user.id)
+                .order_by(Question.order_number.desc())
+                .limit(1)
+            )
+            async with async_session() as session:
+                question_id = (await session.execute(stmt)).scalar_one_or_none()
+        
+        return catalog.get(question_id) if question_id is not None else None
+    
     # --- Работа с платежами ---
     
     async def create_payment(self, user_id: int, amount: decimal.Decimal, currency: str, description: str, invoice_id: str, status: PaymentStatus) -> Payment:
@@ -524,22 +632,31 @@ class DatabaseService:
             result = await session.execute(stmt)
             return result.scalar_one_or_none()
 
+    async def get_latest_payment(self, user_id: int) -> Optional[Payment]:
+        """Последний платеж пользователя"""
+        async with async_session() as session:
+            stmt = select(Payment).where(Payment.user_id == user_id).order_by(Payment.id.desc()).limit(1)
+            result = await session.execute(stmt)
+            return result.scalar_one_or_none()
+
     async def update_payment_status(self, payment_id: int, status: PaymentStatus, 
                                   robokassa_payment_id: str = None) -> Payment:
         """Обновить статус платежа"""
+        values = {"status": status}
+        if robokassa_payment_id:
+            values["robokassa_payment_id"] = robokassa_payment_id
+        if status == PaymentStatus.COMPLETED:
+            values["paid_at"] = datetime.utcnow()
+        
         async with async_session() as session:
-            stmt = select(Payment).where(Payment.id == payment_id)
-            result = await session.execute(stmt)
-            payment = result.scalar_one()
-            
-            payment.status = status
-            if robokassa_payment_id:
-                payment.robokassa_payment_id = robokassa_payment_id
-            if status == PaymentStatus.COMPLETED:
-                payment.paid_at = datetime.utcnow()
-            
+            stmt = update(Payment).where(Payment.id == payment_id).values(**values).returning(Payment)
+            payment = (await session.execute(stmt)).scalar_one()
             await session.commit()
-            return payment
+        # Ответить ожидающим /payment-status; об успешной оплате сообщает
+        # upgrade_to_premium_and_continue_test после перевода пользователя на премиум
+        if status != PaymentStatus.COMPLETED:
+            payment_events.notify(payment.user_id, status.value)
+        return payment
     
     async def update_payment_invoice_id(self, payment_id: int, invoice_id: str):
         from bot.database.database import async_session
@@ -589,76 +706,72 @@ class DatabaseService:
     
     # --- Методы для работы со статусом генерации отчетов ---
     
+    @invalidates_user
     async def update_report_generation_status(self, telegram_id: int, report_type: str, 
                                             status: ReportGenerationStatus, 
                                             report_path: str = None, 
                                             error: str = None) -> User:
         """Обновить статус генерации отчета"""
-        async with async_session() as session:
-            stmt = select(User).where(User.telegram_id == telegram_id)
-            result = await session.execute(stmt)
-            user = result.scalar_one()
-            
-            logger.info(f"🔄 Обновление статуса отчета для пользователя {telegram_id}, тип: {report_type}, новый статус: {status.value}")
-            
-            if report_type == "free":
-                user.free_report_status = status
-                if report_path:
-                    user.free_report_path = report_path
-            elif report_type == "premium":
-                user.premium_report_status = status
-                if report_path:
-                    user.premium_report_path = report_path
-            
-            if error:
-                user.report_generation_error = error
-            
-            # Обновляем временные метки
-            if status == ReportGenerationStatus.PROCESSING:
-                user.report_generation_started_at = datetime.utcnow()
-            elif status in [ReportGenerationStatus.COMPLETED, ReportGenerationStatus.FAILED]:
-                user.report_generation_completed_at = datetime.utcnow()
-            
-            user.updated_at = datetime.utcnow()
-            await session.commit()
-            
-            logger.info(f"✅ Статус отчета обновлен для пользователя {telegram_id}, тип: {report_type}, статус: {status.value}")
-            return user
+        # Часть вызовов передает статус строкой ("PENDING")
+        status = ReportGenerationStatus(status)
+        logger.info(f"🔄 Обновление статуса отчета для пользователя {telegram_id}, тип: {report_type}, новый статус: {status.value}")
+        
+        values = {}
+        if report_type == "free":
+            values["free_report_status"] = status
+            if report_path:
+                values["free_report_path"] = report_path
+        elif report_type == "premium":
+            values["premium_report_status"] = status
+            if report_path:
+                values["premium_report_path"] = report_path
+        
+        if error:
+            values["report_generation_error"] = error
+        
+        # Обновляем временные метки
+        if status == ReportGenerationStatus.PROCESSING:
+            values["report_generation_started_at"] = datetime.utcnow()
+        elif status in [ReportGenerationStatus.COMPLETED, ReportGenerationStatus.FAILED]:
+            values["report_generation_completed_at"] = datetime.utcnow()
+        
+        user = await self._update_user_returning(telegram_id, values)
+        report_events.publish_status(telegram_id, report_type, status.value)
+        
+        logger.info(f"✅ Статус отчета обновлен для пользователя {telegram_id}, тип: {report_type}, статус: {status.value}")
+        return user
     
     async def get_report_generation_status(self, telegram_id: int, report_type: str) -> dict:
         """Получить статус генерации отчета"""
-        async with async_session() as session:
-            stmt = select(User).where(User.telegram_id == telegram_id)
-            result = await session.execute(stmt)
-            user = result.scalar_one_or_none()
-            
-            if not user:
-                logger.warning(f"⚠️ Пользователь {telegram_id} не найден при получении статуса отчета")
-                return {"status": "user_not_found"}
-            
-            if report_type == "free":
-                status_info = {
-                    "status": user.free_report_status.value,
-                    "report_path": user.free_report_path,
-                    "error": user.report_generation_error,
-                    "started_at": user.report_generation_started_at,
-                    "completed_at": user.report_generation_completed_at
-                }
-                logger.info(f"📊 Статус бесплатного отчета для пользователя {telegram_id}: {status_info}")
-                return status_info
-            elif report_type == "premium":
-                status_info = {
-                    "status": user.premium_report_status.value,
-                    "report_path": user.premium_report_path,
-                    "error": user.report_generation_error,
-                    "started_at": user.report_generation_started_at,
-                    "completed_at": user.report_generation_completed_at
-                }
-                logger.info(f"📊 Статус премиум отчета для пользователя {telegram_id}: {status_info}")
-                return status_info
-            
-            logger.warning(f"⚠️ Неизвестный тип отчета: {report_type} для пользователя {telegram_id}")
-            return {"status": "invalid_report_type"}
+        user = await self.get_user(telegram_id)
+        
+        if not user:
+            logger.warning(f"⚠️ Пользователь {telegram_id} не найден при получении статуса отчета")
+            return {"status": "user_not_found"}
+        
+        if report_type == "free":
+            status_info = {
+                "status": user.free_report_status.value,
+                "report_path": user.free_report_path,
+                "error": user.report_generation_error,
+                "started_at": user.report_generation_started_at,
+                "completed_at": user.report_generation_completed_at
+            }
+            logger.info(f"📊 Статус бесплатного отчета для пользователя {telegram_id}: {status_info}")
+            return status_info
+        elif report_type == "premium":
+            status_info = {
+                "status": user.premium_report_status.value,
+                "report_path": user.premium_report_path,
+                "error": user.report_generation_error,
+                "started_at": user.report_generation_started_at,
+                "completed_at": user.report_generation_completed_at
+            }
+            logger.info(f"📊 Статус премиум отчета для пользователя {telegram_id}: {status_info}")
+            return status_info
+        
+        logger.warning(f"⚠️ Неизвестный тип отчета: {report_type} для пользователя {telegram_id}")
+        return {"status": "invalid_report_type"}
     
     async def is_report_generating(self, telegram_id: int, report_type: str) -> bool:
         """Проверить, генерируется ли отчет"""
@@ -667,6 +780,7 @@ class DatabaseService:
         logger.info(f"🔍 Проверка генерации отчета для пользователя {telegram_id}, тип: {report_type}, статус: {status_info.get('status')}, генерируется: {is_generating}")
         return is_generating
     
+    @invalidates_user
     async def reset_user_after_premium_report(self, telegram_id: int) -> bool:
         """Сбросить состояние пользователя после отправки премиум-отчета в бот.
         - Сбросить ответы
@@ -688,6 +802,8 @@ class DatabaseService:
                 # 1) Удаляем ответы пользователя
                 from sqlalchemy import delete
                 await session.execute(delete(Answer).where(Answer.user_id == user.id))
+                for field, value in self.RESET_ANSWER_COUNTERS.items():
+                    setattr(user, field, value)
                 
                 # 2) Сбрасываем статусы отчетов
                 from bot.database.models import ReportGenerationStatus as RGS
@@ -719,6 +835,7 @@ class DatabaseService:
                 logger.error(f"❌ Ошибка при сбросе состояния пользователя {telegram_id}: {e}")
                 raise e
     
+    @invalidates_user
     async def clear_report_statuses(self, telegram_id: int) -> bool:
         """Очистить статусы отчетов пользователя"""
         async with async_session() as session:
@@ -746,6 +863,7 @@ class DatabaseService:
                 await session.rollback()
                 raise e
     
+    @invalidates_user
     async def reset_stuck_reports(self, telegram_id: int) -> bool:
         """Сбросить зависшие отчеты (которые в статусе PROCESSING слишком долго)"""
         async with async_session() as session:
@@ -765,7 +883,13 @@ class DatabaseService:
                 logger.info(f"📊 Статус бесплатного отчета: {user.free_report_status}")
                 logger.info(f"📊 Статус премиум отчета: {user.premium_report_status}")
                 logger.info(f"⏰ Время начала генерации: {user.report_generation_started_at}")
-                
+
+                # Задача в очереди или воркер продлевает аренду - отчет не завис, а ждет/генерируется
+                from bot.services.report_queue import report_queue
+                if await report_queue.has_active_job(telegram_id):
+                    logger.info(f"📊 У пользователя {telegram_id} есть активная задача в очереди отчетов")
+                    return False
+
                 # Проверяем, не завис ли отчет в статусе PROCESSING
                 if user.report_generation_started_at:
                     # Если отчет генерируется больше 10 минут, считаем его зависшим
@@ -800,6 +924,159 @@ class DatabaseService:
                 logger.error(f"❌ Ошибка при сбросе зависших отчетов для пользователя {telegram_id}: {e}")
                 raise e
     
+    # --- Реестр файлов отчетов ---
+    
+    async def create_report_artifact(self, telegram_id: int, kind: str, path: str,
+                                     size: int = None, sha256: str = None) -> ReportArtifact:
+        """Зарегистрировать готовый файл отчета (kind: free / premium)"""
+        async with async_session() as session:
+            stmt = select(User).where(User.telegram_id == telegram_id)
+            result = await session.execute(stmt)
+            user = result.scalar_one()
+            
+            artifact = ReportArtifact(
+                user_id=user.id,
+                kind=kind,
+                path=path,
+                size=size,
+                sha256=sha256,
+                created_at=datetime.utcnow(),
+                test_completed_at=user.test_completed_at
+            )
+            session.add(artifact)
+            await session.commit()
+            await session.refresh(artifact)
+            
+            logger.info(f"🗂️ Отчет {kind} зарегистрирован для пользователя {telegram_id}: {path} ({size} байт)")
+            return artifact
+    
+    async def get_latest_report_artifact(self, telegram_id: int, kind: str,
+                                         created_after: datetime = None) -> Optional[ReportArtifact]:
+        """Получить последний отчет пользователя (опционально - созданный не раньше created_after)"""
+        async with async_session() as session:
+            stmt = (
+                select(ReportArtifact)
+                .join(User, User.id == ReportArtifact.user_id)
+                .where(User.telegram_id == telegram_id, ReportArtifact.kind == kind)
+            )
+            if created_after:
+                stmt = stmt.where(ReportArtifact.created_at >= created_after)
+            stmt = stmt.order_by(ReportArtifact.created_at.desc()).limit(1)
+            result = await session.execute(stmt)
+            return result.scalar_one_or_none()
+    
+    async def get_report_artifact_by_hash(self, telegram_id: int, kind: str, sha256: str) -> Optional[ReportArtifact]:
+        """Получить отчет пользователя по хэшу содержимого"""
+        async with async_session() as session:
+            stmt = (
+                select(ReportArtifact)
+                .join(User, User.id == ReportArtifact.user_id)
+                .where(
+                    User.telegram_id == telegram_id,
+                    ReportArtifact.kind == kind,
+                    ReportArtifact.sha256 == sha256
+                )
+                .order_by(ReportArtifact.created_at.desc())
+                .limit(1)
+            )
+            result = await session.execute(stmt)
+            return result.scalar_one_or_none()
+    
+    async def delete_report_artifacts(self, telegram_id: int, kind: str) -> int:
+        """Удалить файлы и записи отчетов пользователя указанного типа"""
+        async with async_session() as session:
+            report_paths = await self._delete_report_artifacts(session, telegram_id, kind)
+            await session.commit()
+        
+        self._unlink_report_files(report_paths, kind)
+        return len(report_paths)
+    
+    @staticmethod
+    async def _delete_report_artifacts(session, telegram_id: int, kind: str) -> List[str]:
+        """Удалить записи отчетов в переданной сессии и вернуть пути файлов (удаляются после commit)"""
+        stmt = (
+            select(ReportArtifact)
+            .join(User, User.id == ReportArtifact.user_id)
+            .where(User.telegram_id == telegram_id, ReportArtifact.kind == kind)
+        )
+        result = await session.execute(stmt)
+        artifacts = result.scalars().all()
+        
+        for artifact in artifacts:
+            await session.delete(artifact)
+        return [artifact.path for artifact in artifacts]
+    
+    @staticmethod
+    def _unlink_report_files(report_paths: List[str], kind: str):
+        for report_path in report_paths:
+            try:
+                Path(report_path).unlink(missing_ok=True)
+                logger.info(f"🗑️ Удален старый {kind} отчет: {report_path}")
+            except Exception as e:
+                logger.warning(f"⚠️ Не удалось удалить старый отчет {report_path}: {e}")
+    
+    # --- Сохраненные разделы платного анализа ---
+    
+    async def get_analysis_checkpoints(self, telegram_id: int, answers_hash: str) -> dict:
+        """Сохраненные разделы анализа для набора ответов: {section_key: content}.
+        
+        Разделы, сохраненные для других ответов пользователя, удаляются - они устарели.
+        """
+        async with async_session() as session:
+            user_id = (await session.execute(
+                select(User.id).where(User.telegram_id == telegram_id)
+            )).scalar_one_or_none()
+            if user_id is None:
+                return {}
+            
+            await session.execute(
+                AnalysisCheckpoint.__table__.delete().where(
+                    AnalysisCheckpoint.user_id == user_id,
+                    AnalysisCheckpoint.answers_hash != answers_hash
+                )
+            )
+            await session.commit()
+            
+            stmt = select(AnalysisCheckpoint.section_key, AnalysisCheckpoint.content).where(
+                AnalysisCheckpoint.user_id == user_id,
+                AnalysisCheckpoint.answers_hash == answers_hash
+            )
+            result = await session.execute(stmt)
+            return {section_key: content for section_key, content in result.all()}
+    
+    async def save_analysis_checkpoint(self, telegram_id: int, answers_hash: str, section_key: str, content: str):
+        """Сохранить готовый раздел анализа (перезаписывает предыдущий результат раздела)"""
+        user_id = await self._get_user_id(telegram_id)
+        stmt = upsert_insert(AnalysisCheckpoint).values(
+            user_id=user_id,
+            answers_hash=answers_hash,
+            section_key=section_key,
+            content=content,
+            created_at=datetime.utcnow()
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[AnalysisCheckpoint.user_id, AnalysisCheckpoint.answers_hash, AnalysisCheckpoint.section_key],
+            set_={"content": stmt.excluded.content, "created_at": stmt.excluded.created_at}
+        )
+        async with async_session() as session:
+            await session.execute(stmt)
+            await session.commit()
+    
+    async def delete_analysis_checkpoints(self, telegram_id: int) -> int:
+        """Удалить все сохраненные разделы анализа пользователя (после успешной сборки отчета)"""
+        async with async_session() as session:
+            user_id = (await session.execute(
+                select(User.id).where(User.telegram_id == telegram_id)
+            )).scalar_one_or_none()
+            if user_id is None:
+                return 0
+            
+            result = await session.execute(
+                AnalysisCheckpoint.__table__.delete().where(AnalysisCheckpoint.user_id == user_id)
+            )
+            await session.commit()
+            return result.rowcount
+    
     # --- Методы для админки ---
     
     async def get_all_users(self) -> List[User]:
@@ -809,79 +1086,182 @@ class DatabaseService:
             result = await session.execute(stmt)
             return result.scalars().all()
     
+    @staticmethod
+    def _has_premium_clause():
+        """Купил ли пользователь премиум (те же признаки, что раньше проверялись в админке)"""
+        paid_exists = exists().where(
+            Payment.user_id == User.id,
+            Payment.status == PaymentStatus.COMPLETED
+        )
+        # NULL в флагах (старые строки) считаем False, иначе NOT(...) для фильтра "нет" дает NULL
+        return or_(
+            func.coalesce(User.is_premium_paid, False) == True,  # Новый способ
+            and_(func.coalesce(User.is_paid, False) == True, paid_exists),  # Старый способ - есть оплата
+            and_(User.premium_report_path.isnot(None), User.premium_report_path != "")  # Есть премиум отчет
+        )
+    
+    def _users_filter_clause(self, filter_premium: str = "all", filter_free_report: str = "all"):
+        """Условие WHERE для фильтров списка пользователей (all / yes / no)"""
+        conditions = []
+        
+        if filter_premium in ("yes", "no"):
+            has_premium = self._has_premium_clause()
+            conditions.append(has_premium if filter_premium == "yes" else not_(has_premium))
+        
+        has_free_report = and_(User.free_report_path.isnot(None), User.free_report_path != "")
+        if filter_free_report == "yes":
+            conditions.append(has_free_report)
+        elif filter_free_report == "no":
+            conditions.append(not_(has_free_report))
+        
+        return and_(*conditions) if conditions else true()
+    
+    async def get_users_page(self, filter_premium: str = "all", filter_free_report: str = "all",
+                             limit: int = 5, after: Tuple[datetime, int] = None,
+                             before: Tuple[datetime, int] = None, offset: int = 0) -> dict:
+        """Страница пользователей (новые сверху) с фильтрами на стороне БД.
+        
+        Пагинация по ключу (created_at, id): after - следующая страница после
+        последней строки, before - предыдущая перед первой строкой. offset
+        используется, только если курсор не передан.
+        
+        Возвращает items - список (User, has_premium), total - количество по
+        фильтрам, total_all - всего пользователей, has_more - есть ли строки
+        дальше в направлении запроса.
+        """
+        where = self._users_filter_clause(filter_premium, filter_free_report)
+        key = tuple_(User.created_at, User.id)
+        
+        stmt = select(User, self._has_premium_clause().label("has_premium")).where(where)
+        if after is not None:
+            stmt = stmt.where(key < tuple_(*after)).order_by(User.created_at.desc(), User.id.desc())
+        elif before is not None:
+            stmt = stmt.where(key > tuple_(*before)).order_by(User.created_at.asc(), User.id.asc())
+        else:
+            stmt = stmt.order_by(User.created_at.desc(), User.id.desc()).offset(offset)
+        # Лишняя строка показывает, есть ли еще страница
+        stmt = stmt.limit(limit + 1)
+        
+        async with async_session() as session:
+            rows = (await session.execute(stmt)).all()
+            counts = (await session.execute(
+                select(func.count(User.id).filter(where), func.count(User.id))
+            )).one()
+        
+        has_more = len(rows) > limit
+        items = [(row[0], bool(row[1])) for row in rows[:limit]]
+        if before is not None:
+            items.reverse()
+        
+        return {
+            "items": items,
+            "total": counts[0],
+            "total_all": counts[1],
+            "has_more": has_more
+        }
+    
     async def get_free_reports_count(self) -> int:
         """Получить количество запущенных бесплатных отчетов"""
-        async with async_session() as session:
-            stmt = select(User).where(
-                User.free_report_status.in_([
-                    ReportGenerationStatus.PROCESSING,
-                    ReportGenerationStatus.COMPLETED
-                ])
-            )
-            result = await session.execute(stmt)
-            users = result.scalars().all()
-            return len(users)
+        return await self._count_users(User.free_report_status.in_([
+            ReportGenerationStatus.PROCESSING,
+            ReportGenerationStatus.COMPLETED
+        ]))
     
     async def get_premium_reports_count(self) -> int:
         """Получить количество запущенных премиум отчетов"""
+        return await self._count_users(User.premium_report_status.in_([
+            ReportGenerationStatus.PROCESSING,
+            ReportGenerationStatus.COMPLETED
+        ]))
+    
+    async def _count_users(self, condition) -> int:
         async with async_session() as session:
-            stmt = select(User).where(
-                User.premium_report_status.in_([
-                    ReportGenerationStatus.PROCESSING,
-                    ReportGenerationStatus.COMPLETED
-                ])
-            )
-            result = await session.execute(stmt)
-            users = result.scalars().all()
-            return len(users)
+            return await self._count_users_in(session, condition)
+    
+    @staticmethod
+    async def _count_users_in(session, condition) -> int:
+        return (await session.execute(select(func.count(User.id)).where(condition))).scalar_one()
+    
+    async def get_report_status_overview(self, report_type: str, limit: int, offset: int = 0) -> dict:
+        """Экран отчетов в админке: пользователи в обработке, страница завершенных и их количество.
+        
+        Количество в обработке - длина списка, количество завершенных - COUNT() OVER
+        в том же запросе, что и страница, поэтому заголовок не расходится со списками.
+        """
+        column = User.free_report_status if report_type == "free" else User.premium_report_status
+        completed_stmt = (
+            select(User, func.count(User.id).over().label("total"))
+            .where(column == ReportGenerationStatus.COMPLETED)
+            .order_by(User.id)
+            .offset(offset)
+            .limit(limit)
+        )
+        
+        async with async_session() as session:
+            processing_users = (await session.execute(
+                select(User).where(column == ReportGenerationStatus.PROCESSING).order_by(User.id)
+            )).scalars().all()
+            rows = (await session.execute(completed_stmt)).all()
+            if rows:
+                completed = rows[0].total
+            else:
+                # Страница за пределами списка - количество отдельным запросом
+                completed = await self._count_users_in(session, column == ReportGenerationStatus.COMPLETED)
+        
+        return {
+            "processing_users": processing_users,
+            "completed_users": [row[0] for row in rows],
+            "processing": len(processing_users),
+            "completed": completed,
+            "launched": len(processing_users) + completed,
+        }
     
     async def get_all_report_links(self) -> List[dict]:
-        """Получить все ссылки на отчеты пользователей"""
+        """Получить все ссылки на отчеты пользователей (последний отчет каждого типа)"""
         async with async_session() as session:
-            stmt = select(User).where(
-                (User.free_report_path.isnot(None)) | (User.premium_report_path.isnot(None))
+            latest_ids = (
+                select(func.max(ReportArtifact.id))
+                .group_by(ReportArtifact.user_id, ReportArtifact.kind)
+            )
+            stmt = (
+                select(ReportArtifact, User)
+                .join(User, User.id == ReportArtifact.user_id)
+                .where(ReportArtifact.id.in_(latest_ids))
+                .order_by(User.telegram_id, ReportArtifact.kind)
             )
             result = await session.execute(stmt)
-            users = result.scalars().all()
             
             links = []
-            for user in users:
-                if user.free_report_path:
-                    links.append({
-                        "telegram_id": user.telegram_id,
-                        "type": "free",
-                        "path": user.free_report_path,
-                        "status": user.free_report_status.value if user.free_report_status else None
-                    })
-                if user.premium_report_path:
-                    links.append({
-                        "telegram_id": user.telegram_id,
-                        "type": "premium",
-                        "path": user.premium_report_path,
-                        "status": user.premium_report_status.value if user.premium_report_status else None
-                    })
+            for artifact, user in result.all():
+                status = user.free_report_status if artifact.kind == "free" else user.premium_report_status
+                links.append({
+                    "telegram_id": user.telegram_id,
+                    "type": artifact.kind,
+                    "path": artifact.path,
+                    "size": artifact.size,
+                    "created_at": artifact.created_at,
+                    "status": status.value if status else None
+                })
             
             return links
     
     async def get_users_answers_count(self) -> List[dict]:
         """Получить количество ответов для каждого пользователя"""
+        answers_count = func.count(Answer.id).label("answers_count")
+        stmt = (
+            select(User.telegram_id, answers_count)
+            .outerjoin(Answer, Answer.user_id == User.id)
+            .group_by(User.id)
+            # Сортируем по количеству ответов (по убыванию); id - стабильный порядок
+            # при равных количествах, иначе страницы списка в админке перемешиваются
+            .order_by(answers_count.desc(), User.id)
+        )
         async with async_session() as session:
-            # Получаем всех пользователей с их ответами
-            stmt = select(User).options(selectinload(User.answers))
             result = await session.execute(stmt)
-            users = result.scalars().all()
-            
-            stats = []
-            for user in users:
-                answers_count = len(user.answers) if user.answers else 0
-                stats.append({
-                    "telegram_id": user.telegram_id,
-                    "answers_count": answers_count
-                })
-            
-            # Сортируем по количеству ответов (по убыванию)
-            stats.sort(key=lambda x: x["answers_count"], reverse=True)
-            return stats
+            return [
+                {"telegram_id": row.telegram_id, "answers_count": row.answers_count}
+                for row in result.all()
+            ]
     
     async def get_all_active_users(self) -> List[User]:
         """Получить всех активных пользователей для рассылки"""
@@ -0,0 +1,51 @@
+"""
+Ожидание смены статуса оплаты.
+
+Страница оплаты раньше опрашивала профиль каждые 3 секунды, пока пользователь
+находится на Robokassa. Теперь она делает long-poll запрос /payment-status,
+который ждет здесь сигнала и отвечает сразу после смены статуса оплаты.
+Об успешной оплате сигналит upgrade_to_premium_and_continue_test (после commit
+перевода на премиум), об ошибке или отмене - update_payment_status.
+"""
+import asyncio
+from typing import Dict, Set
+
+
+class PaymentStatusNotifier:
+    """Ожидающие запросы по id пользователя (users.id)"""
+
+    def __init__(self):
+        self._waiters: Dict[int, Set[asyncio.Future]] = {}
+        self.notifications = 0
+
+    def watch(self, user_id: int) -> asyncio.Future:
+        """Зарегистрировать ожидание до чтения статуса, чтобы не пропустить сигнал"""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(user_id, set()).add(future)
+        return future
+
+    def unwatch(self, user_id: int, future: asyncio.Future):
+        """Снять ожидание (ответ отправлен или истек таймаут)"""
+        waiters = self._waiters.get(user_id)
+        if not waiters:
+            return
+        waiters.discard(future)
+        if not waiters:
+            del self._waiters[user_id]
+
+    def notify(self, user_id: int, status: str):
+        """Разбудить все запросы пользователя"""
+        self.notifications += 1
+        for future in self._waiters.pop(user_id, ()):
+            if not future.done():
+                future.set_result(status)
+
+    def get_stats(self) -> dict:
+        return {
+            "waiting": sum(len(waiters) for waiters in self._waiters.values()),
+            "notifications": self.notifications,
+        }
+
+
+# Создаем экземпляр ожидания оплаты
+payment_events = PaymentStatusNotifier()
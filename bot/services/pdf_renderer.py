@@ -0,0 +1,187 @@
+"""
+Рендеринг PDF отчетов в пуле процессов.
+
+Сборка отчета (reportlab + PyPDF2) - чисто CPU-работа, которая при вызове
+из async-кода блокирует event loop uvicorn. Здесь рендер выносится в
+ProcessPoolExecutor: в процесс передаются только picklable данные -
+словарь анализа и отображаемые поля пользователя.
+
+Каждый процесс пула при старте прогревает свой кэш шаблонов
+(см. pdf_template_cache) и возвращает его счетчики вместе с результатом.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from bot.config import PDF_RENDER_POOL_SIZE, PDF_RENDER_TIMEOUT_SECONDS
+from bot.database.models import User
+from bot.services.pdf_template_cache import template_cache, preload_templates
+
+
+@dataclass(frozen=True)
+class ReportUserData:
+    """Снимок полей пользователя, нужных для рендера отчета"""
+    telegram_id: int
+    name: Optional[str] = None
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    username: Optional[str] = None
+
+    @classmethod
+    def from_user(cls, user: User) -> "ReportUserData":
+        return cls(
+            telegram_id=user.telegram_id,
+            name=user.name,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            username=user.username
+        )
+
+
+def _render_report(report_type: str, user_data: ReportUserData, analysis_result: Dict) -> Dict:
+    """Точка входа в дочернем процессе: собрать PDF и вернуть метаданные файла (path, size, sha256)"""
+    from bot.services.pdf_service import ReportGenerator
+
+    generator = ReportGenerator()
+    if report_type == "premium":
+        report_path = generator.create_premium_pdf_report(user_data, analysis_result)
+    else:
+        report_path = generator.create_pdf_report(user_data, analysis_result)
+    artifact = generator.describe_artifact(report_path)
+    artifact["template_cache"] = _template_cache_stats()
+    return artifact
+
+
+def _template_cache_stats() -> Dict:
+    """Счетчики кэша шаблонов текущего процесса"""
+    return {"pid": os.getpid(), **template_cache.get_stats()}
+
+
+class PDFRenderService:
+    """Асинхронный фасад над пулом процессов для рендера PDF"""
+
+    def __init__(self, pool_size: int = PDF_RENDER_POOL_SIZE, timeout: int = PDF_RENDER_TIMEOUT_SECONDS):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        # Последние счетчики кэша шаблонов по процессам (pid -> stats)
+        self._template_cache_stats: Dict[int, Dict] = {}
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.pool_size <= 0:
+            return None
+        if self._executor is None:
+            # spawn: дочерние процессы не наследуют event loop и потоки родителя
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.pool_size,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=preload_templates
+            )
+        return self._executor
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        # Не больше задач, чем процессов: задача отправляется в пул только при свободном
+        # процессе, поэтому таймаут отсчитывается от начала рендера, а не от постановки в очередь
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pool_size)
+        return self._slots
+
+    def _recycle(self, executor: ProcessPoolExecutor):
+        """Завершить процессы пула и пересоздать его при следующем вызове.
+
+        wait_for по таймауту только перестает ждать future - процесс продолжил бы
+        рендер и занимал место в пуле. ProcessPoolExecutor (Python 3.11) не умеет
+        останавливать отдельную задачу, поэтому завершаем процессы пула целиком.
+        """
+        processes = list((executor._processes or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        if self._executor is executor:
+            self._executor = None
+            self._template_cache_stats.clear()
+
+    async def render(self, report_type: str, user: User, analysis_result: Dict) -> Dict:
+        """Отрендерить отчет (free / premium) и вернуть {"path", "size", "sha256"}"""
+        user_data = user if isinstance(user, ReportUserData) else ReportUserData.from_user(user)
+
+        if self.pool_size <= 0:
+            try:
+                artifact = await asyncio.wait_for(
+                    asyncio.to_thread(_render_report, report_type, user_data, analysis_result),
+                    timeout=self.timeout
+                )
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"Рендер PDF отчета превысил {self.timeout} секунд")
+        else:
+            async with self._get_slots():
+                artifact = await self._render_in_pool(report_type, user_data, analysis_result)
+
+        stats = artifact.pop("template_cache", None)
+        if stats:
+            self._template_cache_stats[stats.pop("pid")] = stats
+            print(f"📄 Кэш шаблонов: попаданий {stats['hits']}, промахов {stats['misses']}")
+        return artifact
+
+    async def _render_in_pool(self, report_type: str, user_data: ReportUserData, analysis_result: Dict) -> Dict:
+        loop = asyncio.get_running_loop()
+        # Вторая попытка - если пул перезапустили из-за таймаута соседнего рендера
+        for attempt in range(2):
+            executor = self._get_executor()
+            future = loop.run_in_executor(executor, _render_report, report_type, user_data, analysis_result)
+            try:
+                return await asyncio.wait_for(future, timeout=self.timeout)
+            except asyncio.TimeoutError:
+                print(f"⚠️ Рендер PDF отчета превысил {self.timeout} секунд, перезапускаем пул процессов")
+                self._recycle(executor)
+                raise TimeoutError(f"Рендер PDF отчета превысил {self.timeout} секунд")
+            except BrokenProcessPool:
+                if executor is not self._executor and attempt == 0:
+                    continue
+                # Процесс рендера упал (например, OOM) - пересоздадим пул при следующем вызове
+                print("⚠️ Пул процессов рендера PDF поврежден, пересоздаем")
+                self._recycle(executor)
+                raise
+
+    async def warm_up(self):
+        """Запустить процессы пула заранее, чтобы они прогрели кэш шаблонов до первого отчета"""
+        executor = self._get_executor()
+        if executor is None:
+            await asyncio.to_thread(preload_templates)
+            return
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*[
+            loop.run_in_executor(executor, _template_cache_stats)
+            for _ in range(self.pool_size)
+        ])
+        for stats in results:
+            self._template_cache_stats[stats.pop("pid")] = stats
+
+    def get_template_cache_stats(self) -> Dict:
+        """Суммарные счетчики кэша шаблонов по всем процессам рендера"""
+        if self._executor is None and self.pool_size <= 0:
+            return template_cache.get_stats()
+        total = {"processes": len(self._template_cache_stats), "templates": 0, "hits": 0, "misses": 0}
+        for stats in self._template_cache_stats.values():
+            total["templates"] = max(total["templates"], stats["templates"])
+            total["hits"] += stats["hits"]
+            total["misses"] += stats["misses"]
+        return total
+
+    def shutdown(self):
+        """Остановить пул процессов"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._template_cache_stats.clear()
+        self._slots = None
+
+
+# Создаем экземпляр сервиса
+pdf_renderer = PDFRenderService()
@@ -1,11 +1,17 @@
 import os
 import re
+import time
+import uuid
+import shutil
+import hashlib
+import tempfile
+from contextlib import contextmanager
 from typing import List, Dict
 from datetime import datetime
 from pathlib import Path
 
 # PDF библиотеки
-from PyPDF2 import PdfWriter, PdfReader
+from PyPDF2 import PdfWriter, PdfReader, PageObject
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfbase import pdfmetrics
@@ -14,6 +20,30 @@ from io import BytesIO
 from reportlab.lib.colors import Color
 
 from bot.database.models import User
+from bot.services.pdf_template_cache import template_cache
+
+# Суффикс недописанных файлов отчетов (см. atomic_output)
+PARTIAL_SUFFIX = ".part"
+# Устаревшие общие папки для временных файлов (до сборки PDF в памяти)
+LEGACY_SCRATCH_DIRS = ("temp", "temp_free", "temp_premium")
+
+
+@contextmanager
+def atomic_output(output_path: Path, mode: str = 'wb', **kwargs):
+    """Атомарная запись файла: пишем в уникальный временный файл рядом и переименовываем.
+
+    Параллельные рендеры не видят и не перетирают недописанные файлы друг друга,
+    а при ошибке временный файл гарантированно удаляется.
+    """
+    output_path = Path(output_path)
+    fd, tmp_name = tempfile.mkstemp(dir=output_path.parent, prefix=f".{output_path.name}.", suffix=PARTIAL_SUFFIX)
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+        os.replace(tmp_name, output_path)
+    finally:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
 
 
 class PDFGenerator:
@@ -338,9 +368,20 @@ class PDFGenerator:
         return lines
 
     def create_text_pages(self, text: str, template_path: Path, page_width: float = A4[0], page_height: float = A4[1]) -> list:
-        """Создание одной или нескольких PDF страниц с текстом на основе шаблона. Корректный перенос по ширине и стилю, цвет и шрифт по ТЗ."""
+        """Создание одной или нескольких PDF страниц с текстом на основе шаблона (каждая страница - отдельный BytesIO)"""
+        pages = self.create_text_page_objects(text, template_path, page_width, page_height)
+        return [self._page_to_buffer(page) for page in pages]
+
+    def create_text_page_objects(self, text: str, template_path: Path, page_width: float = A4[0], page_height: float = A4[1],
+                                 continuation_template_path: Path = None) -> list:
+        """Создание одной или нескольких страниц (PageObject) с текстом на основе шаблона. Корректный перенос по ширине и стилю, цвет и шрифт по ТЗ.
+        
+        Если задан continuation_template_path, страницы переноса (со второй) накладываются на этот шаблон.
+        """
         if not template_path.exists():
             raise FileNotFoundError(f"Шаблон не найден: {template_path}")
+        if continuation_template_path and not continuation_template_path.exists():
+            raise FileNotFoundError(f"Шаблон не найден: {continuation_template_path}")
         text = self.clean_markdown_text(text)
         
         # Проверяем, не пустой ли текст после очистки
@@ -489,8 +530,8 @@ class PDFGenerator:
         print(f"📄 Создано страниц для отрисовки: {len(pages)}")
         
         # Генерируем PDF для каждой страницы
-        result_buffers = []
-        for page_lines in pages:
+        result_pages = []
+        for page_index, page_lines in enumerate(pages):
             text_buffer = BytesIO()
             text_canvas = canvas.Canvas(text_buffer, pagesize=A4)
             y_position = page_height - top_margin
@@ -561,18 +602,25 @@ class PDFGenerator:
             
             text_canvas.save()
             text_buffer.seek(0)
-            template_reader = PdfReader(str(template_path))
-            template_page = template_reader.pages[0]
+            page_template_path = template_path
+            if page_index > 0 and continuation_template_path:
+                page_template_path = continuation_template_path
+            # Копия страницы шаблона из кэша (сам кэшированный шаблон не изменяется)
+            template_page = template_cache.copy_page(page_template_path)
             text_reader = PdfReader(text_buffer)
             text_page = text_reader.pages[0]
             template_page.merge_page(text_page)
-            result_buffer = BytesIO()
-            writer = PdfWriter()
-            writer.add_page(template_page)
-            writer.write(result_buffer)
-            result_buffer.seek(0)
-            result_buffers.append(result_buffer)
-        return result_buffers
+            result_pages.append(template_page)
+        return result_pages
+
+    def _page_to_buffer(self, page: PageObject) -> BytesIO:
+        """Сериализовать одну страницу в отдельный PDF в памяти"""
+        result_buffer = BytesIO()
+        writer = PdfWriter()
+        writer.add_page(page)
+        writer.write(result_buffer)
+        result_buffer.seek(0)
+        return result_buffer
 
     # Оставляем старый create_text_page для обратной совместимости
     def create_text_page(self, text: str, template_path: Path, page_width: float = A4[0], page_height: float = A4[1]) -> BytesIO:
@@ -580,23 +628,32 @@ class PDFGenerator:
         pages = self.create_text_pages(text, template_path, page_width, page_height)
         return pages[0] if pages else BytesIO()
     
-    def combine_pdfs(self, pdf_parts: List[Path], output_path: Path) -> bool:
-        """Объединение PDF файлов в один"""
+    def combine_pdfs(self, pdf_parts: list, output_path: Path) -> bool:
+        """Объединение частей отчета в один PDF с единственной записью на диск.
+        
+        Части могут быть путями к PDF (статичные шаблоны), BytesIO или готовыми страницами (PageObject).
+        """
         
         try:
             writer = PdfWriter()
             
-            for pdf_path in pdf_parts:
-                if pdf_path.exists():
-                    reader = PdfReader(str(pdf_path))
-                    for page in reader.pages:
+            for part in pdf_parts:
+                if isinstance(part, PageObject):
+                    writer.add_page(part)
+                elif isinstance(part, BytesIO):
+                    part.seek(0)
+                    for page in PdfReader(part).pages:
+                        writer.add_page(page)
+                elif Path(part).exists():
+                    # Статичные шаблоны берем из кэша: add_page клонирует страницу
+                    for page in template_cache.get_pages(Path(part)):
                         writer.add_page(page)
                 else:
-                    print(f"⚠️ Файл не найден: {pdf_path}")
+                    print(f"⚠️ Файл не найден: {part}")
                     return False
             
-            # Сохраняем объединенный PDF
-            with open(output_path, 'wb') as output_file:
+            # Сохраняем объединенный PDF (атомарно)
+            with atomic_output(output_path) as output_file:
                 writer.write(output_file)
             
             return True
@@ -607,6 +664,10 @@ class PDFGenerator:
     
     def create_custom_title_page(self, template_path: Path, user_name: str, completion_date: str) -> BytesIO:
         """Создание титульной страницы с данными пользователя"""
+        return self._page_to_buffer(self.create_custom_title_page_object(template_path, user_name, completion_date))
+    
+    def create_custom_title_page_object(self, template_path: Path, user_name: str, completion_date: str) -> PageObject:
+        """Создание титульной страницы с данными пользователя (PageObject для сборки в памяти)"""
         
         if not template_path.exists():
             raise FileNotFoundError(f"Шаблон титульной страницы не найден: {template_path}")
@@ -641,20 +702,13 @@ class PDFGenerator:
         text_canvas.save()
         text_buffer.seek(0)
         
-        # Объединяем с шаблоном
-        template_reader = PdfReader(str(template_path))
-        template_page = template_reader.pages[0]
+        # Объединяем с копией шаблона из кэша
+        template_page = template_cache.copy_page(template_path)
         text_reader = PdfReader(text_buffer)
         text_page = text_reader.pages[0]
         template_page.merge_page(text_page)
         
-        result_buffer = BytesIO()
-        writer = PdfWriter()
-        writer.add_page(template_page)
-        writer.write(result_buffer)
-        result_buffer.seek(0)
-        
-        return result_buffer
+        return template_page
 
 
 class ReportGenerator:
@@ -666,12 +720,55 @@ class ReportGenerator:
         self.template_dir = Path("template_pdf")
         self.pdf_generator = PDFGenerator()
     
+    def _new_report_path(self, prefix: str, user: User, extension: str) -> Path:
+        """Уникальный путь отчета: к метке времени добавляется случайный суффикс,
+        чтобы параллельные рендеры одного пользователя не писали в один файл"""
+        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        return self.reports_dir / f"{prefix}_{user.telegram_id}_{timestamp}_{uuid.uuid4().hex[:8]}.{extension}"
+    
+    def cleanup_scratch(self, max_age_seconds: int = 3600) -> int:
+        """Удаление устаревших общих папок temp* и брошенных .part файлов (после падения процесса).
+        
+        Вызывается при старте приложения. Возвращает количество удаленных объектов.
+        """
+        removed = 0
+        for dir_name in LEGACY_SCRATCH_DIRS:
+            scratch_dir = self.reports_dir / dir_name
+            if scratch_dir.is_dir():
+                shutil.rmtree(scratch_dir, ignore_errors=True)
+                removed += 1
+        
+        # Недописанные файлы моложе max_age_seconds могут принадлежать идущему рендеру
+        threshold = time.time() - max_age_seconds
+        for partial in self.reports_dir.glob(f".*{PARTIAL_SUFFIX}"):
+            try:
+                if partial.stat().st_mtime < threshold:
+                    partial.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        
+        if removed:
+            print(f"🧹 Удалено временных объектов отчетов: {removed}")
+        return removed
+    
+    @staticmethod
+    def describe_artifact(report_path: str) -> Dict:
+        """Метаданные готового файла отчета для реестра report_artifacts"""
+        sha256 = hashlib.sha256()
+        with open(report_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha256.update(chunk)
+        return {
+            "path": str(report_path),
+            "size": os.path.getsize(report_path),
+            "sha256": sha256.hexdigest()
+        }
+    
     def create_text_report(self, user: User, analysis_result: Dict) -> str:
         """Создание текстового отчета с результатами анализа (временно вместо PDF)"""
         
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        filename = f"prizma_report_{user.telegram_id}_{timestamp}.txt"
-        filepath = self.reports_dir / filename
+        filepath = self._new_report_path("prizma_report", user, "txt")
         
         # Очищаем тексты от markdown разметки
         page3_clean = self.pdf_generator.clean_markdown_text(analysis_result.get('page3_analysis', 'Анализ не доступен'))
@@ -703,77 +800,42 @@ class ReportGenerator:
 """
         
         # Сохраняем файл
-        with open(filepath, 'w', encoding='utf-8') as f:
+        with atomic_output(filepath, 'w', encoding='utf-8') as f:
             f.write(report_content)
         
         return str(filepath)
     
     def create_pdf_report(self, user: User, analysis_result: Dict) -> str:
         """Создание полного PDF отчета на основе шаблонов, с переносом текста на доп. страницы шаблона 4.pdf"""
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        filename = f"prizma_report_{user.telegram_id}_{timestamp}.pdf"
-        output_path = self.reports_dir / filename
+        output_path = self._new_report_path("prizma_report", user, "pdf")
         try:
-            temp_dir = self.reports_dir / "temp"
-            temp_dir.mkdir(exist_ok=True)
-            temp_files = []
+            # Страницы с анализом собираются в памяти (PageObject), без временных файлов
+            analysis_pages = []
             # Страница 3 (шаблон 3.pdf)
             if analysis_result.get('page3_analysis'):
-                template3_path = self.template_dir / "3.pdf"
-                page3_buffers = self.pdf_generator.create_text_pages(
-                    analysis_result['page3_analysis'], template3_path)
-                for i, buf in enumerate(page3_buffers):
-                    page_path = temp_dir / f"page3_temp_{i+1}.pdf"
-                    with open(page_path, 'wb') as f:
-                        f.write(buf.getvalue())
-                    temp_files.append(page_path)
+                analysis_pages += self.pdf_generator.create_text_page_objects(
+                    analysis_result['page3_analysis'], self.template_dir / "3.pdf")
             # Страница 4 (шаблон 4.pdf, с переносом)
             if analysis_result.get('page4_analysis'):
-                template4_path = self.template_dir / "4.pdf"
-                page4_buffers = self.pdf_generator.create_text_pages(
-                    analysis_result['page4_analysis'], template4_path)
-                for i, buf in enumerate(page4_buffers):
-                    page_path = temp_dir / f"page4_temp_{i+1}.pdf"
-                    with open(page_path, 'wb') as f:
-                        f.write(buf.getvalue())
-                    temp_files.append(page_path)
+                analysis_pages += self.pdf_generator.create_text_page_objects(
+                    analysis_result['page4_analysis'], self.template_dir / "4.pdf")
             # Страница 5 (шаблон 5.pdf, с переносом на 4.pdf)
             if analysis_result.get('page5_analysis'):
-                template5_path = self.template_dir / "5.pdf"
-                page5_buffers = self.pdf_generator.create_text_pages(
-                    analysis_result['page5_analysis'], template5_path)
-                for i, buf in enumerate(page5_buffers):
-                    # первая страница — 5.pdf, остальные — 4.pdf
-                    if i == 0:
-                        page_path = temp_dir / f"page5_temp_1.pdf"
-                        with open(page_path, 'wb') as f:
-                            f.write(buf.getvalue())
-                        temp_files.append(page_path)
-                    else:
-                        # для доп. страниц используем шаблон 4.pdf
-                        template4_path = self.template_dir / "4.pdf"
-                        buf4 = self.pdf_generator.create_text_pages(
-                            '\n'.join(page5_buffers[i].getvalue().decode('latin1').split('\n')), template4_path)[0]
-                        page_path = temp_dir / f"page5_temp_{i+1}.pdf"
-                        with open(page_path, 'wb') as f:
-                            f.write(buf4.getvalue())
-                        temp_files.append(page_path)
+                # первая страница — 5.pdf, остальные — 4.pdf
+                analysis_pages += self.pdf_generator.create_text_page_objects(
+                    analysis_result['page5_analysis'], self.template_dir / "5.pdf",
+                    continuation_template_path=self.template_dir / "4.pdf")
             pdf_parts = [
                 self.template_dir / "1.pdf",
                 self.template_dir / "2.pdf",
             ]
             # Добавляем все страницы 3, 4, 5 (в нужном порядке)
-            for f in temp_files:
-                pdf_parts.append(f)
+            pdf_parts += analysis_pages
             pdf_parts += [
                 self.template_dir / "6.pdf",
                 self.template_dir / "7.pdf",
             ]
             success = self.pdf_generator.combine_pdfs(pdf_parts, output_path)
-            for temp_file in temp_files:
-                if temp_file.exists():
-                    temp_file.unlink()
-            temp_dir.rmdir() if temp_dir.exists() and not list(temp_dir.iterdir()) else None
             if success:
                 print(f"✅ PDF отчет создан: {output_path}")
                 return str(output_path)
@@ -788,49 +850,25 @@ class ReportGenerator:
         Создание упрощенного бесплатного PDF отчета (2.5-3 страницы)
         Использует только базовые шаблоны из template_pdf
         """
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        filename = f"prizma_free_report_{user.telegram_id}_{timestamp}.pdf"
-        output_path = self.reports_dir / filename
+        output_path = self._new_report_path("prizma_free_report", user, "pdf")
         
         try:
-            temp_dir = self.reports_dir / "temp_free"
-            temp_dir.mkdir(exist_ok=True)
-            temp_files = []
-            
-            # Создаем страницы с анализом (используем шаблон 3.pdf для всех страниц)
-            template3_path = self.template_dir / "3.pdf"
+            analysis_pages = []
             
             # Страница 1: Тип личности
             if analysis_result.get('personality_type'):
-                buffers = self.pdf_generator.create_text_pages(
-                    analysis_result['personality_type'], template3_path)
-                for i, buf in enumerate(buffers):
-                    page_path = temp_dir / f"personality_{i+1}.pdf"
-                    with open(page_path, 'wb') as f:
-                        f.write(buf.getvalue())
-                    temp_files.append(page_path)
+                analysis_pages += self.pdf_generator.create_text_page_objects(
+                    analysis_result['personality_type'], self.template_dir / "3.pdf")
             
             # Страница 2: Уникальность
             if analysis_result.get('uniqueness'):
-                template4_path = self.template_dir / "4.pdf"
-                buffers = self.pdf_generator.create_text_pages(
-                    analysis_result['uniqueness'], template4_path)
-                for i, buf in enumerate(buffers):
-                    page_path = temp_dir / f"uniqueness_{i+1}.pdf"
-                    with open(page_path, 'wb') as f:
-                        f.write(buf.getvalue())
-                    temp_files.append(page_path)
+                analysis_pages += self.pdf_generator.create_text_page_objects(
+                    analysis_result['uniqueness'], self.template_dir / "4.pdf")
             
             # Страница 3: Ключевой инсайт
             if analysis_result.get('key_insight'):
-                template5_path = self.template_dir / "5.pdf"
-                buffers = self.pdf_generator.create_text_pages(
-                    analysis_result['key_insight'], template5_path)
-                for i, buf in enumerate(buffers):
-                    page_path = temp_dir / f"insight_{i+1}.pdf"
-                    with open(page_path, 'wb') as f:
-                        f.write(buf.getvalue())
-                    temp_files.append(page_path)
+                analysis_pages += self.pdf_generator.create_text_page_objects(
+                    analysis_result['key_insight'], self.template_dir / "5.pdf")
             
             # Собираем PDF: титульная + аналитические страницы + заключительные
             pdf_parts = [
@@ -838,8 +876,7 @@ class ReportGenerator:
             ]
             
             # Добавляем все аналитические страницы
-            for f in temp_files:
-                pdf_parts.append(f)
+            pdf_parts += analysis_pages
             
             # Добавляем заключительные страницы
             pdf_parts += [
@@ -847,17 +884,9 @@ class ReportGenerator:
                 self.template_dir / "7.pdf",  # Контакты
             ]
             
-            # Объединяем все PDF
+            # Объединяем все части и записываем файл один раз
             success = self.pdf_generator.combine_pdfs(pdf_parts, output_path)
             
-            # Очищаем временные файлы
-            for temp_file in temp_files:
-                if temp_file.exists():
-                    temp_file.unlink()
-            
-            if temp_dir.exists() and not list(temp_dir.iterdir()):
-                temp_dir.rmdir()
-            
             if success:
                 print(f"✅ Бесплатный PDF отчет создан: {output_path}")
                 return str(output_path)
@@ -875,16 +904,9 @@ class ReportGenerator:
     def create_premium_pdf_report(self, user: User, analysis_result: Dict) -> str:
         """Создание платного PDF отчета с использованием template_pdf_premium шаблонов"""
         
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        filename = f"prizma_premium_report_{user.telegram_id}_{timestamp}.pdf"
-        output_path = self.reports_dir / filename
+        output_path = self._new_report_path("prizma_premium_report", user, "pdf")
         
         try:
-            # Создаем временные PDF файлы для всех страниц
-            temp_dir = self.reports_dir / "temp_premium"
-            temp_dir.mkdir(exist_ok=True)
-            
-            temp_files = []
             pdf_parts = []
             
             # Проверяем, есть ли постраничные данные (новая архитектура)
@@ -895,7 +917,7 @@ class ReportGenerator:
                 print(f"📄 Создаем премиум PDF с {len(individual_pages)} отдельными страницами...")
                 
                 # Генерируем отчет по блокам с правильным чередованием статичных и динамических страниц
-                pdf_parts = self._generate_premium_pdf_by_blocks(individual_pages, temp_dir, temp_files, user)
+                pdf_parts = self._generate_premium_pdf_by_blocks(individual_pages, user)
                     
                 print(f"📊 Общее количество страниц в премиум PDF: {len(pdf_parts)} (статичные + ИИ)")
                 
@@ -914,52 +936,20 @@ class ReportGenerator:
                 
                 template_path = self.template_dir / "3.pdf"  # Используем шаблон 3.pdf для всех блоков
                 
-                for block_key, block_name in premium_blocks.items():
-                    if analysis_result.get(block_key):
-                        print(f"📄 Создаем PDF для блока: {block_name}")
-                        
-                        # Используем create_text_pages для автоматического переноса длинного текста
-                        block_buffers = self.pdf_generator.create_text_pages(
-                            analysis_result[block_key], 
-                            template_path
-                        )
-                        
-                        # Обрабатываем все созданные страницы блока
-                        for page_idx, block_buffer in enumerate(block_buffers):
-                            if page_idx == 0:
-                                block_path = temp_dir / f"{block_key}_temp.pdf"
-                            else:
-                                block_path = temp_dir / f"{block_key}_temp_{page_idx+1}.pdf"
-                            
-                            with open(block_path, 'wb') as f:
-                                f.write(block_buffer.getvalue())
-                            temp_files.append(block_path)
-                
-                # Составляем список всех PDF файлов в правильном порядке
-                pdf_parts = []
-                
                 # Добавляем статические страницы в начале (если есть)
                 if (self.template_dir / "1.pdf").exists():
                     pdf_parts.append(self.template_dir / "1.pdf")
                 if (self.template_dir / "2.pdf").exists():
                     pdf_parts.append(self.template_dir / "2.pdf")
                 
-                # Добавляем все блоки платного анализа (включая дополнительные страницы)
-                for block_key in premium_blocks.keys():
-                    # Добавляем основную страницу блока
-                    block_path = temp_dir / f"{block_key}_temp.pdf"
-                    if block_path.exists():
-                        pdf_parts.append(block_path)
-                    
-                    # Добавляем дополнительные страницы блока (если есть)
-                    page_idx = 2  # Начинаем с 2-й страницы
-                    while True:
-                        additional_page = temp_dir / f"{block_key}_temp_{page_idx}.pdf"
-                        if additional_page.exists():
-                            pdf_parts.append(additional_page)
-                            page_idx += 1
-                        else:
-                            break
+                # Добавляем все блоки платного анализа (включая страницы переноса)
+                for block_key, block_name in premium_blocks.items():
+                    if analysis_result.get(block_key):
+                        print(f"📄 Создаем страницы для блока: {block_name}")
+                        pdf_parts += self.pdf_generator.create_text_page_objects(
+                            analysis_result[block_key], 
+                            template_path
+                        )
                 
                 # Добавляем статические страницы в конце (если есть)
                 if (self.template_dir / "6.pdf").exists():
@@ -967,15 +957,9 @@ class ReportGenerator:
                 if (self.template_dir / "7.pdf").exists():
                     pdf_parts.append(self.template_dir / "7.pdf")
             
-            # Объединяем все PDF файлы
+            # Объединяем все части и записываем файл один раз
             success = self.pdf_generator.combine_pdfs(pdf_parts, output_path)
             
-            # Очищаем временные файлы
-            for temp_file in temp_files:
-                if temp_file.exists():
-                    temp_file.unlink()
-            temp_dir.rmdir() if temp_dir.exists() and not list(temp_dir.iterdir()) else None
-            
             if success:
                 pages_count = len(individual_pages) if individual_pages else 6
                 print(f"✅ Платный PDF отчет создан: {output_path} ({pages_count} страниц контента)")
@@ -991,9 +975,7 @@ class ReportGenerator:
     def create_premium_text_report(self, user: User, analysis_result: Dict) -> str:
         """Создание текстового платного отчета с результатами анализа (50 вопросов)"""
         
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        filename = f"prizma_premium_report_{user.telegram_id}_{timestamp}.txt"
-        filepath = self.reports_dir / filename
+        filepath = self._new_report_path("prizma_premium_report", user, "txt")
         
         # Очищаем тексты от markdown разметки
         premium_analysis = self.pdf_generator.clean_markdown_text(analysis_result.get('premium_analysis', 'Анализ не доступен'))
@@ -1052,7 +1034,7 @@ class ReportGenerator:
 """
         
         # Сохраняем файл
-        with open(filepath, 'w', encoding='utf-8') as f:
+        with atomic_output(filepath, 'w', encoding='utf-8') as f:
             f.write(report_content)
         
         return str(filepath)
@@ -1071,8 +1053,11 @@ class ReportGenerator:
             "premium_appendix": "block-9"         # Приложения
         }
     
-    def _generate_premium_pdf_by_blocks(self, individual_pages: dict, temp_dir: Path, temp_files: list, user: User) -> list:
-        """Генерирует премиум PDF с правильным чередованием статичных и динамических страниц"""
+    def _generate_premium_pdf_by_blocks(self, individual_pages: dict, user: User) -> list:
+        """Генерирует премиум PDF с правильным чередованием статичных и динамических страниц.
+
+        Возвращает список частей для combine_pdfs: пути к статичным шаблонам и PageObject сгенерированных страниц.
+        """
         
         pdf_parts = []
         premium_templates_dir = Path("template_pdf_premium")  # Папка с премиум шаблонами
@@ -1121,14 +1106,8 @@ class ReportGenerator:
             completion_date = datetime.utcnow().strftime("%d.%m.%Y")
             
             # Создаем кастомную титульную страницу
-            custom_title_buffer = self.pdf_generator.create_custom_title_page(title_pdf, user_name, completion_date)
-            custom_title_path = temp_dir / "custom_title.pdf"
-            
-            with open(custom_title_path, 'wb') as f:
-                f.write(custom_title_buffer.getvalue())
-            temp_files.append(custom_title_path)
-            
-            pdf_parts.append(custom_title_path)
+            custom_title_page = self.pdf_generator.create_custom_title_page_object(title_pdf, user_name, completion_date)
+            pdf_parts.append(custom_title_page)
             total_pages_added += 1
             
         if title2_pdf.exists():
@@ -1195,36 +1174,15 @@ class ReportGenerator:
                     print(f"   ⚠️ Контент пустой для страницы {global_page}, пропускаем")
                     continue
                 
-                page_buffers = self.pdf_generator.create_text_pages(content, ai_template_path)
+                ai_pages = self.pdf_generator.create_text_page_objects(content, ai_template_path)
                 
-                # Обрабатываем все созданные страницы
-                for page_idx, page_buffer in enumerate(page_buffers):
-                    # Проверяем, не пустой ли буфер
-                    if not page_buffer or page_buffer.getvalue() == b'':
-                        print(f"   ⚠️ Пустой буфер для страницы {global_page}_{page_idx+1}, пропускаем")
-                        continue
-                    
-                    if page_idx == 0:
-                        # Первая страница использует исходный номер
-                        ai_page_path = temp_dir / f"ai_page_{global_page:02d}_temp.pdf"
-                    else:
-                        # Дополнительные страницы получают суффикс
-                        ai_page_path = temp_dir / f"ai_page_{global_page:02d}_{page_idx+1}_temp.pdf"
-                    
-                    with open(ai_page_path, 'wb') as f:
-                        f.write(page_buffer.getvalue())
-                    temp_files.append(ai_page_path)
-                    
-                    pdf_parts.append(ai_page_path)
-                    total_pages_added += 1
-                    
-                    if page_idx == 0:
-                        print(f"   ✅ ИИ ответ сохранен: {ai_page_path}")
-                    else:
-                        print(f"   ✅ Дополнительная страница {page_idx+1}: {ai_page_path}")
+                # Добавляем все созданные страницы (в памяти, без временных файлов)
+                pdf_parts += ai_pages
+                total_pages_added += len(ai_pages)
+                print(f"   ✅ ИИ ответ для страницы {global_page}: {len(ai_pages)} стр.")
                 
-                if len(page_buffers) > 1:
-                    print(f"   📄 Текст перенесен на {len(page_buffers)} страниц")
+                if len(ai_pages) > 1:
+                    print(f"   📄 Текст перенесен на {len(ai_pages)} страниц")
             
             # 3. Добавляем статичный файл note.pdf в конце блока (для заметок пользователя)
             note_pdf = block_templates_dir / "note.pdf"
@@ -0,0 +1,118 @@
+"""
+Кэш разобранных PDF шаблонов.
+
+Шаблоны из template_pdf и template_pdf_premium не меняются между отчетами,
+но раньше каждый отчет заново открывал и разбирал их через PdfReader на
+каждую страницу. Кэш хранит разобранные страницы на уровне процесса
+(у каждого процесса пула рендера свой экземпляр) с ключом путь + mtime:
+измененный на диске шаблон будет перечитан автоматически.
+
+Страницы из кэша общие - их можно передавать в PdfWriter.add_page (он
+клонирует страницу), но нельзя изменять. Для наложения текста используйте
+copy_page, который возвращает новую страницу поверх шаблона.
+"""
+import mmap
+import threading
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from PyPDF2 import PdfReader, PageObject
+
+from bot.config import PDF_TEMPLATE_CACHE_MMAP
+
+# Папки с шаблонами, которые прогреваются при старте
+TEMPLATE_DIRS = (Path("template_pdf"), Path("template_pdf_premium"))
+
+
+class PDFTemplateCache:
+    """Процессный кэш страниц PDF шаблонов с ключом (путь, mtime)"""
+
+    def __init__(self, use_mmap: bool = PDF_TEMPLATE_CACHE_MMAP):
+        self.use_mmap = use_mmap
+        self._entries: Dict[str, Tuple[int, List[PageObject]]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self, path: Path) -> List[PageObject]:
+        with open(path, 'rb') as f:
+            if self.use_mmap:
+                # Страницы разбираются лениво - отображение живет вместе с reader
+                stream = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                stream = BytesIO(f.read())
+        reader = PdfReader(stream)
+        pages = list(reader.pages)
+        # Разрешаем ссылки заранее, чтобы потоки не разбирали reader одновременно
+        for page in pages:
+            page.get_contents()
+        return pages
+
+    def get_pages(self, template_path: Path) -> List[PageObject]:
+        """Страницы шаблона (общие, только для чтения)"""
+        key = str(Path(template_path).resolve())
+        mtime = Path(template_path).stat().st_mtime_ns
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == mtime:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            pages = self._load(Path(template_path))
+            self._entries[key] = (mtime, pages)
+            return pages
+
+    def get_page(self, template_path: Path, index: int = 0) -> PageObject:
+        """Одна страница шаблона (общая, только для чтения)"""
+        return self.get_pages(template_path)[index]
+
+    def copy_page(self, template_path: Path, index: int = 0) -> PageObject:
+        """Новая страница с содержимым шаблона, которую можно изменять (merge_page и т.п.)"""
+        template_page = self.get_page(template_path, index)
+        page = PageObject.create_blank_page(
+            width=template_page.mediabox.width,
+            height=template_page.mediabox.height
+        )
+        page.merge_page(template_page)
+        return page
+
+    def preload(self, template_dirs=TEMPLATE_DIRS) -> int:
+        """Прогрев кэша всеми шаблонами из папок. Возвращает количество загруженных файлов"""
+        loaded = 0
+        for template_dir in template_dirs:
+            if not template_dir.exists():
+                continue
+            for template_path in sorted(template_dir.rglob("*.pdf")):
+                try:
+                    self.get_pages(template_path)
+                    loaded += 1
+                except Exception as e:
+                    print(f"⚠️ Не удалось загрузить шаблон {template_path}: {e}")
+        return loaded
+
+    def clear(self):
+        """Сбросить кэш и счетчики"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get_stats(self) -> Dict:
+        """Счетчики попаданий/промахов кэша"""
+        return {
+            "templates": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def preload_templates():
+    """Инициализатор процессов пула рендера: прогреть кэш шаблонов"""
+    loaded = template_cache.preload()
+    print(f"📄 Кэш PDF шаблонов прогрет: {loaded} файлов")
+
+
+# Создаем экземпляр кэша (свой в каждом процессе)
+template_cache = PDFTemplateCache()
@@ -1,15 +1,218 @@
 import asyncio
+import hashlib
+import json
+import time
 import httpx
-from typing import List, Dict
-from datetime import datetime
-
-from bot.config import settings, PERPLEXITY_ENABLED
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import List, Dict, Optional
+from datetime import datetime, timezone
+
+from bot.config import (
+    settings, PERPLEXITY_ENABLED, PERPLEXITY_TIMEOUT_SECONDS, PERPLEXITY_CONNECT_TIMEOUT_SECONDS,
+    PERPLEXITY_MAX_CONNECTIONS, PERPLEXITY_MAX_KEEPALIVE, PERPLEXITY_KEEPALIVE_EXPIRY, PERPLEXITY_HTTP2,
+    PREMIUM_SECTIONS_CONCURRENCY, PERPLEXITY_RATE_PER_MINUTE, PERPLEXITY_RATE_BURST, PERPLEXITY_MAX_CONCURRENCY
+)
 from bot.database.models import User, Answer, Question
 
 from bot.prompts.base import BasePrompts
 from bot.prompts.psychology import PsychologyPrompts
 from bot.prompts.premium_new import PremiumPromptsNew
 from .pdf_service import ReportGenerator
+from .pdf_renderer import pdf_renderer
+from .database_service import db_service
+from .report_events import report_events
+
+
+class PerplexityHTTPClient:
+    """Долгоживущий httpx клиент с пулом keep-alive соединений к Perplexity API.
+
+    Один клиент на процесс: запросы всех отчетов переиспользуют соединения
+    вместо нового TCP+TLS рукопожатия на каждый вызов API.
+    """
+
+    def __init__(self):
+        self._client = None
+        self.http2 = PERPLEXITY_HTTP2
+
+    def _create_client(self) -> httpx.AsyncClient:
+        if self.http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                print("⚠️ PERPLEXITY_HTTP2 включен, но пакет h2 не установлен - используем HTTP/1.1")
+                self.http2 = False
+
+        return httpx.AsyncClient(
+            timeout=httpx.Timeout(PERPLEXITY_TIMEOUT_SECONDS, connect=PERPLEXITY_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=PERPLEXITY_MAX_CONNECTIONS,
+                max_keepalive_connections=PERPLEXITY_MAX_KEEPALIVE,
+                keepalive_expiry=PERPLEXITY_KEEPALIVE_EXPIRY
+            ),
+            http2=self.http2
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Клиент (создается лениво, если start не вызывался, например в скриптах)"""
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+        return self._client
+
+    async def start(self):
+        """Создать клиент при старте приложения"""
+        self.client
+        print(f"🌐 HTTP клиент Perplexity готов (пул {PERPLEXITY_MAX_CONNECTIONS}, HTTP/2: {self.http2})")
+
+    async def close(self):
+        """Закрыть соединения при остановке приложения"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+
+# Общий HTTP клиент для всех экземпляров PerplexityAIService
+perplexity_http = PerplexityHTTPClient()
+
+
+class APIRateGovernor:
+    """Общий для процесса ограничитель запросов к Perplexity API.
+
+    Token bucket (PERPLEXITY_RATE_PER_MINUTE, PERPLEXITY_RATE_BURST) плюс
+    адаптивный лимит одновременных запросов: 429 уменьшает лимит вдвое и
+    приостанавливает выдачу слотов на Retry-After, серия успешных ответов
+    возвращает лимит к PERPLEXITY_MAX_CONCURRENCY. Используется бесплатным
+    и платным пайплайнами через _make_api_request.
+    """
+
+    # Сколько успешных ответов подряд нужно для увеличения лимита на 1
+    RECOVERY_SUCCESSES = 5
+    # Пауза после 429 без заголовка Retry-After
+    DEFAULT_RETRY_AFTER = 10.0
+
+    def __init__(self, rate_per_minute: float = PERPLEXITY_RATE_PER_MINUTE, burst: int = PERPLEXITY_RATE_BURST,
+                 max_concurrency: int = PERPLEXITY_MAX_CONCURRENCY):
+        self.rate = rate_per_minute / 60.0  # токенов в секунду
+        self.burst = max(1, burst)
+        self.max_concurrency = max(1, max_concurrency)
+        self.concurrency_limit = self.max_concurrency
+        self.tokens = float(self.burst)
+        self.in_flight = 0
+        self.queued = 0
+        self.rate_limited_total = 0
+        self._successes = 0
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._condition = None
+
+    def _get_condition(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def _wait_time(self, now: float) -> Optional[float]:
+        """0 - можно выдать слот, число - сколько ждать, None - ждать освобождения слота"""
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self.in_flight >= self.concurrency_limit:
+            return None
+        self._refill(now)
+        if self.tokens < 1:
+            return (1 - self.tokens) / self.rate if self.rate > 0 else None
+        return 0
+
+    async def acquire(self):
+        """Дождаться слота для запроса"""
+        condition = self._get_condition()
+        async with condition:
+            self.queued += 1
+            try:
+                while True:
+                    wait_time = self._wait_time(time.monotonic())
+                    if wait_time == 0:
+                        break
+                    try:
+                        await asyncio.wait_for(condition.wait(), timeout=wait_time)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self.queued -= 1
+            self.tokens -= 1
+            self.in_flight += 1
+
+    async def release(self):
+        """Освободить слот"""
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight -= 1
+            condition.notify_all()
+
+    @asynccontextmanager
+    async def slot(self):
+        """async with api_governor.slot(): запрос к API"""
+        await self.acquire()
+        try:
+            yield
+        finally:
+            await self.release()
+
+    def on_success(self):
+        """Успешный ответ: постепенно восстанавливаем лимит параллельных запросов"""
+        self._successes += 1
+        if self.concurrency_limit < self.max_concurrency and self._successes >= self.RECOVERY_SUCCESSES:
+            self.concurrency_limit += 1
+            self._successes = 0
+            print(f"📈 Лимит параллельных запросов к API увеличен до {self.concurrency_limit}")
+
+    def on_rate_limited(self, retry_after: Optional[float] = None) -> float:
+        """Ответ 429: уменьшаем лимит вдвое и приостанавливаем все запросы. Возвращает паузу в секундах"""
+        pause = retry_after if retry_after is not None else self.DEFAULT_RETRY_AFTER
+        self.rate_limited_total += 1
+        self._successes = 0
+        self.concurrency_limit = max(1, self.concurrency_limit // 2)
+        self._paused_until = max(self._paused_until, time.monotonic() + pause)
+        # Ожидающие запросы пересчитают время ожидания при следующей проверке
+        self.tokens = min(self.tokens, 0.0)
+        print(f"📉 Rate limit API: пауза {pause:.0f} сек, лимит параллельных запросов {self.concurrency_limit}")
+        return pause
+
+    @staticmethod
+    def parse_retry_after(value: Optional[str]) -> Optional[float]:
+        """Заголовок Retry-After: число секунд или HTTP-дата"""
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+    def get_stats(self) -> Dict:
+        """Текущее состояние ограничителя"""
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "concurrency_limit": self.concurrency_limit,
+            "max_concurrency": self.max_concurrency,
+            "tokens": round(self.tokens, 2),
+            "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 1),
+            "rate_limited_total": self.rate_limited_total,
+        }
+
+
+# Общий ограничитель запросов к API для всех отчетов
+api_governor = APIRateGovernor()
 
 
 class PerplexityAIService:
@@ -118,66 +321,70 @@ class PerplexityAIService:
         # Retry логика с экспоненциальными задержками
         for attempt in range(retry_count):
             try:
-                async with httpx.AsyncClient(timeout=600.0) as client:  # Увеличиваем timeout до 10 минут
+                # Общий клиент с пулом соединений (timeout 10 минут задается в конфиге).
+                # Слот выдает общий ограничитель - он же держит паузу после 429
+                client = perplexity_http.client
+
+                async with api_governor.slot():
                     response = await client.post(
                         self.api_url,
                         headers=headers,
                         json=payload
                     )
 
-                    if response.status_code != 200:
-                        error_msg = f"API Error {response.status_code}: {response.text}"
-                        print(f"❌ {error_msg}")
-                        
-                        # Если это rate limiting, ждем дольше
-                        if response.status_code == 429:
-                            wait_time = (2 ** attempt) * 10  # 10, 20, 40 секунд
-                            print(f"⏳ Rate limit, ждем {wait_time} секунд...")
-                            await asyncio.sleep(wait_time)
+                if response.status_code != 200:
+                    error_msg = f"API Error {response.status_code}: {response.text}"
+                    print(f"❌ {error_msg}")
+                    
+                    # Rate limiting: пауза для всех запросов процесса, повтор дождется ее в acquire
+                    if response.status_code == 429:
+                        retry_after = api_governor.parse_retry_after(response.headers.get("Retry-After"))
+                        api_governor.on_rate_limited(retry_after)
+                        if attempt < retry_count - 1:
                             continue
-                        else:
-                            raise Exception(error_msg)
+                    raise Exception(error_msg)
 
-                    result = response.json()
+                api_governor.on_success()
+                result = response.json()
 
-                    # Извлекаем ответ
-                    if "choices" in result and len(result["choices"]) > 0:
-                        content = result["choices"][0]["message"]["content"]
-                        usage = result.get("usage", {})
-                        
-                        # Выводим ответ ИИ
-                        print("\n" + "="*80)
-                        print("🤖 ОТВЕТ ИИ:")
-                        print("="*80)
-                        content_length = len(content)
-                        finish_reason = result["choices"][0].get("finish_reason", "unknown")
-                        print(f"📥 Ответ ({content_length} символов, finish_reason='{finish_reason}'):")
-                        print("-" * 80)
-                        # Выводим первые 1000 символов для читаемости
-                        preview = content[:1000] + "\n..." if len(content) > 1000 else content
-                        print(preview)
-                        print("-" * 80)
-                        if usage:
-                            print(f"🔧 Использование токенов: {usage}")
-                        print("="*80)
-                        
-                        # Проверяем минимальный размер ответа для премиум запросов
-                        if is_premium and len(content.strip()) < 200:
-                            error_msg = f"❌ КРИТИЧЕСКАЯ ОШИБКА: API вернул слишком короткий ответ ({len(content.strip())} символов). Ожидалось минимум 1000 символов. Это указывает на ошибку в генерации."
-                            print(error_msg)
-                            print(f"🔧 Первые 200 символов ответа: {content[:200]}...")
-                            raise ValueError(error_msg)
-                        
-                        if attempt > 0:
-                            print(f"✅ Успешно после {attempt + 1} попыток")
-
-                        return {
-                            "content": content,
-                            "usage": usage
-                        }
-                    else:
-                        raise Exception("Неожиданный формат ответа от API")
-                        
+                # Извлекаем ответ
+                if "choices" in result and len(result["choices"]) > 0:
+                    content = result["choices"][0]["message"]["content"]
+                    usage = result.get("usage", {})
+                    
+                    # Выводим ответ ИИ
+                    print("\n" + "="*80)
+                    print("🤖 ОТВЕТ ИИ:")
+                    print("="*80)
+                    content_length = len(content)
+                    finish_reason = result["choices"][0].get("finish_reason", "unknown")
+                    print(f"📥 Ответ ({content_length} символов, finish_reason='{finish_reason}'):")
+                    print("-" * 80)
+                    # Выводим первые 1000 символов для читаемости
+                    preview = content[:1000] + "\n..." if len(content) > 1000 else content
+                    print(preview)
+                    print("-" * 80)
+                    if usage:
+                        print(f"🔧 Использование токенов: {usage}")
+                    print("="*80)
+                    
+                    # Проверяем минимальный размер ответа для премиум запросов
+                    if is_premium and len(content.strip()) < 200:
+                        error_msg = f"❌ КРИТИЧЕСКАЯ ОШИБКА: API вернул слишком короткий ответ ({len(content.strip())} символов). Ожидалось минимум 1000 символов. Это указывает на ошибку в генерации."
+                        print(error_msg)
+                        print(f"🔧 Первые 200 символов ответа: {content[:200]}...")
+                        raise ValueError(error_msg)
+                    
+                    if attempt > 0:
+                        print(f"✅ Успешно после {attempt + 1} попыток")
+
+                    return {
+                        "content": content,
+                        "usage": usage
+                    }
+                else:
+                    raise Exception("Неожиданный формат ответа от API")
+                    
             except (httpx.RemoteProtocolError, httpx.ReadTimeout, httpx.ConnectError) as e:
                 wait_time = (2 ** attempt) * 5  # 5, 10, 20 секунд
                 print(f"🔄 Попытка {attempt + 1}/{retry_count} неудачна: {e}")
@@ -270,12 +477,6 @@ class PerplexityAIService:
                 # Получаем ответ с полным контекстом предыдущих взаимодействий
                 page_response = await self._make_api_request(conversation)
                 
-                # Пауза между запросами для стабильности API (кроме последнего)
-                if i < 2:  # Если это не последняя страница (page5)
-                    wait_time = 5  # 5 секунд между запросами
-                    print(f"⏳ Пауза {wait_time} секунд для стабильности API...")
-                    await asyncio.sleep(wait_time)
-
                 # Сохраняем результат
                 results[page_type] = page_response
 
@@ -565,11 +766,74 @@ class PerplexityAIService:
                 "timestamp": datetime.utcnow().isoformat()
             }
 
+    def _answers_hash(self, user_data: str) -> str:
+        """Хэш набора ответов (и модели): ключ сохраненных разделов анализа"""
+        return hashlib.sha256(f"{self.model}\n{user_data}".encode("utf-8")).hexdigest()
+
+    async def _load_checkpoints(self, user: User, answers_hash: str) -> Dict[str, str]:
+        """Сохраненные разделы анализа (ошибка БД не должна ломать генерацию)"""
+        try:
+            checkpoints = await db_service.get_analysis_checkpoints(user.telegram_id, answers_hash)
+        except Exception as e:
+            print(f"⚠️ Не удалось загрузить сохраненные разделы анализа: {e}")
+            return {}
+        if checkpoints:
+            print(f"♻️ Найдено сохраненных разделов анализа: {len(checkpoints)}")
+        return checkpoints
+
+    async def _save_checkpoint(self, user: User, answers_hash: str, section_key: str, content: str):
+        """Сохранить готовый раздел анализа для продолжения после сбоя"""
+        try:
+            await db_service.save_analysis_checkpoint(user.telegram_id, answers_hash, section_key, content)
+        except Exception as e:
+            print(f"⚠️ Не удалось сохранить раздел анализа {section_key}: {e}")
+
+    async def _generate_premium_section(self, base_conversation: List[Dict], section_key: str, section_name: str,
+                                        page_count: int, start_page: int, user_data: str) -> Dict:
+        """Генерация одного раздела платного отчета: один запрос с маркерами страниц.
+
+        base_conversation не изменяется - раздел получает его копию со своим промптом.
+        """
+        print(f"\n🔄 Генерируем раздел: {section_name} ({page_count} страниц)")
+        
+        # Создаем промпт с маркерами страниц (полные вопросы-ответы уже есть в контексте)
+        section_prompt = self._create_section_prompt_with_markers(
+            section_key, section_name, page_count, user_data
+        )
+        conversation = base_conversation + [{
+            "role": "user",
+            "content": section_prompt
+        }]
+        
+        # ОДИН запрос на весь раздел
+        start_time = datetime.utcnow()
+        response = await self._make_api_request(conversation, is_premium=True)
+        request_duration = (datetime.utcnow() - start_time).total_seconds()
+        print(f"⏱️ Раздел {section_name}: запрос завершен за {request_duration:.1f} секунд")
+        
+        # Парсим ответ на отдельные страницы
+        try:
+            section_pages = self._parse_section_response(
+                response["content"], section_key, section_name, page_count, start_page
+            )
+        except ValueError as e:
+            # Если парсинг не удался из-за короткого ответа, останавливаем весь процесс
+            print(f"❌ Остановка генерации отчета из-за ошибки в разделе '{section_name}': {e}")
+            raise e
+        
+        section_length = sum(len(page_data["content"]) for page_data in section_pages.values())
+        print(f"✅ {section_name}: {section_length} символов ({page_count} страниц)")
+        return section_pages
+
     async def analyze_premium_responses_optimized(self, user: User, questions: List[Question], answers: List[Answer]) -> Dict:
         """Оптимизированный платный анализ: 9 запросов вместо 74 с маркерами страниц"""
 
         # Формируем данные для анализа
         user_data = self._prepare_user_data(user, questions, answers)
+        
+        # Разделы, готовые после прошлой (неудачной) попытки для тех же ответов
+        answers_hash = self._answers_hash(user_data)
+        checkpoints = await self._load_checkpoints(user, answers_hash)
 
         try:
             print(f"🧠 Запускаем ОПТИМИЗИРОВАННЫЙ платный анализ для пользователя {user.telegram_id}...")
@@ -605,8 +869,15 @@ class PerplexityAIService:
             })
             
             # Получаем подтверждение от ИИ (опционально, можно пропустить для оптимизации)
-            print(f"🔄 ИИ изучает 50 ответов...")
-            initial_response = await self._make_api_request(conversation, is_premium=True)
+            api_calls = 0
+            if "initial" in checkpoints:
+                print(f"♻️ Первичный анализ восстановлен из сохраненной попытки")
+                initial_response = {"content": checkpoints["initial"], "usage": {}}
+            else:
+                print(f"🔄 ИИ изучает 50 ответов...")
+                initial_response = await self._make_api_request(conversation, is_premium=True)
+                api_calls += 1
+                await self._save_checkpoint(user, answers_hash, "initial", initial_response["content"])
             conversation.append({
                 "role": "assistant",
                 "content": initial_response["content"]
@@ -626,67 +897,86 @@ class PerplexityAIService:
                 ("premium_appendix", "Приложения", 6)
             ]
             
-            all_pages = {}
-            all_individual_pages = {}
-            page_counter = 1
-            total_api_calls = 1  # Первичный запрос
+            # Прогресс для страницы ожидания: первичный анализ + разделы
+            sections_done = 1
+            report_events.publish_progress(user.telegram_id, "premium", "ai_section", sections_done, len(sections) + 1)
             
+            # Номер первой страницы каждого раздела известен заранее - порядок страниц
+            # не зависит от того, в каком порядке завершатся запросы
+            section_start_pages = {}
+            page_counter = 1
             for section_key, section_name, page_count in sections:
-                print(f"\n🔄 Генерируем раздел: {section_name} ({page_count} страниц)")
-                print(f"⏱️ Начинаем запрос к API...")
-                
-                # Создаем промпт с маркерами страниц (теперь с полными вопросами-ответами в conversation)
-                section_prompt = self._create_section_prompt_with_markers(
-                    section_key, section_name, page_count, user_data
+                section_start_pages[section_key] = page_counter
+                page_counter += page_count
+            
+            # Разделы генерируются параллельно: у каждого общий контекст
+            # (базовый промпт + вопросы-ответы + первичный анализ) и свой промпт раздела
+            concurrency = max(1, PREMIUM_SECTIONS_CONCURRENCY)
+            semaphore = asyncio.Semaphore(concurrency)
+            print(f"\n🚀 Генерируем {len(sections)} разделов параллельно (не более {concurrency} одновременно)")
+            
+            # После первой ошибки новые разделы не запускаются, но уже идущие запросы
+            # дорабатывают и сохраняются - повтор продолжит с них
+            section_failed = asyncio.Event()
+            
+            def section_done():
+                nonlocal sections_done
+                sections_done += 1
+                report_events.publish_progress(
+                    user.telegram_id, "premium", "ai_section", sections_done, len(sections) + 1
                 )
-                
-                # Добавляем промпт раздела в conversation (контекст сохраняется!)
-                conversation.append({
-                    "role": "user",
-                    "content": section_prompt
-                })
-                
-                # ОДИН запрос на весь раздел (с полным контекстом!)
-                start_time = datetime.utcnow()
-                response = await self._make_api_request(conversation, is_premium=True)
-                
-                # Добавляем ответ в conversation для сохранения контекста
-                conversation.append({
-                    "role": "assistant",
-                    "content": response["content"]
-                })
-                end_time = datetime.utcnow()
-                
-                request_duration = (end_time - start_time).total_seconds()
-                print(f"⏱️ Запрос завершен за {request_duration:.1f} секунд")
-                
-                total_api_calls += 1
-                
-                # Парсим ответ на отдельные страницы
-                try:
-                    section_pages = self._parse_section_response(
-                        response["content"], section_key, section_name, page_count, page_counter
-                    )
-                except ValueError as e:
-                    # Если парсинг не удался из-за короткого ответа, останавливаем весь процесс
-                    print(f"❌ Остановка генерации отчета из-за ошибки в разделе '{section_name}': {e}")
-                    raise e
-                
-                # Сохраняем результаты
+            
+            async def generate_section(section_key: str, section_name: str, page_count: int) -> Dict:
+                nonlocal api_calls
+                if section_key in checkpoints:
+                    print(f"♻️ Раздел {section_name} восстановлен из сохраненной попытки")
+                    section_done()
+                    return json.loads(checkpoints[section_key])
+                async with semaphore:
+                    if section_failed.is_set():
+                        return None
+                    try:
+                        section_pages = await self._generate_premium_section(
+                            conversation, section_key, section_name, page_count,
+                            section_start_pages[section_key], user_data
+                        )
+                    except Exception:
+                        section_failed.set()
+                        raise
+                api_calls += 1
+                # Сохраняем раздел сразу - при сбое другого раздела повтор начнется отсюда
+                await self._save_checkpoint(
+                    user, answers_hash, section_key, json.dumps(section_pages, ensure_ascii=False)
+                )
+                section_done()
+                return section_pages
+            
+            tasks = [
+                asyncio.create_task(generate_section(section_key, section_name, page_count))
+                for section_key, section_name, page_count in sections
+            ]
+            try:
+                section_results = await asyncio.gather(*tasks, return_exceptions=True)
+            except asyncio.CancelledError:
+                for task in tasks:
+                    task.cancel()
+                raise
+            
+            # Ошибка в одном разделе (например, короткий ответ) останавливает весь отчет
+            for result in section_results:
+                if isinstance(result, BaseException):
+                    raise result
+            
+            # Собираем результаты в исходном порядке разделов
+            all_pages = {}
+            all_individual_pages = {}
+            for (section_key, section_name, page_count), section_pages in zip(sections, section_results):
                 section_contents = [page_data["content"] for page_data in section_pages.values()]
                 all_pages[section_key] = "\n\n".join(section_contents)
                 all_individual_pages.update(section_pages)
-                
-                page_counter += page_count
-                
-                section_length = len(all_pages[section_key])
-                print(f"✅ {section_name}: {section_length} символов ({page_count} страниц)")
-                
-                # Пауза между запросами для стабильности API (кроме последнего)
-                if section_key != "premium_appendix":  # Если это не последний раздел
-                    wait_time = 8  # 8 секунд между запросами
-                    print(f"⏳ Пауза {wait_time} секунд для стабильности API...")
-                    await asyncio.sleep(wait_time)
+            
+            total_api_calls = api_calls  # Первичный запрос + разделы (без восстановленных)
+            resumed_sections = [key for key in ["initial"] + [section[0] for section in sections] if key in checkpoints]
 
             # Финальная статистика
             total_length = sum(len(content) for content in all_pages.values())
@@ -698,9 +988,11 @@ class PerplexityAIService:
                 print(f"   {section_name}: {length} символов ({page_count} страниц, ~{avg_per_page:.0f} символов/страница)")
             print(f"   Общий объем: {total_length} символов")
             print(f"   📞 Всего обращений к ИИ: {total_api_calls} (1 первичный + 9 разделов, вместо 74!)")
+            if resumed_sections:
+                print(f"   ♻️ Восстановлено из сохраненной попытки: {len(resumed_sections)} ({', '.join(resumed_sections)})")
             print(f"   📄 Всего страниц: 63")
             print(f"   ⚡ ОПТИМИЗАЦИЯ: 87% экономии запросов!")
-            print(f"   ✅ КОНТЕКСТ: Все запросы используют полный conversation с вопросами-ответами!")
+            print(f"   ✅ КОНТЕКСТ: Все запросы используют вопросы-ответы и первичный анализ!")
 
             return {
                 "success": True,
@@ -719,7 +1011,8 @@ class PerplexityAIService:
                     "initial": initial_response.get("usage", {}),
                     "total_api_calls": total_api_calls,
                     "pages_generated": 63,
-                    "optimization_ratio": "87%"
+                    "optimization_ratio": "87%",
+                    "resumed_sections": resumed_sections
                 },
                 "character_stats": {
                     "total_length": total_length,
@@ -1467,6 +1760,7 @@ class AIAnalysisService:
                 # 🧠 Контекстный анализ с памятью (единственный режим)
                 print(
                     f"🧠 Запускаем AI анализ для пользователя {user.telegram_id}...")
+                report_events.publish_progress(user.telegram_id, "free", "ai_analysis")
                 analysis_result = await self.ai_service.analyze_user_responses(user, questions, answers)
 
                 if not analysis_result.get("success"):
@@ -1479,8 +1773,11 @@ class AIAnalysisService:
 
             # Создаем PDF отчет
             print(f"📄 Создаем PDF отчет...")
-            report_filepath = self.report_generator.create_pdf_report(
-                user, analysis_result)
+            # Рендер выполняется в пуле процессов, чтобы не блокировать event loop
+            report_events.publish_progress(user.telegram_id, "free", "pdf_render")
+            artifact = await pdf_renderer.render("free", user, analysis_result)
+            report_filepath = artifact["path"]
+            await self._register_artifact(user, "free", artifact)
 
             print(f"✅ Отчет успешно создан: {report_filepath}")
 
@@ -1503,6 +1800,16 @@ class AIAnalysisService:
                 "stage": "general"
             }
 
+    async def _register_artifact(self, user: User, kind: str, artifact: Dict):
+        """Записать готовый PDF в реестр отчетов (текстовые fallback-файлы не регистрируются)"""
+        if not artifact["path"].lower().endswith(".pdf"):
+            print(f"⚠️ Отчет сохранен не в PDF, в реестр не добавляем: {artifact['path']}")
+            return
+        await db_service.create_report_artifact(
+            user.telegram_id, kind, artifact["path"],
+            size=artifact["size"], sha256=artifact["sha256"]
+        )
+
     def _create_fallback_analysis(self) -> Dict:
         """Создать базовый анализ без ИИ"""
         timestamp = datetime.utcnow().isoformat()
@@ -1630,6 +1937,7 @@ class AIAnalysisService:
 
             # 🧠 ОПТИМИЗИРОВАННЫЙ платный анализ: 9 запросов вместо 74
             print(f"🧠 Запускаем ОПТИМИЗИРОВАННЫЙ ПЛАТНЫЙ AI анализ для пользователя {user.telegram_id}...")
+            report_events.publish_progress(user.telegram_id, "premium", "ai_analysis")
             analysis_result = await self.ai_service.analyze_premium_responses_optimized(user, questions, answers)
 
             if not analysis_result.get("success"):
@@ -1652,7 +1960,14 @@ class AIAnalysisService:
 
             # Создаем PDF отчет (платная версия)
             print(f"📄 Создаем ПЛАТНЫЙ PDF отчет...")
-            report_filepath = self.report_generator.create_premium_pdf_report(user, analysis_result)
+            report_events.publish_progress(user.telegram_id, "premium", "pdf_render")
+            artifact = await pdf_renderer.render("premium", user, analysis_result)
+            report_filepath = artifact["path"]
+            await self._register_artifact(user, "premium", artifact)
+            
+            # Отчет собран - сохраненные разделы анализа больше не нужны
+            if report_filepath.lower().endswith(".pdf"):
+                await db_service.delete_analysis_checkpoints(user.telegram_id)
 
             print(f"✅ Платный отчет успешно создан: {report_filepath}")
 
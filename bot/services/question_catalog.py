@@ -0,0 +1,159 @@
+"""
+Каталог вопросов в памяти.
+
+Вопросы меняются только при запуске bot/database/seed_data.py, поэтому
+вместо SQL запроса на каждый get_question / get_next_question каталог один
+раз загружает все вопросы и строит индексы: по id, по order_number внутри
+test_version и ссылки на следующий вопрос.
+
+seed_data после загрузки вопросов перезаписывает файл-маркер версии
+(QUESTIONS_VERSION_FILE). Каталог проверяет маркер не чаще раза в
+QUESTION_CATALOG_CHECK_SECONDS и при изменении перечитывает вопросы из БД.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional, Tuple
+
+from sqlalchemy import select
+
+from bot.config import QUESTIONS_VERSION_FILE, QUESTION_CATALOG_CHECK_SECONDS
+from bot.database.database import async_session
+from bot.database.models import Question
+from bot.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class QuestionCatalogSnapshot:
+    """Неизменяемый снимок вопросов с индексами"""
+    version: Optional[int]
+    by_id: Mapping[int, Question]
+    # Активные вопросы каждой версии теста, отсортированные по order_number
+    by_version: Mapping[str, Tuple[Question, ...]]
+    # test_version -> {order_number: Question}
+    by_order: Mapping[str, Mapping[int, Question]]
+    # question_id -> следующий активный вопрос той же версии теста (None для последнего)
+    next_by_id: Mapping[int, Optional[Question]]
+    loaded_at: datetime
+
+    def get(self, question_id: int) -> Optional[Question]:
+        return self.by_id.get(question_id)
+
+    def get_by_order(self, test_version: str, order_number: int) -> Optional[Question]:
+        return self.by_order.get(test_version, {}).get(order_number)
+
+    def first(self, test_version: str) -> Optional[Question]:
+        questions = self.by_version.get(test_version, ())
+        return questions[0] if questions else None
+
+    def next(self, question_id: int, test_version: str) -> Optional[Question]:
+        """Следующий активный вопрос указанного теста после question_id"""
+        current = self.by_id.get(question_id)
+        if current is None:
+            return None
+        if current.test_version == test_version and current.is_active:
+            return self.next_by_id.get(question_id)
+        # Текущий вопрос из другой версии теста (или неактивный) - ищем по order_number
+        for question in self.by_version.get(test_version, ()):
+            if question.order_number > current.order_number:
+                return question
+        return None
+
+    def count(self, test_version: str) -> int:
+        return len(self.by_version.get(test_version, ()))
+
+    def all_active(self) -> Tuple[Question, ...]:
+        """Все активные вопросы по order_number"""
+        return tuple(sorted(
+            (q for questions in self.by_version.values() for q in questions),
+            key=lambda q: q.order_number
+        ))
+
+
+def build_snapshot(questions, version: Optional[int] = None) -> QuestionCatalogSnapshot:
+    """Построить индексы по списку вопросов"""
+    by_id = {question.id: question for question in questions}
+
+    grouped: Dict[str, list] = {}
+    for question in sorted(questions, key=lambda q: q.order_number):
+        if question.is_active:
+            grouped.setdefault(question.test_version, []).append(question)
+
+    next_by_id = {}
+    for version_questions in grouped.values():
+        for index, question in enumerate(version_questions):
+            next_by_id[question.id] = version_questions[index + 1] if index + 1 < len(version_questions) else None
+
+    return QuestionCatalogSnapshot(
+        version=version,
+        by_id=MappingProxyType(by_id),
+        by_version=MappingProxyType({key: tuple(value) for key, value in grouped.items()}),
+        by_order=MappingProxyType({
+            key: MappingProxyType({q.order_number: q for q in value}) for key, value in grouped.items()
+        }),
+        next_by_id=MappingProxyType(next_by_id),
+        loaded_at=datetime.utcnow()
+    )
+
+
+class QuestionCatalog:
+    """Ленивая загрузка и перезагрузка снимка вопросов"""
+
+    def __init__(self, check_interval: float = QUESTION_CATALOG_CHECK_SECONDS):
+        self.check_interval = check_interval
+        self._snapshot: Optional[QuestionCatalogSnapshot] = None
+        self._checked_at = 0.0
+        self._lock = None
+
+    @staticmethod
+    def _current_version() -> Optional[int]:
+        """Версия набора вопросов: mtime файла-маркера, который пишет seed_data"""
+        try:
+            return QUESTIONS_VERSION_FILE.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _is_stale(self) -> bool:
+        if self._snapshot is None:
+            return True
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return False
+        self._checked_at = now
+        return self._current_version() != self._snapshot.version
+
+    async def load(self) -> QuestionCatalogSnapshot:
+        """Загрузить вопросы из БД (при старте и при смене версии)"""
+        version = self._current_version()
+        async with async_session() as session:
+            result = await session.execute(select(Question))
+            questions = result.scalars().all()
+
+        self._snapshot = build_snapshot(questions, version)
+        self._checked_at = time.monotonic()
+        counts = {key: len(value) for key, value in self._snapshot.by_version.items()}
+        logger.info(f"📚 Каталог вопросов загружен: {counts}")
+        return self._snapshot
+
+    async def get(self) -> QuestionCatalogSnapshot:
+        """Актуальный снимок каталога"""
+        if not self._is_stale():
+            return self._snapshot
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._snapshot is not None and self._snapshot.version == self._current_version():
+                return self._snapshot
+            return await self.load()
+
+    def invalidate(self):
+        """Сбросить каталог - следующий вызов get перечитает вопросы"""
+        self._snapshot = None
+
+
+# Создаем экземпляр каталога
+question_catalog = QuestionCatalog()
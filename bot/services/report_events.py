@@ -0,0 +1,93 @@
+"""
+События генерации отчетов для SSE.
+
+Страница ожидания раньше опрашивала /reports-status каждые 5 секунд.
+Теперь она подписывается на /reports-events, а сервис публикует сюда
+смену статуса (update_report_generation_status) и прогресс этапов
+ИИ-анализа и рендера PDF. Шина живет в процессе веб-приложения, в котором
+работают и воркеры очереди отчетов.
+
+У каждого подписчика своя ограниченная очередь: если клиент не успевает
+читать, самые старые события отбрасываются - после смены статуса клиент
+все равно получает полный актуальный статус.
+"""
+import asyncio
+from datetime import datetime
+from typing import Dict, Optional, Set
+
+from bot.config import REPORT_EVENTS_QUEUE_SIZE
+
+# Статусы, после которых прогресс генерации больше не нужен
+FINAL_STATUSES = ("COMPLETED", "FAILED")
+
+
+class ReportEventBus:
+    """Pub/sub событий отчетов по telegram_id"""
+
+    def __init__(self, queue_size: int = REPORT_EVENTS_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        # Последний прогресс по пользователю - для подключившихся во время генерации
+        self._last_progress: Dict[int, dict] = {}
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, telegram_id: int) -> asyncio.Queue:
+        """Подписаться на события пользователя"""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(telegram_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, telegram_id: int, queue: asyncio.Queue):
+        """Отписаться (при закрытии соединения)"""
+        queues = self._subscribers.get(telegram_id)
+        if not queues:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[telegram_id]
+
+    def publish(self, telegram_id: int, event: dict):
+        """Отправить событие всем подписчикам пользователя (без ожидания)"""
+        event = {**event, "timestamp": datetime.utcnow().isoformat()}
+        self.published += 1
+
+        if event.get("type") == "progress":
+            self._last_progress[telegram_id] = event
+        elif event.get("type") == "status" and event.get("status") in FINAL_STATUSES:
+            self._last_progress.pop(telegram_id, None)
+
+        for queue in self._subscribers.get(telegram_id, ()):
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(event)
+
+    def publish_status(self, telegram_id: int, report_type: str, status: str):
+        """Смена статуса генерации отчета"""
+        self.publish(telegram_id, {"type": "status", "report_type": report_type, "status": status})
+
+    def publish_progress(self, telegram_id: int, report_type: str, stage: str,
+                         done: int = None, total: int = None):
+        """Прогресс этапа генерации: ai_analysis, ai_section, pdf_render"""
+        event = {"type": "progress", "report_type": report_type, "stage": stage}
+        if done is not None:
+            event["done"] = done
+        if total is not None:
+            event["total"] = total
+        self.publish(telegram_id, event)
+
+    def last_progress(self, telegram_id: int) -> Optional[dict]:
+        return self._last_progress.get(telegram_id)
+
+    def get_stats(self) -> dict:
+        return {
+            "subscribers": sum(len(queues) for queues in self._subscribers.values()),
+            "users": len(self._subscribers),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+# Создаем экземпляр шины событий
+report_events = ReportEventBus()
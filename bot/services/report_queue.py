@@ -0,0 +1,464 @@
+"""
+Очередь генерации отчетов на базе таблицы report_jobs.
+
+Задачи хранятся в БД, поэтому переживают перезапуск приложения.
+Пул воркеров ограниченного размера забирает задачи по приоритету,
+продлевает аренду (heartbeat) во время работы, а задачи с истекшей
+арендой (упавший процесс) повторно забираются другим воркером.
+"""
+import asyncio
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import select, update, and_, or_, func
+from sqlalchemy.exc import IntegrityError
+
+from bot.database.database import async_session
+from bot.database.models import ReportJob, ReportJobStatus, ReportGenerationStatus
+from bot.config import (
+    REPORT_WORKERS_COUNT,
+    REPORT_JOB_LEASE_SECONDS,
+    REPORT_JOB_HEARTBEAT_SECONDS,
+    REPORT_JOB_MAX_ATTEMPTS,
+    REPORT_QUEUE_POLL_SECONDS,
+)
+from bot.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Приоритеты задач: оплаченные отчеты обрабатываются раньше бесплатных
+PRIORITY_FREE = 0
+PRIORITY_PREMIUM = 10
+
+DEFAULT_PRIORITIES = {
+    "free": PRIORITY_FREE,
+    "premium": PRIORITY_PREMIUM,
+}
+
+ReportJobHandler = Callable[[int], Awaitable[object]]
+# (telegram_id, report_type, error) - задача окончательно завершилась ошибкой
+ReportJobFailureHandler = Callable[[int, str, str], Awaitable[object]]
+
+
+class ReportQueueService:
+    """Персистентная очередь задач генерации отчетов с пулом воркеров"""
+
+    def __init__(self, workers_count: int = REPORT_WORKERS_COUNT,
+                 lease_seconds: int = REPORT_JOB_LEASE_SECONDS,
+                 heartbeat_seconds: int = REPORT_JOB_HEARTBEAT_SECONDS,
+                 max_attempts: int = REPORT_JOB_MAX_ATTEMPTS,
+                 poll_seconds: float = REPORT_QUEUE_POLL_SECONDS):
+        self.workers_count = max(1, workers_count)
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.poll_seconds = poll_seconds
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        self._handlers: Dict[str, ReportJobHandler] = {}
+        self._failure_handlers: Dict[str, ReportJobFailureHandler] = {}
+        self._worker_tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._running = False
+
+    def register_handler(self, report_type: str, handler: ReportJobHandler):
+        """Зарегистрировать обработчик для типа отчета (free / premium)"""
+        self._handlers[report_type] = handler
+
+    def register_failure_handler(self, report_type: str, handler: ReportJobFailureHandler):
+        """Обработчик окончательной ошибки: вызывается один раз, когда попытки исчерпаны"""
+        self._failure_handlers[report_type] = handler
+
+    # --- Работа с задачами ---
+
+    async def enqueue(self, telegram_id: int, report_type: str, priority: int = None) -> ReportJob:
+        """Поставить задачу в очередь. Если активная задача уже есть - вернуть ее"""
+        if priority is None:
+            priority = DEFAULT_PRIORITIES.get(report_type, PRIORITY_FREE)
+
+        async with async_session() as session:
+            existing = await self._get_active_job(session, telegram_id, report_type)
+            if existing:
+                logger.info(f"⏳ Задача {existing.id} ({report_type}) для пользователя {telegram_id} уже в очереди: {existing.status.value}")
+                return existing
+
+            job = ReportJob(
+                telegram_id=telegram_id,
+                report_type=report_type,
+                status=ReportJobStatus.QUEUED,
+                priority=priority,
+                max_attempts=self.max_attempts,
+                created_at=datetime.utcnow()
+            )
+            session.add(job)
+            try:
+                await session.commit()
+            except IntegrityError:
+                # Параллельный запрос успел поставить задачу (уникальный индекс ux_report_jobs_active)
+                await session.rollback()
+                existing = await self._get_active_job(session, telegram_id, report_type)
+                if existing is None:
+                    raise
+                logger.info(f"⏳ Задача {existing.id} ({report_type}) для пользователя {telegram_id} поставлена параллельным запросом")
+                return existing
+            await session.refresh(job)
+
+        logger.info(f"📥 Задача {job.id} ({report_type}) для пользователя {telegram_id} поставлена в очередь, приоритет {priority}")
+        if self._wakeup:
+            self._wakeup.set()
+        return job
+
+    async def get_job(self, job_id: int) -> Optional[ReportJob]:
+        """Получить задачу по id"""
+        async with async_session() as session:
+            return await session.get(ReportJob, job_id)
+
+    async def get_active_job(self, telegram_id: int, report_type: str) -> Optional[ReportJob]:
+        """Получить активную (в очереди или выполняющуюся) задачу пользователя"""
+        async with async_session() as session:
+            return await self._get_active_job(session, telegram_id, report_type)
+
+    async def has_active_job(self, telegram_id: int, report_type: str = None) -> bool:
+        """Есть ли у пользователя живая задача: в очереди или с действующей арендой"""
+        now = datetime.utcnow()
+        async with async_session() as session:
+            conditions = [
+                ReportJob.telegram_id == telegram_id,
+                or_(
+                    ReportJob.status == ReportJobStatus.QUEUED,
+                    and_(
+                        ReportJob.status == ReportJobStatus.RUNNING,
+                        ReportJob.lease_expires_at >= now
+                    )
+                )
+            ]
+            if report_type:
+                conditions.append(ReportJob.report_type == report_type)
+            stmt = select(ReportJob.id).where(and_(*conditions)).limit(1)
+            result = await session.execute(stmt)
+            return result.scalar_one_or_none() is not None
+
+    async def cancel(self, telegram_id: int, report_type: str) -> int:
+        """Отменить задачи пользователя, которые еще не начали выполняться"""
+        async with async_session() as session:
+            stmt = (
+                update(ReportJob)
+                .where(
+                    ReportJob.telegram_id == telegram_id,
+                    ReportJob.report_type == report_type,
+                    ReportJob.status == ReportJobStatus.QUEUED
+                )
+                .values(
+                    status=ReportJobStatus.FAILED,
+                    error="Отменено пользователем",
+                    finished_at=datetime.utcnow()
+                )
+            )
+            result = await session.execute(stmt)
+            await session.commit()
+            if result.rowcount:
+                logger.info(f"🛑 Отменено задач ({report_type}) для пользователя {telegram_id}: {result.rowcount}")
+            return result.rowcount
+
+    async def claim_next(self, worker_id: str) -> Optional[ReportJob]:
+        """Забрать следующую задачу: сначала по приоритету, затем по времени постановки"""
+        await self._fail_exhausted_jobs()
+
+        now = datetime.utcnow()
+        claimable = or_(
+            ReportJob.status == ReportJobStatus.QUEUED,
+            and_(
+                ReportJob.status == ReportJobStatus.RUNNING,
+                ReportJob.lease_expires_at < now,
+                ReportJob.attempts < ReportJob.max_attempts
+            )
+        )
+
+        async with async_session() as session:
+            stmt = (
+                select(ReportJob.id)
+                .where(claimable)
+                .order_by(ReportJob.priority.desc(), ReportJob.created_at, ReportJob.id)
+                .limit(1)
+            )
+            result = await session.execute(stmt)
+            job_id = result.scalar_one_or_none()
+            if job_id is None:
+                return None
+
+            # Условный UPDATE защищает от гонки между воркерами и процессами
+            claim_stmt = (
+                update(ReportJob)
+                .where(ReportJob.id == job_id, claimable)
+                .values(
+                    status=ReportJobStatus.RUNNING,
+                    worker_id=worker_id,
+                    attempts=ReportJob.attempts + 1,
+                    started_at=now,
+                    heartbeat_at=now,
+                    lease_expires_at=now + timedelta(seconds=self.lease_seconds)
+                )
+            )
+            claim_result = await session.execute(claim_stmt)
+            await session.commit()
+            if claim_result.rowcount != 1:
+                return None
+
+            job = await session.get(ReportJob, job_id)
+            logger.info(f"🔧 {worker_id} взял задачу {job.id} ({job.report_type}) для пользователя {job.telegram_id}, попытка {job.attempts}/{job.max_attempts}")
+            return job
+
+    async def heartbeat(self, job_id: int, worker_id: str) -> bool:
+        """Продлить аренду задачи. False - задачу забрал другой воркер"""
+        now = datetime.utcnow()
+        async with async_session() as session:
+            stmt = (
+                update(ReportJob)
+                .where(
+                    ReportJob.id == job_id,
+                    ReportJob.worker_id == worker_id,
+                    ReportJob.status == ReportJobStatus.RUNNING
+                )
+                .values(
+                    heartbeat_at=now,
+                    lease_expires_at=now + timedelta(seconds=self.lease_seconds)
+                )
+            )
+            result = await session.execute(stmt)
+            await session.commit()
+            return result.rowcount == 1
+
+    async def complete(self, job_id: int, worker_id: str) -> bool:
+        """Отметить задачу выполненной (если она все еще принадлежит воркеру)"""
+        return await self._finish(job_id, worker_id, ReportJobStatus.COMPLETED)
+
+    async def fail(self, job_id: int, worker_id: str, error: str) -> bool:
+        """Отметить задачу неуспешной (или вернуть в очередь, если остались попытки).
+
+        Как и остальные переходы из RUNNING, срабатывает только для воркера-владельца:
+        если аренду забрал другой воркер, задача остается за ним.
+        """
+        async with async_session() as session:
+            job = await session.get(ReportJob, job_id)
+            if not job:
+                return False
+            retry = job.attempts < job.max_attempts
+            stmt = (
+                update(ReportJob)
+                .where(*self._owned_by(job_id, worker_id))
+                .values(
+                    status=ReportJobStatus.QUEUED if retry else ReportJobStatus.FAILED,
+                    error=error,
+                    worker_id=None,
+                    lease_expires_at=None,
+                    finished_at=None if retry else datetime.utcnow()
+                )
+            )
+            result = await session.execute(stmt)
+            await session.commit()
+
+        if result.rowcount != 1:
+            logger.warning(f"⚠️ Ошибка задачи {job_id} не записана: задача уже не принадлежит {worker_id}")
+            return False
+        if retry:
+            logger.warning(f"🔁 Задача {job_id} возвращена в очередь после ошибки: {error}")
+        else:
+            logger.error(f"❌ Задача {job_id} завершилась ошибкой: {error}")
+            await self._on_final_failure(job.telegram_id, job.report_type, error)
+        return True
+
+    async def get_queue_stats(self) -> dict:
+        """Количество задач по статусам"""
+        async with async_session() as session:
+            stmt = select(ReportJob.status, func.count(ReportJob.id)).group_by(ReportJob.status)
+            result = await session.execute(stmt)
+            stats = {status.value.lower(): 0 for status in ReportJobStatus}
+            for status, count in result.all():
+                stats[status.value.lower()] = count
+            stats["workers"] = self.workers_count
+            return stats
+
+    # --- Пул воркеров ---
+
+    async def start(self):
+        """Запустить пул воркеров"""
+        if self._running:
+            return
+        self._running = True
+        self._wakeup = asyncio.Event()
+        for index in range(self.workers_count):
+            worker_id = f"{self.instance_id}:{index}"
+            self._worker_tasks.append(asyncio.create_task(self._worker_loop(worker_id)))
+        logger.info(f"✅ Очередь отчетов запущена, воркеров: {self.workers_count}")
+
+    async def stop(self):
+        """Остановить пул воркеров. Незавершенные задачи возвращаются в очередь"""
+        if not self._running:
+            return
+        self._running = False
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        logger.info("✅ Очередь отчетов остановлена")
+
+    async def _worker_loop(self, worker_id: str):
+        while self._running:
+            try:
+                job = await self.claim_next(worker_id)
+                if job:
+                    await self._run_job(job, worker_id)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Ошибка воркера {worker_id}: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+                self._wakeup.clear()
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run_job(self, job: ReportJob, worker_id: str):
+        handler = self._handlers.get(job.report_type)
+        if not handler:
+            await self.fail(job.id, worker_id, f"Нет обработчика для типа отчета {job.report_type}")
+            return
+
+        handler_task = asyncio.create_task(handler(job.telegram_id))
+        heartbeat_task = asyncio.create_task(self._heartbeat_loop(job.id, worker_id, handler_task))
+        try:
+            await handler_task
+            if await self.complete(job.id, worker_id):
+                logger.info(f"✅ Задача {job.id} ({job.report_type}) для пользователя {job.telegram_id} выполнена")
+        except asyncio.CancelledError:
+            if heartbeat_task.done() and not heartbeat_task.cancelled():
+                # Обработчик остановлен heartbeat: задачу забрал другой воркер, писать нечего
+                return
+            # Остановка приложения: отдаем задачу обратно, попытка не засчитывается
+            handler_task.cancel()
+            await asyncio.shield(self._release(job.id, worker_id))
+            raise
+        except Exception as e:
+            await self.fail(job.id, worker_id, str(e))
+        finally:
+            heartbeat_task.cancel()
+
+    async def _heartbeat_loop(self, job_id: int, worker_id: str, handler_task: asyncio.Task):
+        """Продлевать аренду; при потере аренды остановить обработчик и завершиться"""
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            try:
+                if not await self.heartbeat(job_id, worker_id):
+                    logger.warning(f"⚠️ Аренда задачи {job_id} потеряна воркером {worker_id}, обработчик остановлен")
+                    handler_task.cancel()
+                    return
+            except Exception as e:
+                logger.error(f"❌ Ошибка heartbeat задачи {job_id}: {e}")
+
+    @staticmethod
+    def _owned_by(job_id: int, worker_id: str) -> tuple:
+        """Условие UPDATE: задача выполняется указанным воркером"""
+        return (
+            ReportJob.id == job_id,
+            ReportJob.worker_id == worker_id,
+            ReportJob.status == ReportJobStatus.RUNNING
+        )
+
+    async def _release(self, job_id: int, worker_id: str):
+        async with async_session() as session:
+            stmt = (
+                update(ReportJob)
+                .where(*self._owned_by(job_id, worker_id))
+                .values(
+                    status=ReportJobStatus.QUEUED,
+                    attempts=ReportJob.attempts - 1,
+                    worker_id=None,
+                    lease_expires_at=None
+                )
+            )
+            result = await session.execute(stmt)
+            await session.commit()
+        if result.rowcount == 1:
+            logger.info(f"↩️ Задача {job_id} возвращена в очередь при остановке")
+
+    async def _finish(self, job_id: int, worker_id: str, status: ReportJobStatus, error: str = None) -> bool:
+        async with async_session() as session:
+            stmt = (
+                update(ReportJob)
+                .where(*self._owned_by(job_id, worker_id))
+                .values(
+                    status=status,
+                    error=error,
+                    worker_id=None,
+                    lease_expires_at=None,
+                    finished_at=datetime.utcnow()
+                )
+            )
+            result = await session.execute(stmt)
+            await session.commit()
+        if result.rowcount != 1:
+            logger.warning(f"⚠️ Задача {job_id} уже не принадлежит {worker_id}, статус {status.value} не записан")
+            return False
+        return True
+
+    async def _on_final_failure(self, telegram_id: int, report_type: str, error: str):
+        """Попытки исчерпаны: статус FAILED и уведомление пользователя - один раз на задачу"""
+        handler = self._failure_handlers.get(report_type)
+        try:
+            if handler:
+                await handler(telegram_id, report_type, error)
+            else:
+                from bot.services.database_service import db_service
+                await db_service.update_report_generation_status(
+                    telegram_id, report_type, ReportGenerationStatus.FAILED, error=error
+                )
+        except Exception as e:
+            logger.error(f"❌ Ошибка обработки окончательной ошибки отчета для пользователя {telegram_id}: {e}")
+
+    async def _fail_exhausted_jobs(self):
+        """Задачи с истекшей арендой и без оставшихся попыток помечаются как FAILED"""
+        now = datetime.utcnow()
+        async with async_session() as session:
+            stmt = select(ReportJob).where(
+                ReportJob.status == ReportJobStatus.RUNNING,
+                ReportJob.lease_expires_at < now,
+                ReportJob.attempts >= ReportJob.max_attempts
+            )
+            result = await session.execute(stmt)
+            jobs = result.scalars().all()
+            if not jobs:
+                return
+
+            for job in jobs:
+                job.status = ReportJobStatus.FAILED
+                job.error = "Аренда задачи истекла, попытки исчерпаны"
+                job.worker_id = None
+                job.lease_expires_at = None
+                job.finished_at = now
+            await session.commit()
+
+        for job in jobs:
+            logger.error(f"❌ Задача {job.id} ({job.report_type}) для пользователя {job.telegram_id} зависла и исчерпала попытки")
+            await self._on_final_failure(job.telegram_id, job.report_type, "Отчет завис в процессе генерации")
+
+    async def _get_active_job(self, session, telegram_id: int, report_type: str) -> Optional[ReportJob]:
+        stmt = (
+            select(ReportJob)
+            .where(
+                ReportJob.telegram_id == telegram_id,
+                ReportJob.report_type == report_type,
+                ReportJob.status.in_([ReportJobStatus.QUEUED, ReportJobStatus.RUNNING])
+            )
+            .order_by(ReportJob.created_at.desc())
+            .limit(1)
+        )
+        result = await session.execute(stmt)
+        return result.scalar_one_or_none()
+
+
+# Создаем экземпляр сервиса
+report_queue = ReportQueueService()
@@ -0,0 +1,160 @@
+"""
+Кэш пользователей по telegram_id.
+
+Почти каждый запрос API начинается с чтения строки users по telegram_id,
+а страницы ожидания отчета опрашивают сервер несколько раз в секунду.
+Кэш хранит снимки колонок пользователя (LRU, не больше USER_CACHE_MAX_SIZE
+записей, каждая живет USER_CACHE_TTL_SECONDS) и отдает каждому вызывающему
+новый объект User, поэтому изменения полей у возвращенного объекта не
+попадают в кэш.
+
+Все пишущие методы DatabaseService сбрасывают запись после commit, и
+следующее чтение перечитывает строку. Если запись сброшена, пока чтение
+шло в БД, результат этого чтения в кэш не попадает. TTL ограничивает
+устаревание при изменениях из других процессов (например, clear_database.py).
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from sqlalchemy import inspect
+
+from bot.config import USER_CACHE_TTL_SECONDS, USER_CACHE_MAX_SIZE
+from bot.database.models import User
+
+# Колонки, из которых собирается снимок
+USER_COLUMNS = tuple(column.key for column in User.__table__.columns)
+
+
+class UserCache:
+    """LRU + TTL кэш снимков пользователей с объединением одновременных чтений"""
+
+    def __init__(self, ttl_seconds: float = USER_CACHE_TTL_SECONDS, max_size: int = USER_CACHE_MAX_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        # telegram_id -> (момент истечения, значения колонок)
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        # Чтения из БД, которые сейчас выполняются (одно на telegram_id)
+        self._loading: Dict[int, asyncio.Future] = {}
+        # Ключи, сброшенные во время чтения - его результат уже устарел
+        self._stale_loads: Set[int] = set()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_size > 0
+
+    @staticmethod
+    def _snapshot(user: User) -> Optional[dict]:
+        """Значения колонок загруженного пользователя (None, если часть колонок не загружена)"""
+        state = inspect(user).dict
+        if any(key not in state for key in USER_COLUMNS):
+            return None
+        return {key: state[key] for key in USER_COLUMNS}
+
+    @staticmethod
+    def _build(values: dict) -> User:
+        """Новый объект User из снимка"""
+        return User(**values)
+
+    def _get_values(self, telegram_id: int) -> Optional[dict]:
+        entry = self._entries.get(telegram_id)
+        if entry is None:
+            return None
+        expires_at, values = entry
+        if expires_at <= time.monotonic():
+            del self._entries[telegram_id]
+            return None
+        self._entries.move_to_end(telegram_id)
+        return values
+
+    def _put(self, telegram_id: int, user: User):
+        values = self._snapshot(user)
+        if values is None:
+            return
+        self._entries[telegram_id] = (time.monotonic() + self.ttl_seconds, values)
+        self._entries.move_to_end(telegram_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get(self, telegram_id: int) -> Optional[User]:
+        """Пользователь из кэша без обращения к БД (None - промах)"""
+        if not self.enabled:
+            return None
+        values = self._get_values(telegram_id)
+        return self._build(values) if values is not None else None
+
+    async def get_or_load(self, telegram_id: int,
+                          loader: Callable[[], Awaitable[Optional[User]]]) -> Optional[User]:
+        """Пользователь из кэша или из loader.
+
+        Одновременные промахи по одному telegram_id ждут одно чтение из БД.
+        """
+        if not self.enabled:
+            return await loader()
+
+        values = self._get_values(telegram_id)
+        if values is not None:
+            self.hits += 1
+            return self._build(values)
+
+        pending = self._loading.get(telegram_id)
+        if pending is not None:
+            self.hits += 1
+            values = await asyncio.shield(pending)
+            return self._build(values) if values is not None else None
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._loading[telegram_id] = future
+        try:
+            user = await loader()
+        except BaseException as e:
+            future.set_exception(e)
+            # Исключение получают ожидающие; если их нет - не логируем "never retrieved"
+            future.exception()
+            raise
+        else:
+            values = self._snapshot(user) if user is not None else None
+            if user is not None and telegram_id not in self._stale_loads:
+                self._put(telegram_id, user)
+            future.set_result(values)
+            return user
+        finally:
+            self._loading.pop(telegram_id, None)
+            self._stale_loads.discard(telegram_id)
+
+    def invalidate(self, telegram_id: int):
+        """Сбросить пользователя после изменения в БД"""
+        self.invalidations += 1
+        self._entries.pop(telegram_id, None)
+        if telegram_id in self._loading:
+            self._stale_loads.add(telegram_id)
+
+    def clear(self):
+        """Сбросить кэш и счетчики"""
+        self._entries.clear()
+        self._stale_loads.update(self._loading)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get_stats(self) -> dict:
+        """Размер и доля попаданий"""
+        requests = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_ratio": round(self.hits / requests, 3) if requests else 0.0,
+        }
+
+
+# Создаем экземпляр кэша
+user_cache = UserCache()
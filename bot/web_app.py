@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException, Depends, Request, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from pathlib import Path
@@ -7,10 +7,16 @@ import asyncio
 from typing import Optional
 from datetime import datetime
 import decimal
+import json
 import time
 
 from bot.services.database_service import db_service
-from bot.config import BASE_DIR, FREE_QUESTIONS_LIMIT, PERPLEXITY_ENABLED, settings, PREMIUM_PRICE_ORIGINAL, PREMIUM_PRICE_DISCOUNT
+from bot.services.report_queue import report_queue
+from bot.config import (
+    BASE_DIR, FREE_QUESTIONS_LIMIT, PERPLEXITY_ENABLED, settings, PREMIUM_PRICE_ORIGINAL, PREMIUM_PRICE_DISCOUNT, PDF_RENDER_TIMEOUT_SECONDS,
+    REPORT_EVENTS_HEARTBEAT_SECONDS, REPORT_EVENTS_RESYNC_SECONDS, REPORT_EVENTS_MAX_SECONDS, PAYMENT_STATUS_MAX_WAIT_SECONDS,
+    REPORT_DOWNLOAD_RETRY_AFTER_SECONDS
+)
 from bot.models.api_models import (
     AnswerRequest, UserProfileUpdate, CurrentQuestionResponse, 
     NextQuestionResponse, UserProgressResponse, UserProfileResponse,
@@ -18,7 +24,7 @@ from bot.models.api_models import (
 )
 from loguru import logger
 from bot.services.oplata import RobokassaService
-from bot.database.models import PaymentStatus, ReportGenerationStatus, User
+from bot.database.models import PaymentStatus, ReportGenerationStatus, ReportJobStatus, User
 
 # Путь к статическим файлам
 STATIC_DIR = BASE_DIR / "frontend"
@@ -57,6 +63,45 @@ async def update_user_current_question(telegram_id: int, question_id: int):
         )
         await session.execute(stmt)
         await session.commit()
+    
+    from bot.services.user_cache import user_cache
+    user_cache.invalidate(telegram_id)
+
+async def build_current_question_response(user: User, question) -> CurrentQuestionResponse:
+    """Текущий вопрос с прогрессом для уже загруженного пользователя"""
+    # Получаем общее количество вопросов для этого пользователя
+    test_version = "premium" if user.is_paid else "free"
+    total_questions = await db_service.get_total_questions(test_version)
+    
+    # Для премиум-теста показываем относительный номер (1 из 38), не глобальный (9 из 38)
+    display_current = (
+        question.order_number - FREE_QUESTIONS_LIMIT
+        if test_version == "premium"
+        else question.order_number
+    )
+    
+    # Количество уже отвеченных вопросов - из счетчиков пользователя
+    answered_count = db_service.get_answer_counts(user)["total"]
+    
+    return CurrentQuestionResponse(
+        question=QuestionResponse(
+            id=question.id,
+            text=question.text,
+            order_number=question.order_number,
+            type=question.type.value,
+            allow_voice=question.allow_voice,
+            max_length=question.max_length
+        ),
+        progress=ProgressResponse(
+            current=display_current,
+            total=total_questions,
+            answered=answered_count
+        ),
+        user=UserStatusResponse(
+            is_paid=user.is_paid,
+            test_completed=user.test_completed
+        )
+    )
 
 @app.get("/api/user/{telegram_id}/current-question", 
          response_model=CurrentQuestionResponse,
@@ -72,35 +117,21 @@ async def get_current_question(telegram_id: int):
         if not user.current_question_id:
             # Для оплаченных пользователей проверяем, есть ли уже ответы
             if user.is_paid:
-                answers = await db_service.get_user_answers(telegram_id)
-                if answers:
-                    # Если есть ответы, находим следующий вопрос после последнего отвеченного
-                    # Получаем все вопросы, на которые пользователь ответил
-                    answered_questions = []
-                    for answer in answers:
-                        question = await db_service.get_question(answer.question_id)
-                        if question:
-                            answered_questions.append(question)
-                    
-                    if answered_questions:
-                        # Находим вопрос с максимальным order_number
-                        last_question = max(answered_questions, key=lambda x: x.order_number)
-                        
-                        if last_question:
-                            test_version = "premium" if user.is_paid else "free"
-                            next_question = await db_service.get_next_question(last_question.id, test_version)
-                            if next_question:
-                                # Обновляем текущий вопрос пользователя
-                                await update_user_current_question(telegram_id, next_question.id)
-                                user.current_question_id = next_question.id
-                            else:
-                                # Если следующего вопроса нет, тест завершен
-                                user.test_completed = True
-                                user.test_completed_at = datetime.utcnow()
-                                # Обновляем пользователя через сервис
-                                await db_service.complete_test(telegram_id)
-                        else:
-                            user = await db_service.start_test(telegram_id)
+                # Если есть ответы, находим следующий вопрос после последнего отвеченного
+                last_question = await db_service.get_last_answered_question(telegram_id)
+                if last_question:
+                    test_version = "premium" if user.is_paid else "free"
+                    next_question = await db_service.get_next_question(last_question.id, test_version)
+                    if next_question:
+                        # Обновляем текущий вопрос пользователя
+                        await update_user_current_question(telegram_id, next_question.id)
+                        user.current_question_id = next_question.id
+                    else:
+                        # Если следующего вопроса нет, тест завершен
+                        user.test_completed = True
+                        user.test_completed_at = datetime.utcnow()
+                        # Обновляем пользователя через сервис
+                        await db_service.complete_test(telegram_id)
                 else:
                     user = await db_service.start_test(telegram_id)
             else:
@@ -124,40 +155,7 @@ async def get_current_question(telegram_id: int):
         if not question:
             raise HTTPException(status_code=404, detail="Question not found")
         
-        # Получаем общее количество вопросов для этого пользователя
-        test_version = "premium" if user.is_paid else "free"
-        total_questions = await db_service.get_total_questions(test_version)
-        
-        # Для премиум-теста показываем относительный номер (1 из 38), не глобальный (9 из 38)
-        display_current = (
-            question.order_number - FREE_QUESTIONS_LIMIT
-            if test_version == "premium"
-            else question.order_number
-        )
-        
-        # Получаем количество уже отвеченных вопросов
-        answers = await db_service.get_user_answers(telegram_id)
-        answered_count = len(answers)
-        
-        return CurrentQuestionResponse(
-            question=QuestionResponse(
-                id=question.id,
-                text=question.text,
-                order_number=question.order_number,
-                type=question.type.value,
-                allow_voice=question.allow_voice,
-                max_length=question.max_length
-            ),
-            progress=ProgressResponse(
-                current=display_current,
-                total=total_questions,
-                answered=answered_count
-            ),
-            user=UserStatusResponse(
-                is_paid=user.is_paid,
-                test_completed=user.test_completed
-            )
-        )
+        return await build_current_question_response(user, question)
         
     except HTTPException as e:
         # Пробрасываем HTTP ошибки (например 400: Test already completed)
@@ -175,50 +173,31 @@ async def save_answer(telegram_id: int, answer_data: AnswerRequest):
     try:
         logger.info(f"💬 Начало обработки ответа для пользователя {telegram_id}")
         
-        # Получаем пользователя
-        user = await db_service.get_or_create_user(telegram_id=telegram_id)
-        logger.info(f"👤 Пользователь: id={user.id}, is_paid={user.is_paid}, current_question_id={user.current_question_id}")
+        # Сохраняем ответ и переходим к следующему вопросу одной транзакцией
+        result = await db_service.submit_answer(
+            telegram_id=telegram_id,
+            text_answer=answer_data.text_answer,
+            answer_type=answer_data.answer_type
+        )
         
-        if not user.current_question_id:
+        if result["status"] == "no_active_question":
             logger.error(f"❌ Нет активного вопроса для пользователя {telegram_id}")
             raise HTTPException(status_code=400, detail="No active question")
         
-        # Получаем текущий вопрос
-        current_question = await db_service.get_question(user.current_question_id)
-        
-        if not current_question:
+        if result["status"] == "question_not_found":
             raise HTTPException(status_code=404, detail="Current question not found")
         
-        # Сохраняем ответ
-        answer = await db_service.save_answer(
-            telegram_id=telegram_id,
-            question_id=current_question.id,
-            text_answer=answer_data.text_answer,
-            answer_type=answer_data.answer_type
-        )
-        
         # Perplexity анализ интегрирован только в генерацию отчетов, не в сохранение ответов
         # Сохраняем ответ без промежуточного анализа 
-        logger.info(f"ℹ️ Ответ {answer.id} сохранен (ИИ-анализ будет выполнен при генерации отчета)")
-        
-        # Получаем следующий вопрос
-        test_version = "premium" if user.is_paid else "free"
-        logger.info(f"🔍 Поиск следующего вопроса: current_order={current_question.order_number}, is_paid={user.is_paid}, test_version={test_version}")
-        next_question = await db_service.get_next_question(
-            current_question.id,
-            test_version
-        )
-        logger.info(f"🎯 Результат поиска: {next_question.order_number if next_question else 'None'}")
+        logger.info(f"ℹ️ Ответ {result['answer'].id} сохранен (ИИ-анализ будет выполнен при генерации отчета)")
+        
+        current_question = result["current_question"]
+        next_question = result["next_question"]
+        test_version = result["test_version"]
+        logger.info(f"🎯 Следующий вопрос после {current_question.order_number} ({test_version}): {next_question.order_number if next_question else 'None'}")
         
         if next_question:
-            # Обновляем текущий вопрос пользователя
-            await update_user_current_question(telegram_id, next_question.id)
-            
-            # Получаем общее количество вопросов
-            test_version = "premium" if user.is_paid else "free"
             total_questions = await db_service.get_total_questions(test_version)
-            answers = await db_service.get_user_answers(telegram_id)
-            answered_count = len(answers)
             
             # Для премиум-теста показываем относительный номер (1 из 38), не глобальный (9 из 38)
             display_current = (
@@ -240,13 +219,12 @@ async def save_answer(telegram_id: int, answer_data: AnswerRequest):
                 progress=ProgressResponse(
                     current=display_current,
                     total=total_questions,
-                    answered=answered_count
+                    answered=result["answered"]
                 )
             )
         else:
-            # Тест завершен
-            logger.info(f"✅ Завершение теста для пользователя {telegram_id} после вопроса {current_question.order_number}")
-            await db_service.complete_test(telegram_id)
+            # Тест завершен в транзакции submit_answer
+            logger.info(f"✅ Тест завершен для пользователя {telegram_id} после вопроса {current_question.order_number}")
             
             # НЕ запускаем генерацию отчета в фоне - это будет делаться на loading.html
             # import asyncio
@@ -265,6 +243,28 @@ async def save_answer(telegram_id: int, answer_data: AnswerRequest):
         logger.error(f"Error saving answer: {e}")
         raise HTTPException(status_code=500, detail="Failed to save answer")
 
+async def build_progress_summary(user: User) -> dict:
+    """Пользователь и прогресс теста (без списка ответов) для уже загруженного пользователя"""
+    answered_count = db_service.get_answer_counts(user)["total"]
+    test_version = "premium" if user.is_paid else "free"
+    total_questions = await db_service.get_total_questions(test_version)
+    
+    return {
+        "user": {
+            "telegram_id": user.telegram_id,
+            "first_name": user.first_name,
+            "is_paid": user.is_paid,
+            "test_completed": user.test_completed,
+            "test_started_at": user.test_started_at.isoformat() if user.test_started_at else None,
+            "test_completed_at": user.test_completed_at.isoformat() if user.test_completed_at else None
+        },
+        "progress": {
+            "answered": answered_count,
+            "total": total_questions,
+            "percentage": round((answered_count / total_questions) * 100, 1) if total_questions > 0 else 0
+        }
+    }
+
 @app.get("/api/user/{telegram_id}/progress",
          response_model=UserProgressResponse,
          summary="Получить прогресс пользователя",
@@ -274,23 +274,9 @@ async def get_user_progress(telegram_id: int):
     try:
         user = await db_service.get_or_create_user(telegram_id=telegram_id)
         answers = await db_service.get_user_answers(telegram_id)
-        test_version = "premium" if user.is_paid else "free"
-        total_questions = await db_service.get_total_questions(test_version)
         
         return UserProgressResponse(
-            user={
-                "telegram_id": user.telegram_id,
-                "first_name": user.first_name,
-                "is_paid": user.is_paid,
-                "test_completed": user.test_completed,
-                "test_started_at": user.test_started_at.isoformat() if user.test_started_at else None,
-                "test_completed_at": user.test_completed_at.isoformat() if user.test_completed_at else None
-            },
-            progress={
-                "answered": len(answers),
-                "total": total_questions,
-                "percentage": round((len(answers) / total_questions) * 100, 1) if total_questions > 0 else 0
-            },
+            **await build_progress_summary(user),
             answers=[
                 {
                     "question_id": ans.question_id,
@@ -306,6 +292,27 @@ async def get_user_progress(telegram_id: int):
         logger.error(f"Error getting user progress: {e}")
         raise HTTPException(status_code=500, detail="Failed to get progress")
 
+def build_user_profile_response(user: User) -> UserProfileResponse:
+    """Профиль уже загруженного пользователя"""
+    # Определяем статус оплаты
+    payment_status = None
+    if user.is_paid:
+        payment_status = "completed"
+    elif user.is_premium_paid:
+        payment_status = "pending"
+    
+    return UserProfileResponse(
+        status="success",
+        user={
+            "telegram_id": user.telegram_id,
+            "first_name": user.first_name,
+            "name": user.name,
+            "age": user.age,
+            "gender": user.gender
+        },
+        payment_status=payment_status
+    )
+
 @app.get("/api/user/{telegram_id}/profile",
          response_model=UserProfileResponse,
          summary="Получить профиль пользователя",
@@ -319,24 +326,7 @@ async def get_user_profile(telegram_id: int):
         user = await db_service.get_or_create_user(telegram_id=telegram_id)
         logger.info(f"Пользователь найден: {user.telegram_id}")
         
-        # Определяем статус оплаты
-        payment_status = None
-        if user.is_paid:
-            payment_status = "completed"
-        elif user.is_premium_paid:
-            payment_status = "pending"
-        
-        return UserProfileResponse(
-            status="success",
-            user={
-                "telegram_id": user.telegram_id,
-                "first_name": user.first_name,
-                "name": user.name,
-                "age": user.age,
-                "gender": user.gender
-            },
-            payment_status=payment_status
-        )
+        return build_user_profile_response(user)
         
     except Exception as e:
         logger.error(f"Error getting user profile: {e}")
@@ -365,31 +355,61 @@ async def update_user_profile(telegram_id: int, profile_data: UserProfileUpdate)
         )
         logger.info(f"Профиль обновлен: name={user.name}, age={user.age}, gender={user.gender}")
         
-        # Определяем статус оплаты
-        payment_status = None
-        if user.is_paid:
-            payment_status = "completed"
-        elif user.is_premium_paid:
-            payment_status = "pending"
-        
-        return UserProfileResponse(
-            status="success",
-            user={
-                "telegram_id": user.telegram_id,
-                "first_name": user.first_name,
-                "name": user.name,
-                "age": user.age,
-                "gender": user.gender
-            },
-            payment_status=payment_status
-        )
+        return build_user_profile_response(user)
         
     except Exception as e:
         logger.error(f"Error updating user profile: {e}")
         raise HTTPException(status_code=500, detail="Failed to update profile")
 
+async def get_user_payment_status(user: User) -> Optional[str]:
+    """Статус оплаты: completed (пользователь переведен на премиум), failed, pending или None"""
+    if user.is_paid:
+        return "completed"
+    # Платеж COMPLETED до перевода на премиум - оплата еще обрабатывается
+    payment = await db_service.get_latest_payment(user.id)
+    if payment is None:
+        return None
+    if payment.status in (PaymentStatus.FAILED, PaymentStatus.CANCELLED):
+        return "failed"
+    return "pending"
+
+@app.get("/api/user/{telegram_id}/payment-status", summary="Статус оплаты (long-poll)")
+async def get_payment_status(telegram_id: int, wait: float = 0):
+    """Статус оплаты пользователя.
+
+    С параметром wait (секунды, не больше PAYMENT_STATUS_MAX_WAIT_SECONDS) запрос
+    с незавершенной оплатой ждет смены статуса платежа и отвечает сразу после нее
+    или по истечении wait.
+    """
+    try:
+        from bot.services.payment_events import payment_events
+
+        user = await db_service.get_or_create_user(telegram_id=telegram_id)
+        wait = min(max(wait, 0), PAYMENT_STATUS_MAX_WAIT_SECONDS)
+
+        # Ожидание регистрируется до чтения статуса, чтобы не пропустить сигнал между ними:
+        # пользователь (is_paid) перечитывается после watch - пишущие методы сбрасывают кэш
+        waiter = payment_events.watch(user.id)
+        try:
+            payment_status = await get_user_payment_status(await db_service.get_user(telegram_id))
+            if wait and payment_status not in ("completed", "failed"):
+                try:
+                    await asyncio.wait_for(waiter, timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                else:
+                    payment_status = await get_user_payment_status(await db_service.get_user(telegram_id))
+        finally:
+            payment_events.unwatch(user.id, waiter)
+
+        return {"status": "success", "payment_status": payment_status}
+
+    except Exception as e:
+        logger.error(f"Error getting payment status: {e}")
+        raise HTTPException(status_code=500, detail="Failed to get payment status")
+
 # Обработчик ошибок
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse, FileResponse, Response
 
 @app.exception_handler(404)
 async def not_found_handler(request, exc):
@@ -405,6 +425,25 @@ async def health_check():
     """Проверка работоспособности API"""
     return {"status": "ok", "message": "PRIZMA API is running"}
 
+@app.get("/api/health/reports", summary="Состояние очереди и рендера отчетов")
+async def reports_health():
+    """Счетчики очереди генерации отчетов, кэша PDF шаблонов, ограничителя запросов к ИИ и SSE подписок"""
+    from bot.services.pdf_renderer import pdf_renderer
+    from bot.services.perplexity import api_governor
+    from bot.services.report_events import report_events
+    return {
+        "queue": await report_queue.get_queue_stats(),
+        "template_cache": pdf_renderer.get_template_cache_stats(),
+        "ai_rate_limiter": api_governor.get_stats(),
+        "report_events": report_events.get_stats()
+    }
+
+@app.get("/api/health/cache", summary="Состояние кэша пользователей")
+async def cache_health():
+    """Размер и доля попаданий кэша пользователей"""
+    from bot.services.user_cache import user_cache
+    return {"user_cache": user_cache.get_stats()}
+
 @app.get("/api/info", summary="Информация об API")
 async def api_info():
     """Информация об API"""
@@ -439,34 +478,11 @@ async def check_report_status(telegram_id: int):
             logger.info(f"💰 Пользователь {telegram_id} оплатил премиум отчет. Не возвращаем статус бесплатного отчета.")
             return {"status": "premium_paid", "message": "Для оплативших премиум пользователей используется премиум отчет."}
         
-        # Ищем последний отчет пользователя
-        reports_dir = Path("reports")
-        pattern = f"prizma_report_{telegram_id}_*.pdf"
-        
-        import glob
-        report_files = glob.glob(str(reports_dir / pattern))
-        
-        if report_files:
-            # Сортируем по timestamp в имени файла (более надежно чем st_mtime)
-            # Имя файла: prizma_report_{telegram_id}_{timestamp}.pdf
-            def extract_timestamp(filepath):
-                filename = Path(filepath).name
-                # Извлекаем timestamp из имени файла: prizma_report_123456789_20250627_082506.pdf
-                parts = filename.split('_')
-                if len(parts) >= 5:
-                    try:
-                        # Берем дату и время: parts[3] = '20250627', parts[4] = '082506.pdf'
-                        date_part = parts[3]
-                        time_part = parts[4].replace('.pdf', '').replace('.txt', '')
-                        timestamp_str = f"{date_part}_{time_part}"
-                        return timestamp_str
-                    except:
-                        return "00000000_000000"
-                return "00000000_000000"
-                
-            # Находим последний файл по timestamp
-            latest_report = max(report_files, key=extract_timestamp)
-            return {"status": "ready", "message": "Отчет готов к скачиванию", "report_path": latest_report}
+        # Ищем последний отчет пользователя в реестре
+        artifact = await db_service.get_latest_report_artifact(telegram_id, "free")
+        
+        if artifact:
+            return {"status": "ready", "message": "Отчет готов к скачиванию", "report_path": artifact.path}
         else:
             return {"status": "not_ready", "message": "Отчет еще не готов"}
             
@@ -475,7 +491,7 @@ async def check_report_status(telegram_id: int):
         return {"status": "error", "message": "Ошибка при проверке статуса отчета"}
 
 @app.post("/api/user/{telegram_id}/generate-report", summary="Запустить генерацию отчета")
-async def start_report_generation(telegram_id: int, background_tasks: BackgroundTasks):
+async def start_report_generation(telegram_id: int):
     """Запустить генерацию отчета пользователя"""
     try:
         # Проверяем, что пользователь завершил тест
@@ -499,47 +515,11 @@ async def start_report_generation(telegram_id: int, background_tasks: Background
             return {"status": "already_processing", "message": "Отчет уже генерируется. Пожалуйста, подождите."}
         
         # Проверяем, не существует ли уже готовый отчет, созданный после завершения теста
-        import glob
-        reports_dir = Path("reports")
-        pattern = f"prizma_report_{telegram_id}_*.pdf"
-        report_files = glob.glob(str(reports_dir / pattern))
-        
-        if report_files:
-            # Функция для извлечения timestamp
-            def extract_timestamp(filepath):
-                filename = Path(filepath).name
-                parts = filename.split('_')
-                if len(parts) >= 5:
-                    try:
-                        date_part = parts[3]
-                        time_part = parts[4].replace('.pdf', '')
-                        return f"{date_part}_{time_part}"
-                    except:
-                        pass
-                return str(int(Path(filepath).stat().st_mtime))
-            
-            # Фильтруем отчеты: берем только те, что созданы после завершения текущего теста
-            test_completed_at = user.test_completed_at
-            valid_reports = []
-            
-            if test_completed_at:
-                test_date_str = test_completed_at.strftime("%Y%m%d_%H%M%S")
-                for report_file in report_files:
-                    report_timestamp = extract_timestamp(report_file)
-                    if report_timestamp >= test_date_str:
-                        valid_reports.append(report_file)
-                        logger.info(f"✅ Отчет {Path(report_file).name} валиден (создан после завершения теста)")
-                    else:
-                        logger.info(f"⚠️ Отчет {Path(report_file).name} устарел, будет удален при следующем прохождении")
-            
-            if valid_reports:
-                # Сортируем и берем последний валидный отчет
-                valid_reports.sort(key=extract_timestamp, reverse=True)
-                latest_report = valid_reports[0]
+        if user.test_completed_at:
+            artifact = await db_service.get_latest_report_artifact(telegram_id, "free", created_after=user.test_completed_at)
+            if artifact:
                 logger.info(f"✅ Валидный отчет уже существует для пользователя {telegram_id}, не запускаем повторную генерацию")
-                return {"status": "already_exists", "message": "Отчет уже существует", "report_path": latest_report}
-            else:
-                logger.info(f"🔄 Все существующие отчеты устарели для пользователя {telegram_id}, запускаем новую генерацию")
+                return {"status": "already_exists", "message": "Отчет уже существует", "report_path": artifact.path}
         
         logger.info(f"🚀 Запускаем асинхронную генерацию БЕСПЛАТНОГО отчета для пользователя {telegram_id}")
         
@@ -550,23 +530,164 @@ async def start_report_generation(telegram_id: int, background_tasks: Background
             ReportGenerationStatus.PROCESSING
         )
         
-        # Запускаем генерацию в фоне через BackgroundTasks (правильный способ в FastAPI)
-        background_tasks.add_task(generate_report_background, telegram_id)
+        # Ставим генерацию в очередь - ее выполнит пул воркеров report_queue
+        job = await report_queue.enqueue(telegram_id, "free")
         
-        logger.info(f"✅ Генерация отчета запущена в фоне для пользователя {telegram_id}")
-        return {"status": "processing", "message": "Генерация отчета запущена. Мы пришлем вам отчет в боте, как только он будет готов."}
+        logger.info(f"✅ Генерация отчета поставлена в очередь для пользователя {telegram_id}, задача {job.id}")
+        return {"status": "processing", "message": "Генерация отчета запущена. Мы пришлем вам отчет в боте, как только он будет готов.", "job_id": job.id}
             
     except Exception as e:
         logger.error(f"Error starting report generation: {e}")
         return {"status": "error", "message": f"Ошибка при генерации отчета: {str(e)}"}
 
+# Кэширование файлов отчетов: ETag - sha256 содержимого из реестра отчетов.
+# Адрес /api/download/<тип>/{telegram_id}/{sha256} указывает на неизменяемое
+# содержимое и кэшируется навсегда, обычный адрес - с проверкой через If-None-Match
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+def report_version_url(telegram_id: int, kind: str, sha256: str) -> str:
+    """Адрес конкретной версии отчета (по хэшу содержимого)"""
+    prefix = "premium-report" if kind == "premium" else "report"
+    return f"/api/download/{prefix}/{telegram_id}/{sha256}"
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Совпадает ли заголовок If-None-Match с ETag (слабое сравнение, как положено для GET)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+def report_file_response(request: Request, artifact, telegram_id: int,
+                         disposition: str = "attachment", immutable: bool = False) -> Response:
+    """Ответ с файлом отчета: ETag, 304 по If-None-Match, Range (FileResponse)"""
+    filename = (
+        f"prizma-premium-report-{telegram_id}.pdf"
+        if artifact.kind == "premium"
+        else f"prizma-report-{telegram_id}.pdf"
+    )
+    headers = {
+        "Content-Disposition": f'{disposition}; filename="{filename}"',
+        "X-Content-Type-Options": "nosniff",
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+    }
+    
+    # Отчеты без хэша (зарегистрированы до реестра с sha256) получают ETag FileResponse по размеру и mtime
+    if artifact.sha256:
+        headers["ETag"] = f'"{artifact.sha256}"'
+        if not immutable:
+            headers["Content-Location"] = report_version_url(telegram_id, artifact.kind, artifact.sha256)
+        
+        # Отчет у клиента актуален - отвечаем без чтения файла
+        if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            logger.info(f"♻️ Отчет {artifact.kind} пользователя {telegram_id} не изменился (304)")
+            return Response(
+                status_code=304,
+                headers={key: headers[key] for key in ("ETag", "Cache-Control", "Content-Location") if key in headers}
+            )
+    
+    if not os.path.exists(artifact.path):
+        logger.error(f"❌ Файл отчета не найден: {artifact.path}")
+        raise HTTPException(status_code=500, detail="Файл отчета поврежден")
+    
+    logger.info(f"📄 Отдаем отчет: {artifact.path}, размер: {artifact.size or os.path.getsize(artifact.path)} байт")
+    # FileResponse сам обрабатывает Range/If-Range (возобновление скачивания)
+    return FileResponse(path=artifact.path, media_type="application/pdf", headers=headers)
+
+@app.get("/api/download/report/{telegram_id}/{sha256}", summary="Скачать версию персонального отчета")
+async def download_report_version(telegram_id: int, sha256: str, request: Request, download: Optional[str] = None):
+    """Скачать отчет по хэшу содержимого - адрес не меняет содержимое и кэшируется как immutable"""
+    artifact = await db_service.get_report_artifact_by_hash(telegram_id, "free", sha256)
+    if not artifact:
+        raise HTTPException(status_code=404, detail="Отчет не найден")
+    return report_file_response(
+        request, artifact, telegram_id,
+        disposition="attachment" if download == "1" else "inline",
+        immutable=True
+    )
+
+@app.get("/api/download/premium-report/{telegram_id}/{sha256}", summary="Скачать версию платного отчета")
+async def download_premium_report_version(telegram_id: int, sha256: str, request: Request):
+    """Скачать платный отчет по хэшу содержимого - адрес не меняет содержимое и кэшируется как immutable"""
+    artifact = await db_service.get_report_artifact_by_hash(telegram_id, "premium", sha256)
+    if not artifact:
+        raise HTTPException(status_code=404, detail="Отчет не найден")
+    return report_file_response(request, artifact, telegram_id, disposition="attachment", immutable=True)
+
+async def accept_report_generation(telegram_id: int, report_type: str) -> JSONResponse:
+    """Поставить генерацию отчета в очередь и ответить 202 с номером задачи.
+
+    Если задача уже в очереди или выполняется, возвращается она же.
+    """
+    await db_service.reset_stuck_reports(telegram_id)
+    if not await db_service.is_report_generating(telegram_id, report_type):
+        await db_service.update_report_generation_status(
+            telegram_id,
+            report_type,
+            ReportGenerationStatus.PROCESSING
+        )
+    job = await report_queue.enqueue(telegram_id, report_type)
+    
+    job_url = f"/api/user/{telegram_id}/report-jobs/{job.id}"
+    logger.info(f"📥 Скачивание отчета ({report_type}) для пользователя {telegram_id}: отчет генерируется, задача {job.id}")
+    return JSONResponse(
+        status_code=202,
+        content={
+            "status": "processing",
+            "message": "Отчет генерируется. Пожалуйста, подождите и попробуйте позже.",
+            "job_id": job.id,
+            "job_url": job_url
+        },
+        headers={
+            "Retry-After": str(REPORT_DOWNLOAD_RETRY_AFTER_SECONDS),
+            "Location": job_url,
+            "Cache-Control": "no-store"
+        }
+    )
+
+@app.get("/api/user/{telegram_id}/report-jobs/{job_id}", summary="Состояние задачи генерации отчета")
+async def get_report_job(telegram_id: int, job_id: int):
+    """Состояние задачи из очереди генерации (номер задачи возвращают генерация и скачивание отчета)"""
+    job = await report_queue.get_job(job_id)
+    if not job or job.telegram_id != telegram_id:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    
+    content = {
+        "job_id": job.id,
+        "report_type": job.report_type,
+        "status": job.status.value,
+        "attempts": job.attempts,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
+    headers = {"Cache-Control": "no-store"}
+    if job.status in (ReportJobStatus.QUEUED, ReportJobStatus.RUNNING):
+        headers["Retry-After"] = str(REPORT_DOWNLOAD_RETRY_AFTER_SECONDS)
+    elif job.status == ReportJobStatus.COMPLETED and await is_report_downloadable(telegram_id, job.report_type):
+        content["download_url"] = (
+            f"/api/download/premium-report/{telegram_id}"
+            if job.report_type == "premium"
+            else f"/api/download/report/{telegram_id}"
+        )
+    return JSONResponse(content=content, headers=headers)
+
+async def is_report_downloadable(telegram_id: int, report_type: str) -> bool:
+    """Отчет готов к скачиванию: статус генерации COMPLETED и файл последнего отчета на месте"""
+    user = await db_service.get_user(telegram_id)
+    if not user:
+        return False
+    status = user.premium_report_status if report_type == "premium" else user.free_report_status
+    if status != ReportGenerationStatus.COMPLETED:
+        return False
+    artifact = await db_service.get_latest_report_artifact(telegram_id, report_type)
+    return artifact is not None and os.path.exists(artifact.path)
+
 @app.get("/api/download/report/{telegram_id}", summary="Скачать персональный отчет")
-async def download_personal_report(telegram_id: int, download: Optional[str] = None, method: Optional[str] = None, t: Optional[str] = None):
+async def download_personal_report(telegram_id: int, request: Request, download: Optional[str] = None, method: Optional[str] = None, t: Optional[str] = None):
     """Скачать готовый персональный отчет пользователя"""
-    from fastapi.responses import FileResponse
-    import os
-    import glob
-    
     try:
         logger.info(f"📁 Запрос скачивания отчета для пользователя {telegram_id}")
         logger.info(f"📊 Параметры: download={download}, method={method}, t={t}")
@@ -585,141 +706,22 @@ async def download_personal_report(telegram_id: int, download: Optional[str] = N
             from fastapi.responses import RedirectResponse
             return RedirectResponse(url=f"/api/download/premium-report/{telegram_id}")
         
-        # Ищем готовый отчет пользователя
-        reports_dir = Path("reports")
-        pattern = f"prizma_report_{telegram_id}_*.pdf"
-        report_files = glob.glob(str(reports_dir / pattern))
-        
-        if not report_files:
-            # Проверяем, не генерируется ли уже отчет
-            is_generating = await db_service.is_report_generating(telegram_id, "free")
-            if is_generating:
-                logger.info(f"⏳ Отчет уже генерируется для пользователя {telegram_id}, ждем завершения...")
-                raise HTTPException(status_code=202, detail="Отчет генерируется. Пожалуйста, подождите и попробуйте позже.")
-            
-            logger.warning(f"⚠️ Отчет для пользователя {telegram_id} не найден, запускаем генерацию...")
-            
-            # Обновляем статус в БД перед генерацией
-            await db_service.update_report_generation_status(
-                telegram_id, 
-                "free", 
-                ReportGenerationStatus.PROCESSING
-            )
-            
-            # Запускаем генерацию отчета и ждем завершения
-            try:
-                await generate_report_background(telegram_id)
-                
-                # Повторно ищем отчет после генерации
-                report_files = glob.glob(str(reports_dir / pattern))
-                if not report_files:
-                    logger.error(f"❌ Отчет не создался даже после генерации для пользователя {telegram_id}")
-                    raise HTTPException(status_code=500, detail="Ошибка создания отчета. Попробуйте позже.")
-                
-                logger.info(f"✅ Отчет успешно создан для пользователя {telegram_id}")
-            except Exception as e:
-                logger.error(f"❌ Ошибка при генерации отчета для пользователя {telegram_id}: {e}")
-                raise HTTPException(status_code=500, detail="Ошибка создания отчета. Попробуйте позже.")
-        
-        # Функция для извлечения timestamp из имени файла
-        def extract_timestamp(filepath):
-            filename = Path(filepath).name
-            # Извлекаем timestamp из имени файла: prizma_report_123456789_20250627_082506.pdf
-            parts = filename.split('_')
-            if len(parts) >= 5:
-                try:
-                    # Берем дату и время: parts[3] = '20250627', parts[4] = '082506.pdf'
-                    date_part = parts[3]
-                    time_part = parts[4].replace('.pdf', '').replace('.txt', '')
-                    timestamp_str = f"{date_part}_{time_part}"
-                    return timestamp_str
-                except:
-                    pass
-            # Если не удается извлечь timestamp, используем время модификации как fallback
-            return str(int(Path(filepath).stat().st_mtime))
-        
-        # Сортируем по timestamp (последний будет первым) и берем последний отчет
-        report_files.sort(key=extract_timestamp, reverse=True)
+        # Ищем готовый отчет, созданный после завершения текущего теста
+        if not user.test_completed_at:
+            logger.warning(f"⚠️ test_completed_at не установлен для пользователя {telegram_id}, используем последний отчет")
+        artifact = await db_service.get_latest_report_artifact(telegram_id, "free", created_after=user.test_completed_at)
         
-        # Фильтруем отчеты: берем только те, что созданы после завершения текущего теста
-        test_completed_at = user.test_completed_at
-        valid_reports = []
+        if not artifact:
+            # Генерацию выполняет очередь - запрос не ждет ИИ-анализ
+            logger.warning(f"⚠️ Валидный отчет для пользователя {telegram_id} не найден, ставим генерацию в очередь")
+            return await accept_report_generation(telegram_id, "free")
         
-        if test_completed_at:
-            # Преобразуем test_completed_at в формат для сравнения
-            test_date_str = test_completed_at.strftime("%Y%m%d_%H%M%S")
-            
-            for report_file in report_files:
-                report_timestamp = extract_timestamp(report_file)
-                # Сравниваем timestamp отчета с датой завершения теста
-                if report_timestamp >= test_date_str:
-                    valid_reports.append(report_file)
-                    logger.info(f"✅ Отчет {Path(report_file).name} валиден (создан после завершения теста)")
-                else:
-                    logger.warning(f"⚠️ Отчет {Path(report_file).name} устарел (создан до завершения теста), пропускаем")
-        else:
-            # Если test_completed_at не установлен, берем последний отчет
-            valid_reports = report_files[:1] if report_files else []
-            logger.warning(f"⚠️ test_completed_at не установлен для пользователя {telegram_id}, используем последний отчет")
+        logger.info(f"📄 Выбран отчет: {artifact.path} (создан {artifact.created_at})")
         
-        if not valid_reports:
-            logger.warning(f"⚠️ Нет валидных отчетов для пользователя {telegram_id} после завершения теста")
-            # Если нет валидных отчетов, но есть старые - запускаем генерацию
-            if report_files:
-                logger.info(f"🔄 Запускаем генерацию нового отчета...")
-                # Обновляем статус в БД перед генерацией
-                await db_service.update_report_generation_status(
-                    telegram_id, 
-                    "free", 
-                    ReportGenerationStatus.PROCESSING
-                )
-                try:
-                    await generate_report_background(telegram_id)
-                    # Повторно ищем отчет после генерации
-                    report_files = glob.glob(str(reports_dir / pattern))
-                    if report_files:
-                        report_files.sort(key=extract_timestamp, reverse=True)
-                        valid_reports = report_files[:1]
-                except Exception as e:
-                    logger.error(f"❌ Ошибка при генерации отчета: {e}")
-                    raise HTTPException(status_code=500, detail="Ошибка создания отчета. Попробуйте позже.")
-        
-        latest_report = valid_reports[0]
-        
-        logger.info(f"📋 Найдено отчетов: {len(report_files)}, валидных: {len(valid_reports)}")
-        logger.info(f"📄 Выбран валидный отчет: {latest_report}")
-        for i, report in enumerate(valid_reports[:3]):  # Показываем первые 3 для отладки
-            logger.info(f"   {i+1}. {Path(report).name} (timestamp: {extract_timestamp(report)})")
-        
-        if not os.path.exists(latest_report):
-            logger.error(f"❌ Файл отчета не найден: {latest_report}")
-            raise HTTPException(status_code=500, detail="Файл отчета поврежден")
-        
-        logger.info(f"📄 Отдаем готовый отчет: {latest_report}, размер: {os.path.getsize(latest_report)} байт")
-        
-        # Определяем заголовки для скачивания
-        headers = {}
-        
-        # Для принудительного скачивания (из Telegram Web App)
-        if download == "1":
-            headers["Content-Disposition"] = f'attachment; filename="prizma-report-{telegram_id}.pdf"'
-            headers["Content-Type"] = "application/pdf"
-            headers["X-Content-Type-Options"] = "nosniff"
-            headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-            headers["Pragma"] = "no-cache"
-            headers["Expires"] = "0"
-            logger.info("📱 Принудительное скачивание для Telegram Web App")
-        else:
-            # Обычное открытие в браузере
-            headers["Content-Disposition"] = f'inline; filename="prizma-report-{telegram_id}.pdf"'
-            logger.info("🌐 Обычное открытие в браузере")
-        
-        # Возвращаем файл для скачивания
-        return FileResponse(
-            path=latest_report,
-            media_type='application/pdf',
-            filename=f"prizma-report-{telegram_id}.pdf",
-            headers=headers
+        # Для принудительного скачивания (из Telegram Web App) - attachment, иначе открытие в браузере
+        return report_file_response(
+            request, artifact, telegram_id,
+            disposition="attachment" if download == "1" else "inline"
         )
         
     except HTTPException:
@@ -737,12 +739,9 @@ async def generate_report_background(telegram_id: int):
         # Получаем пользователя
         user = await db_service.get_or_create_user(telegram_id=telegram_id)
         
-        # Проверяем, не существует ли уже готовый отчет
-        import glob
-        reports_dir = Path("reports")
-        pattern = f"prizma_report_{telegram_id}_*.pdf"
-        report_files = glob.glob(str(reports_dir / pattern))
-        if report_files:
+        # Проверяем, не существует ли уже готовый отчет для текущего прохождения теста
+        artifact = await db_service.get_latest_report_artifact(telegram_id, "free", created_after=user.test_completed_at)
+        if artifact:
             logger.info(f"✅ Отчет уже существует для пользователя {telegram_id}, возвращаем существующий")
             # Обновляем статус на COMPLETED, если он еще не установлен
             status_info = await db_service.get_report_generation_status(telegram_id, "free")
@@ -751,21 +750,9 @@ async def generate_report_background(telegram_id: int):
                     telegram_id, 
                     "free", 
                     ReportGenerationStatus.COMPLETED,
-                    report_path=report_files[0]
+                    report_path=artifact.path
                 )
-            def extract_timestamp(filepath):
-                filename = Path(filepath).name
-                parts = filename.split('_')
-                if len(parts) >= 5:
-                    try:
-                        date_part = parts[3]
-                        time_part = parts[4].replace('.pdf', '')
-                        return f"{date_part}_{time_part}"
-                    except:
-                        pass
-                return str(int(Path(filepath).stat().st_mtime))
-            report_files.sort(key=extract_timestamp, reverse=True)
-            return report_files[0]
+            return artifact.path
         
         # Статус PROCESSING уже установлен в start_report_generation, поэтому просто продолжаем генерацию
         logger.info(f"📝 Статус PROCESSING уже установлен для пользователя {telegram_id}, продолжаем генерацию")
@@ -811,49 +798,13 @@ async def generate_report_background(telegram_id: int):
             
             return report_path
         else:
-            error_msg = result.get('error', 'Неизвестная ошибка')
-            logger.error(f"❌ Ошибка фоновой генерации отчета для пользователя {telegram_id}: {error_msg}")
-            
-            # Обновляем статус на FAILED
-            await db_service.update_report_generation_status(
-                telegram_id, 
-                "free", 
-                ReportGenerationStatus.FAILED,
-                error=error_msg
-            )
-            
-            # Отправляем уведомление об ошибке в Telegram
-            from bot.services.telegram_service import telegram_service
-            await telegram_service.send_error_notification(
-                telegram_id=telegram_id,
-                error_message=error_msg
-            )
-            
-            return None
+            raise RuntimeError(result.get('error', 'Неизвестная ошибка'))
             
     except Exception as e:
-        error_msg = str(e)
-        logger.error(f"❌ Критическая ошибка фоновой генерации отчета для пользователя {telegram_id}: {error_msg}")
-        
-        # Обновляем статус на FAILED при критической ошибке
-        try:
-            await db_service.update_report_generation_status(
-                telegram_id, 
-                "free", 
-                ReportGenerationStatus.FAILED,
-                error=error_msg
-            )
-        except Exception as update_error:
-            logger.error(f"❌ Ошибка обновления статуса на FAILED: {update_error}")
-        
-        # Отправляем уведомление об ошибке в Telegram
-        from bot.services.telegram_service import telegram_service
-        await telegram_service.send_error_notification(
-            telegram_id=telegram_id,
-            error_message=error_msg
-        )
-        
-        return None
+        logger.error(f"❌ Критическая ошибка фоновой генерации отчета для пользователя {telegram_id}: {e}")
+        # Статус остается PROCESSING: очередь повторит попытку, а после последней
+        # вызовет report_generation_failed (статус FAILED и уведомление)
+        raise
 
 # ПЛАТНАЯ ВЕРСИЯ - новые эндпоинты
 
@@ -901,6 +852,7 @@ async def stop_report_generation(telegram_id: int):
         user = await db_service.get_or_create_user(telegram_id=telegram_id)
         
         # Останавливаем генерацию премиум отчета
+        await report_queue.cancel(telegram_id, "premium")
         await db_service.update_report_generation_status(telegram_id, "premium", "PENDING")
         
         logger.info(f"🛑 Генерация премиум отчета остановлена для пользователя {telegram_id}")
@@ -1278,7 +1230,7 @@ async def payment_success_page(request: Request):
 
 
 @app.post("/api/user/{telegram_id}/generate-premium-report", summary="Запустить генерацию платного отчета")
-async def start_premium_report_generation(telegram_id: int, background_tasks: BackgroundTasks):
+async def start_premium_report_generation(telegram_id: int):
     """Запустить асинхронную генерацию платного отчета пользователя (50 вопросов)"""
     try:
         user = await db_service.get_or_create_user(telegram_id=telegram_id)
@@ -1315,14 +1267,15 @@ async def start_premium_report_generation(telegram_id: int, background_tasks: Ba
             ReportGenerationStatus.PROCESSING
         )
         
-        # Запускаем фоновую задачу
-        background_tasks.add_task(generate_premium_report_async, telegram_id)
+        # Ставим задачу в очередь (премиум обрабатывается с повышенным приоритетом)
+        job = await report_queue.enqueue(telegram_id, "premium")
         
-        logger.info(f"🚀 Запущена асинхронная генерация ПЛАТНОГО отчета для пользователя {telegram_id}")
+        logger.info(f"🚀 Генерация ПЛАТНОГО отчета поставлена в очередь для пользователя {telegram_id}, задача {job.id}")
         
         return {
             "status": "started", 
-            "message": "Генерация премиум отчета запущена. Вы получите уведомление по готовности."
+            "message": "Генерация премиум отчета запущена. Вы получите уведомление по готовности.",
+            "job_id": job.id
         }
             
     except Exception as e:
@@ -1330,12 +1283,8 @@ async def start_premium_report_generation(telegram_id: int, background_tasks: Ba
         return {"status": "error", "message": f"Ошибка при запуске генерации отчета: {str(e)}"}
 
 @app.get("/api/download/premium-report/{telegram_id}", summary="Скачать платный персональный отчет")
-async def download_premium_personal_report(telegram_id: int, download: Optional[str] = None, method: Optional[str] = None, t: Optional[str] = None):
+async def download_premium_personal_report(telegram_id: int, request: Request, download: Optional[str] = None, method: Optional[str] = None, t: Optional[str] = None):
     """Скачать готовый платный персональный отчет пользователя (50 вопросов)"""
-    from fastapi.responses import FileResponse
-    import os
-    import glob
-    
     try:
         logger.info(f"📁 Запрос скачивания ПЛАТНОГО отчета для пользователя {telegram_id}")
         logger.info(f"📊 Параметры: download={download}, method={method}, t={t}")
@@ -1343,118 +1292,26 @@ async def download_premium_personal_report(telegram_id: int, download: Optional[
         # Получаем пользователя (для проверки оплаты)
         user = await db_service.get_or_create_user(telegram_id=telegram_id)
         
-        # Ищем готовый платный отчет пользователя (если файл уже есть — разрешаем скачивание независимо от статуса is_paid)
-        reports_dir = Path("reports")
-        pattern = f"prizma_premium_report_{telegram_id}_*.pdf"
-        report_files = glob.glob(str(reports_dir / pattern))
+        # Ищем готовый платный отчет, созданный после завершения текущего теста
+        # (если файл уже есть — разрешаем скачивание независимо от статуса is_paid)
+        if not user.test_completed_at:
+            logger.warning(f"⚠️ test_completed_at не установлен для пользователя {telegram_id}, используем последний отчет")
+        artifact = await db_service.get_latest_report_artifact(telegram_id, "premium", created_after=user.test_completed_at)
         
-        if not report_files:
+        if not artifact:
             # Если файла нет, проверяем оплату
             if not user.is_paid:
                 logger.warning(f"⚠️ Пользователь {telegram_id} не оплатил премиум отчет и файл не найден")
                 raise HTTPException(status_code=403, detail="Для доступа к премиум отчету требуется оплата.")
             
-            logger.warning(f"⚠️ Платный отчет для пользователя {telegram_id} не найден, запускаем генерацию...")
-            
-            # Запускаем генерацию платного отчета и ждем завершения
-            try:
-                await generate_premium_report_background(telegram_id)
-                
-                # Повторно ищем отчет после генерации
-                report_files = glob.glob(str(reports_dir / pattern))
-                if not report_files:
-                    logger.error(f"❌ Платный отчет не создался даже после генерации для пользователя {telegram_id}")
-                    raise HTTPException(status_code=500, detail="Ошибка создания платного отчета. Попробуйте позже.")
-                
-                logger.info(f"✅ Платный отчет успешно создан для пользователя {telegram_id}")
-            except Exception as e:
-                logger.error(f"❌ Ошибка при генерации платного отчета для пользователя {telegram_id}: {e}")
-                raise HTTPException(status_code=500, detail="Ошибка создания платного отчета. Попробуйте позже.")
-        
-        # Функция для извлечения timestamp из имени файла
-        def extract_timestamp(filepath):
-            filename = Path(filepath).name
-            parts = filename.split('_')
-            if len(parts) >= 5:
-                try:
-                    date_part = parts[3]
-                    time_part = parts[4].replace('.pdf', '').replace('.txt', '')
-                    timestamp_str = f"{date_part}_{time_part}"
-                    return timestamp_str
-                except:
-                    pass
-            return str(int(Path(filepath).stat().st_mtime))
-        
-        # Сортируем по timestamp и фильтруем отчеты, созданные после завершения теста
-        report_files.sort(key=extract_timestamp, reverse=True)
-        
-        # Фильтруем отчеты: берем только те, что созданы после завершения текущего теста
-        test_completed_at = user.test_completed_at
-        valid_reports = []
-        
-        if test_completed_at:
-            test_date_str = test_completed_at.strftime("%Y%m%d_%H%M%S")
-            for report_file in report_files:
-                report_timestamp = extract_timestamp(report_file)
-                if report_timestamp >= test_date_str:
-                    valid_reports.append(report_file)
-                    logger.info(f"✅ Премиум отчет {Path(report_file).name} валиден (создан после завершения теста)")
-                else:
-                    logger.warning(f"⚠️ Премиум отчет {Path(report_file).name} устарел (создан до завершения теста), пропускаем")
-        else:
-            # Если test_completed_at не установлен, берем последний отчет
-            valid_reports = report_files[:1] if report_files else []
-            logger.warning(f"⚠️ test_completed_at не установлен для пользователя {telegram_id}, используем последний отчет")
-        
-        if not valid_reports:
-            logger.warning(f"⚠️ Нет валидных премиум отчетов для пользователя {telegram_id} после завершения теста")
-            # Если нет валидных отчетов, но есть старые - запускаем генерацию
-            if report_files:
-                logger.info(f"🔄 Запускаем генерацию нового премиум отчета...")
-                try:
-                    await generate_premium_report_background(telegram_id)
-                    # Повторно ищем отчет после генерации
-                    report_files = glob.glob(str(reports_dir / pattern))
-                    if report_files:
-                        report_files.sort(key=extract_timestamp, reverse=True)
-                        valid_reports = report_files[:1]
-                except Exception as e:
-                    logger.error(f"❌ Ошибка при генерации премиум отчета: {e}")
-                    raise HTTPException(status_code=500, detail="Ошибка создания премиум отчета. Попробуйте позже.")
+            # Генерацию выполняет очередь - запрос не ждет ИИ-анализ
+            logger.warning(f"⚠️ Валидный платный отчет для пользователя {telegram_id} не найден, ставим генерацию в очередь")
+            return await accept_report_generation(telegram_id, "premium")
         
-        latest_report = valid_reports[0] if valid_reports else None
+        logger.info(f"📄 Выбран премиум отчет: {artifact.path} (создан {artifact.created_at})")
         
-        if not latest_report:
-            raise HTTPException(status_code=404, detail="Премиум отчет не найден")
-        
-        logger.info(f"📋 Найдено платных отчетов: {len(report_files)}, валидных: {len(valid_reports)}")
-        logger.info(f"📄 Выбран валидный премиум отчет: {latest_report}")
-        
-        if not os.path.exists(latest_report):
-            logger.error(f"❌ Файл платного отчета не найден: {latest_report}")
-            raise HTTPException(status_code=500, detail="Файл платного отчета поврежден")
-        
-        logger.info(f"📄 Отдаем готовый платный отчет: {latest_report}, размер: {os.path.getsize(latest_report)} байт")
-        
-        # Определяем заголовки для скачивания
-        headers = {
-            "Content-Disposition": f'attachment; filename="prizma-premium-report-{telegram_id}.pdf"',
-            "Content-Type": "application/pdf",
-            "X-Content-Type-Options": "nosniff",
-            "Cache-Control": "no-cache, no-store, must-revalidate",
-            "Pragma": "no-cache",
-            "Expires": "0"
-        }
-        logger.info("📱 Принудительное скачивание платного отчета (всегда attachment для iPhone Safari)")
-        
-        
-        # Возвращаем файл для скачивания
-        return FileResponse(
-            path=latest_report,
-            media_type='application/pdf',
-            filename=f"prizma-premium-report-{telegram_id}.pdf",
-            headers=headers
-        )
+        # Всегда attachment (для iPhone Safari)
+        return report_file_response(request, artifact, telegram_id, disposition="attachment")
         
     except HTTPException:
         raise
@@ -1462,37 +1319,6 @@ async def download_premium_personal_report(telegram_id: int, download: Optional[
         logger.error(f"❌ Error downloading premium report: {e}")
         raise HTTPException(status_code=500, detail="Ошибка при скачивании платного отчета")
 
-# Функция фоновой генерации платного отчета (синхронная версия для обратной совместимости)
-async def generate_premium_report_background(telegram_id: int):
-    """Генерация платного отчета в фоновом режиме после завершения теста (только premium вопросы)"""
-    try:
-        logger.info(f"🔄 Начинаем фоновую генерацию ПЛАТНОГО отчета для пользователя {telegram_id}")
-        
-        # Получаем пользователя
-        user = await db_service.get_or_create_user(telegram_id=telegram_id)
-        
-        # Получаем только платные вопросы и ответы на них
-        questions = await db_service.get_questions_by_version("premium")
-        answers = await db_service.get_user_answers_by_test_version(telegram_id, "premium")
-        
-        # Генерируем платный отчет через AI сервис
-        from bot.services.perplexity import AIAnalysisService
-        ai_service = AIAnalysisService()
-        
-        result = await ai_service.generate_premium_report(user, questions, answers)
-        
-        if result.get("success"):
-            report_path = result['report_file']
-            logger.info(f"✅ Фоновая генерация ПЛАТНОГО отчета завершена успешно для пользователя {telegram_id}: {report_path}")
-            return report_path
-        else:
-            logger.error(f"❌ Ошибка фоновой генерации ПЛАТНОГО отчета для пользователя {telegram_id}: {result.get('error')}")
-            return None
-            
-    except Exception as e:
-        logger.error(f"❌ Критическая ошибка фоновой генерации ПЛАТНОГО отчета для пользователя {telegram_id}: {e}")
-        return None
-
 # Асинхронная функция генерации отчета для Background Tasks
 async def generate_premium_report_async(telegram_id: int):
     """Асинхронная генерация премиум отчета в фоновом режиме (только premium вопросы)"""
@@ -1540,165 +1366,154 @@ async def generate_premium_report_async(telegram_id: int):
                     logger.error(f"⚠️ Не удалось сбросить состояние пользователя {telegram_id} после отправки отчета: {e}")
             
         else:
-            error_msg = result.get('error', 'Неизвестная ошибка')
-            
-            # Обновляем статус в БД
-            await db_service.update_report_generation_status(
-                telegram_id, 
-                "premium", 
-                ReportGenerationStatus.FAILED, 
-                error=error_msg
-            )
-            
-            # Отправляем уведомление об ошибке в Telegram
-            from bot.services.telegram_service import telegram_service
-            await telegram_service.send_error_notification(
-                telegram_id=telegram_id,
-                error_message=error_msg
-            )
-            
-            logger.error(f"❌ Ошибка асинхронной генерации ПЛАТНОГО отчета для пользователя {telegram_id}: {error_msg}")
+            raise RuntimeError(result.get('error', 'Неизвестная ошибка'))
             
     except Exception as e:
-        # Обновляем статус в БД
-        await db_service.update_report_generation_status(
-            telegram_id, 
-            "premium", 
-            ReportGenerationStatus.FAILED, 
-            error=str(e)
-        )
-        
-        # Отправляем уведомление об ошибке в Telegram
-        from bot.services.telegram_service import telegram_service
-        await telegram_service.send_error_notification(
-            telegram_id=telegram_id,
-            error_message=str(e)
-        )
-        
         logger.error(f"❌ Критическая ошибка асинхронной генерации ПЛАТНОГО отчета для пользователя {telegram_id}: {e}")
+        # Статус остается PROCESSING: очередь повторит попытку, а после последней
+        # вызовет report_generation_failed (статус FAILED и уведомление)
+        raise
 
-@app.get("/api/user/{telegram_id}/reports-status", summary="Проверить статус всех отчетов пользователя")
-async def check_user_reports_status(telegram_id: int):
-    """Проверить статус всех отчетов пользователя и определить какой доступен для скачивания"""
-    try:
-        logger.info(f"🔍 Проверка статуса отчетов для пользователя {telegram_id}")
-        
-        # Получаем пользователя ОДИН РАЗ
-        user = await db_service.get_or_create_user(telegram_id=telegram_id)
-        
-        if not user.test_completed:
-            return {
-                "status": "test_not_completed", 
-                "message": "Тест не завершен",
-                "available_report": None
-            }
-        
-        # Проверяем статус бесплатного отчета (передаем уже полученного пользователя)
-        free_report_status = await check_report_status_with_user(telegram_id, user)
-        
-        # Проверяем статус премиум отчета (передаем уже полученного пользователя)
-        premium_report_status = await check_premium_report_status_with_user(telegram_id, user)
-        
-        logger.info(f"📊 Статус бесплатного отчета: {free_report_status.get('status')}")
-        logger.info(f"📊 Статус премиум отчета: {premium_report_status.get('status')}")
-        logger.info(f"💰 Пользователь оплатил: {user.is_paid}")
-        
-        # Определяем какой отчет доступен для скачивания
-        available_report = None
-        
-        if user.is_paid and premium_report_status.get('status') == 'ready' and premium_report_status.get('report_path') and str(premium_report_status.get('report_path')).lower().endswith('.pdf'):
-            # Если пользователь оплатил и премиум отчет готов
-            available_report = {
-                "type": "premium",
-                "status": "ready",
-                "message": "Премиум отчет готов к скачиванию",
-                "download_url": f"/api/download/premium-report/{telegram_id}"
-            }
-        elif free_report_status.get('status') == 'ready':
-            # Если бесплатный отчет готов (всегда доступен)
-            available_report = {
-                "type": "free",
-                "status": "ready", 
-                "message": "Бесплатный отчет готов к скачиванию",
-                "download_url": f"/api/download/report/{telegram_id}"
-            }
-        elif free_report_status.get('status') == 'premium_paid':
-            # Если пользователь оплатил премиум, но премиум отчет еще не готов
-            if user.is_paid:
-                available_report = {
-                    "type": "premium",
-                    "status": "not_started",
-                    "message": "Премиум отчет еще не сгенерирован"
-                }
-            else:
-                available_report = {
-                    "type": "free",
-                    "status": "premium_paid",
-                    "message": "Для оплативших премиум пользователей используется премиум отчет"
-                }
-        elif premium_report_status.get('status') in ['processing', 'ready']:
-            # Если премиум отчет в процессе генерации
-            available_report = {
-                "type": "premium",
-                "status": "processing",
-                "message": "Премиум отчет генерируется..."
-            }
-        elif premium_report_status.get('status') == 'payment_required':
-            # Если требуется оплата для премиум отчета
+async def report_generation_failed(telegram_id: int, report_type: str, error: str):
+    """Попытки генерации отчета исчерпаны: статус FAILED и уведомление в Telegram"""
+    await db_service.update_report_generation_status(
+        telegram_id, 
+        report_type, 
+        ReportGenerationStatus.FAILED, 
+        error=error
+    )
+    
+    from bot.services.telegram_service import telegram_service
+    await telegram_service.send_error_notification(
+        telegram_id=telegram_id,
+        error_message=error
+    )
+
+async def build_reports_status(telegram_id: int, user: User) -> dict:
+    """Статус всех отчетов уже загруженного пользователя и доступный для скачивания отчет"""
+    if not user.test_completed:
+        return {
+            "status": "test_not_completed", 
+            "message": "Тест не завершен",
+            "available_report": None
+        }
+    
+    # Проверяем статус бесплатного отчета (передаем уже полученного пользователя)
+    free_report_status = await check_report_status_with_user(telegram_id, user)
+    
+    # Проверяем статус премиум отчета (передаем уже полученного пользователя)
+    premium_report_status = await check_premium_report_status_with_user(telegram_id, user)
+    
+    logger.info(f"📊 Статус бесплатного отчета: {free_report_status.get('status')}")
+    logger.info(f"📊 Статус премиум отчета: {premium_report_status.get('status')}")
+    logger.info(f"💰 Пользователь оплатил: {user.is_paid}")
+    
+    # Определяем какой отчет доступен для скачивания
+    available_report = None
+    
+    if user.is_paid and premium_report_status.get('status') == 'ready' and premium_report_status.get('report_path') and str(premium_report_status.get('report_path')).lower().endswith('.pdf'):
+        # Если пользователь оплатил и премиум отчет готов
+        available_report = {
+            "type": "premium",
+            "status": "ready",
+            "message": "Премиум отчет готов к скачиванию",
+            "download_url": f"/api/download/premium-report/{telegram_id}"
+        }
+    elif free_report_status.get('status') == 'ready':
+        # Если бесплатный отчет готов (всегда доступен)
+        available_report = {
+            "type": "free",
+            "status": "ready", 
+            "message": "Бесплатный отчет готов к скачиванию",
+            "download_url": f"/api/download/report/{telegram_id}"
+        }
+    elif free_report_status.get('status') == 'premium_paid':
+        # Если пользователь оплатил премиум, но премиум отчет еще не готов
+        if user.is_paid:
             available_report = {
                 "type": "premium",
-                "status": "payment_required",
-                "message": "Для доступа к премиум отчету требуется оплата"
+                "status": "not_started",
+                "message": "Премиум отчет еще не сгенерирован"
             }
-        elif user.is_paid and premium_report_status.get('status') == 'failed':
-            # Если премиум отчет не удалось сгенерировать, но есть бесплатный
-            if free_report_status.get('status') == 'ready':
-                available_report = {
-                    "type": "free",
-                    "status": "ready",
-                    "message": "Премиум отчет недоступен, но бесплатный отчет готов",
-                    "download_url": f"/api/download/report/{telegram_id}",
-                    "fallback": True
-                }
-            else:
-                available_report = {
-                    "type": "premium",
-                    "status": "failed",
-                    "message": "Ошибка генерации премиум отчета",
-                    "error": premium_report_status.get('error', 'Неизвестная ошибка')
-                }
-        elif free_report_status.get('status') == 'processing':
-            # Если бесплатный отчет в процессе генерации
+        else:
             available_report = {
                 "type": "free",
-                "status": "processing",
-                "message": "Бесплатный отчет генерируется..."
+                "status": "premium_paid",
+                "message": "Для оплативших премиум пользователей используется премиум отчет"
             }
-        elif free_report_status.get('status') == 'failed':
-            # Если бесплатный отчет не удалось сгенерировать
+    elif premium_report_status.get('status') in ['processing', 'ready']:
+        # Если премиум отчет в процессе генерации
+        available_report = {
+            "type": "premium",
+            "status": "processing",
+            "message": "Премиум отчет генерируется..."
+        }
+    elif premium_report_status.get('status') == 'payment_required':
+        # Если требуется оплата для премиум отчета
+        available_report = {
+            "type": "premium",
+            "status": "payment_required",
+            "message": "Для доступа к премиум отчету требуется оплата"
+        }
+    elif user.is_paid and premium_report_status.get('status') == 'failed':
+        # Если премиум отчет не удалось сгенерировать, но есть бесплатный
+        if free_report_status.get('status') == 'ready':
             available_report = {
                 "type": "free",
-                "status": "failed",
-                "message": "Ошибка генерации бесплатного отчета",
-                "error": free_report_status.get('error', 'Неизвестная ошибка')
+                "status": "ready",
+                "message": "Премиум отчет недоступен, но бесплатный отчет готов",
+                "download_url": f"/api/download/report/{telegram_id}",
+                "fallback": True
             }
         else:
-            # Если нет доступных отчетов
             available_report = {
-                "type": "none",
-                "status": "not_available",
-                "message": "Нет доступных отчетов"
+                "type": "premium",
+                "status": "failed",
+                "message": "Ошибка генерации премиум отчета",
+                "error": premium_report_status.get('error', 'Неизвестная ошибка')
             }
-        
-        return {
-            "status": "success",
-            "user_id": telegram_id,
-            "test_completed": user.test_completed,
-            "is_paid": user.is_paid,
-            "free_report_status": free_report_status,
-            "premium_report_status": premium_report_status,
-            "available_report": available_report
+    elif free_report_status.get('status') == 'processing':
+        # Если бесплатный отчет в процессе генерации
+        available_report = {
+            "type": "free",
+            "status": "processing",
+            "message": "Бесплатный отчет генерируется..."
+        }
+    elif free_report_status.get('status') == 'failed':
+        # Если бесплатный отчет не удалось сгенерировать
+        available_report = {
+            "type": "free",
+            "status": "failed",
+            "message": "Ошибка генерации бесплатного отчета",
+            "error": free_report_status.get('error', 'Неизвестная ошибка')
+        }
+    else:
+        # Если нет доступных отчетов
+        available_report = {
+            "type": "none",
+            "status": "not_available",
+            "message": "Нет доступных отчетов"
         }
+    
+    return {
+        "status": "success",
+        "user_id": telegram_id,
+        "test_completed": user.test_completed,
+        "is_paid": user.is_paid,
+        "free_report_status": free_report_status,
+        "premium_report_status": premium_report_status,
+        "available_report": available_report
+    }
+
+@app.get("/api/user/{telegram_id}/reports-status", summary="Проверить статус всех отчетов пользователя")
+async def check_user_reports_status(telegram_id: int):
+    """Проверить статус всех отчетов пользователя и определить какой доступен для скачивания"""
+    try:
+        logger.info(f"🔍 Проверка статуса отчетов для пользователя {telegram_id}")
+        
+        # Получаем пользователя ОДИН РАЗ
+        user = await db_service.get_or_create_user(telegram_id=telegram_id)
+        return await build_reports_status(telegram_id, user)
         
     except Exception as e:
         logger.error(f"❌ Ошибка при проверке статуса отчетов для пользователя {telegram_id}: {e}")
@@ -1708,6 +1523,75 @@ async def check_user_reports_status(telegram_id: int):
             "available_report": None
         }
 
+def _sse_event(event: str, data: dict) -> str:
+    """Кадр Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+@app.get("/api/user/{telegram_id}/reports-events", summary="Поток событий генерации отчетов (SSE)")
+async def user_reports_events(telegram_id: int, request: Request):
+    """Статус отчетов в виде Server-Sent Events вместо опроса /reports-status.
+
+    Сразу отправляет событие status с тем же содержимым, что /reports-status,
+    затем - новое status при каждой смене статуса генерации и progress с этапами
+    ИИ-анализа и рендера PDF. Раз в REPORT_EVENTS_HEARTBEAT_SECONDS отправляется
+    комментарий keep-alive, а статус сверяется заново только раз в
+    REPORT_EVENTS_RESYNC_SECONDS (смены без события: сброс зависших отчетов,
+    другой процесс). Соединение закрывается через REPORT_EVENTS_MAX_SECONDS,
+    EventSource переподключается сам.
+    """
+    from bot.services.report_events import report_events
+
+    async def stream():
+        # Подписываемся до чтения статуса, чтобы не пропустить смену между ними
+        queue = report_events.subscribe(telegram_id)
+        deadline = time.monotonic() + REPORT_EVENTS_MAX_SECONDS
+        next_resync = time.monotonic() + REPORT_EVENTS_RESYNC_SECONDS
+        last_status = None
+
+        async def status_frame(only_changed: bool = False) -> Optional[str]:
+            nonlocal last_status, next_resync
+            next_resync = time.monotonic() + REPORT_EVENTS_RESYNC_SECONDS
+            frame = _sse_event("status", await check_user_reports_status(telegram_id))
+            if only_changed and frame == last_status:
+                return None
+            last_status = frame
+            return frame
+
+        try:
+            # Пауза перед переподключением EventSource - как период опроса на странице
+            yield "retry: 5000\n\n"
+            yield await status_frame()
+            progress = report_events.last_progress(telegram_id)
+            if progress:
+                yield _sse_event("progress", progress)
+
+            while time.monotonic() < deadline:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=REPORT_EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    # Статус пересобирается по событиям: heartbeat не ходит в БД.
+                    # Сброс зависших отчетов не публикует событий - редкая сверка
+                    if time.monotonic() >= next_resync:
+                        yield await status_frame(only_changed=True) or ": ping\n\n"
+                    else:
+                        yield ": ping\n\n"
+                    continue
+
+                if event["type"] == "status":
+                    yield await status_frame()
+                else:
+                    yield _sse_event("progress", event)
+        finally:
+            report_events.unsubscribe(telegram_id, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # Вспомогательные функции для работы с уже полученным пользователем
 async def check_report_status_with_user(telegram_id: int, user: User):
     """Проверить готовность отчета пользователя (с уже полученным пользователем)"""
@@ -1720,38 +1604,12 @@ async def check_report_status_with_user(telegram_id: int, user: User):
             logger.info(f"💰 Пользователь {telegram_id} оплатил премиум отчет. Не возвращаем статус бесплатного отчета.")
             return {"status": "premium_paid", "message": "Для оплативших премиум пользователей используется премиум отчет."}
         
-        # Ищем последний отчет пользователя
-        reports_dir = Path("reports")
-        pattern = f"prizma_report_{telegram_id}_*.pdf"
-        
-        import glob
-        report_files = glob.glob(str(reports_dir / pattern))
-        
-        if report_files:
-            # Сортируем по timestamp в имени файла (более надежно чем st_mtime)
-            # Имя файла: prizma_report_{telegram_id}_{timestamp}.pdf
-            def extract_timestamp(filepath):
-                filename = Path(filepath).name
-                # Извлекаем timestamp из имени файла: prizma_report_123456789_20250627_082506.pdf
-                parts = filename.split('_')
-                if len(parts) >= 5:
-                    try:
-                        # Берем дату и время: parts[3] = '20250627', parts[4] = '082506.pdf'
-                        date_part = parts[3]
-                        time_part = parts[4].replace('.pdf', '').replace('.txt', '')
-                        timestamp_str = f"{date_part}_{time_part}"
-                        return timestamp_str
-                    except:
-                        return "00000000_000000"
-                return "00000000_000000"
-                
-            # Находим последний файл по timestamp
-            latest_report = max(report_files, key=extract_timestamp)
-            # Дополнительная проверка существования файла
-            if os.path.exists(latest_report):
-                return {"status": "ready", "message": "Отчет готов к скачиванию", "report_path": latest_report}
-            else:
-                return {"status": "not_ready", "message": "Отчет еще не готов"}
+        # Ищем последний отчет пользователя в реестре
+        artifact = await db_service.get_latest_report_artifact(telegram_id, "free")
+        
+        # Дополнительная проверка существования файла
+        if artifact and os.path.exists(artifact.path):
+            return {"status": "ready", "message": "Отчет готов к скачиванию", "report_path": artifact.path}
         else:
             return {"status": "not_ready", "message": "Отчет еще не готов"}
             
@@ -1808,6 +1666,50 @@ async def check_premium_report_status_with_user(telegram_id: int, user: User):
         logger.error(f"Error checking premium report status: {e}")
         return {"status": "error", "message": "Ошибка при проверке статуса платного отчета"}
 
+def build_special_offer_timer(user: User) -> Optional[dict]:
+    """Таймер и цена спецпредложения (None, если таймер еще не запущен)"""
+    if not user.special_offer_started_at:
+        return None
+    
+    # Вычисляем оставшееся время (24 часа = 86400 секунд)
+    offer_duration = 86400  # 24 часа в секундах
+    elapsed_time = (datetime.utcnow() - user.special_offer_started_at).total_seconds()
+    remaining_time = max(0, offer_duration - elapsed_time)
+    
+    # Форматируем время в формат HH:MM:SS
+    hours = int(remaining_time // 3600)
+    minutes = int((remaining_time % 3600) // 60)
+    seconds = int(remaining_time % 60)
+    
+    time_string = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+    
+    # Определяем цену в зависимости от таймера
+    if remaining_time > 0:
+        # Спецпредложение активно - скидочная цена
+        current_price = int(PREMIUM_PRICE_DISCOUNT)
+        original_price = int(PREMIUM_PRICE_ORIGINAL)
+        is_offer_active = True
+    else:
+        # Спецпредложение истекло - полная цена
+        current_price = int(PREMIUM_PRICE_ORIGINAL)
+        original_price = int(PREMIUM_PRICE_ORIGINAL)
+        is_offer_active = False
+    
+    return {
+        "status": "success",
+        "timer": {
+            "started_at": user.special_offer_started_at.isoformat(),
+            "remaining_seconds": int(remaining_time),
+            "time_string": time_string,
+            "is_expired": remaining_time <= 0
+        },
+        "pricing": {
+            "current_price": current_price,
+            "original_price": original_price,
+            "is_offer_active": is_offer_active
+        }
+    }
+
 @app.get("/api/user/{telegram_id}/special-offer-timer", summary="Получить таймер спецпредложения")
 async def get_special_offer_timer(telegram_id: int):
     """Получить информацию о таймере спецпредложения для пользователя"""
@@ -1823,50 +1725,43 @@ async def get_special_offer_timer(telegram_id: int):
             user.special_offer_started_at = datetime.utcnow()
             await db_service.update_user(telegram_id, {"special_offer_started_at": user.special_offer_started_at})
 
-        # Вычисляем оставшееся время (24 часа = 86400 секунд)
-        offer_duration = 86400  # 24 часа в секундах
-        elapsed_time = (datetime.utcnow() - user.special_offer_started_at).total_seconds()
-        remaining_time = max(0, offer_duration - elapsed_time)
-        
-        # Форматируем время в формат HH:MM:SS
-        hours = int(remaining_time // 3600)
-        minutes = int((remaining_time % 3600) // 60)
-        seconds = int(remaining_time % 60)
-        
-        time_string = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-        
-        # Определяем цену в зависимости от таймера
-        if remaining_time > 0:
-            # Спецпредложение активно - скидочная цена
-            current_price = int(PREMIUM_PRICE_DISCOUNT)
-            original_price = int(PREMIUM_PRICE_ORIGINAL)
-            is_offer_active = True
-        else:
-            # Спецпредложение истекло - полная цена
-            current_price = int(PREMIUM_PRICE_ORIGINAL)
-            original_price = int(PREMIUM_PRICE_ORIGINAL)
-            is_offer_active = False
+        return build_special_offer_timer(user)
         
+    except Exception as e:
+        logger.error(f"Error getting special offer timer: {e}")
+        raise HTTPException(status_code=500, detail="Failed to get special offer timer")
+
+@app.get("/api/user/{telegram_id}/bootstrap", summary="Начальные данные мини-приложения")
+async def get_user_bootstrap(telegram_id: int):
+    """Профиль, прогресс, текущий вопрос, статус отчетов и таймер спецпредложения одним запросом.
 
+    Пользователь загружается один раз, количество ответов берется из счетчиков
+    пользователя. В отличие от отдельных эндпоинтов запрос не начинает тест и не
+    запускает таймер: current_question и special_offer_timer равны null, пока
+    тест или таймер не начаты.
+    """
+    try:
+        user = await db_service.get_or_create_user(telegram_id=telegram_id)
+        
+        current_question = None
+        if user.current_question_id and not user.test_completed:
+            question = await db_service.get_question(user.current_question_id)
+            if question:
+                current_question = (await build_current_question_response(user, question)).model_dump()
         
         return {
             "status": "success",
-            "timer": {
-                "started_at": user.special_offer_started_at.isoformat(),
-                "remaining_seconds": int(remaining_time),
-                "time_string": time_string,
-                "is_expired": remaining_time <= 0
-            },
-            "pricing": {
-                "current_price": current_price,
-                "original_price": original_price,
-                "is_offer_active": is_offer_active
-            }
+            "profile": build_user_profile_response(user).model_dump(),
+            "progress": await build_progress_summary(user),
+            "current_question": current_question,
+            "special_offer_timer": build_special_offer_timer(user),
+            # Последним: проверка премиум отчета может сбросить зависшую генерацию
+            "reports_status": await build_reports_status(telegram_id, user)
         }
         
     except Exception as e:
-        logger.error(f"Error getting special offer timer: {e}")
-        raise HTTPException(status_code=500, detail="Failed to get special offer timer")
+        logger.error(f"Error getting bootstrap data: {e}")
+        raise HTTPException(status_code=500, detail="Failed to get bootstrap data")
 
 @app.post("/api/user/{telegram_id}/reset-special-offer-timer", summary="Сбросить таймер спецпредложения")
 async def reset_special_offer_timer(telegram_id: int):
@@ -2095,6 +1990,29 @@ async def startup_event():
     logger.info("🚀 Запуск фоновой задачи проверки таймеров...")
     asyncio.create_task(background_timer_checker())
     
+    # Загружаем каталог вопросов в память
+    from bot.services.question_catalog import question_catalog
+    await question_catalog.load()
+    
+    # Удаляем временные файлы рендеров, оставшиеся после прошлых запусков
+    from bot.services.pdf_service import ReportGenerator
+    await asyncio.to_thread(ReportGenerator().cleanup_scratch, PDF_RENDER_TIMEOUT_SECONDS * 2)
+    
+    # Поднимаем процессы рендера PDF и прогреваем в них кэш шаблонов
+    from bot.services.pdf_renderer import pdf_renderer
+    await pdf_renderer.warm_up()
+    
+    # Общий пул HTTP соединений к Perplexity API
+    from bot.services.perplexity import perplexity_http
+    await perplexity_http.start()
+    
+    # Запускаем пул воркеров очереди генерации отчетов
+    report_queue.register_handler("free", generate_report_background)
+    report_queue.register_handler("premium", generate_premium_report_async)
+    report_queue.register_failure_handler("free", report_generation_failed)
+    report_queue.register_failure_handler("premium", report_generation_failed)
+    await report_queue.start()
+    
     # Запускаем aiogram polling для получения обновлений
     from bot.bot_setup import bot, dp, start_polling
     if bot and dp:
@@ -2109,6 +2027,15 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Закрытие соединений при завершении приложения"""
+    # Незавершенные задачи возвращаются в очередь и будут подхвачены после рестарта
+    await report_queue.stop()
+    
+    from bot.services.pdf_renderer import pdf_renderer
+    pdf_renderer.shutdown()
+    
+    from bot.services.perplexity import perplexity_http
+    await perplexity_http.close()
+    
     from bot.bot_setup import stop_polling, close_bot
     await stop_polling()
     await close_bot()
@@ -167,9 +167,50 @@ window.LoadingPage = {
     },
 
     /**
-     * Запуск периодической проверки статуса отчета
+     * Запуск отслеживания статуса отчета.
+     * Статус приходит по Server-Sent Events; если EventSource недоступен
+     * или соединение не устанавливается - периодический опрос.
      */
     startStatusPolling() {
+        // Останавливаем предыдущее отслеживание, если оно было
+        this.stopStatusPolling();
+        
+        if (!window.EventSource) {
+            this.startIntervalPolling();
+            return;
+        }
+        
+        const telegramId = window.TelegramWebApp ? window.TelegramWebApp.getUserId() : 123456789;
+        const source = new EventSource(ApiClient.getReportsEventsUrl(telegramId));
+        let connected = false;
+        this.statusEventSource = source;
+        
+        source.addEventListener('status', (event) => {
+            connected = true;
+            this.handleReportStatus(JSON.parse(event.data), telegramId);
+        });
+        source.addEventListener('progress', (event) => {
+            connected = true;
+            console.log('📈 Прогресс генерации отчета:', JSON.parse(event.data));
+        });
+        source.onerror = () => {
+            // После обрыва установленного соединения EventSource переподключается сам
+            if (connected && source.readyState !== EventSource.CLOSED) {
+                return;
+            }
+            console.log('⚠️ Поток событий недоступен, переходим на периодическую проверку');
+            source.close();
+            this.statusEventSource = null;
+            this.startIntervalPolling();
+        };
+        
+        console.log('📡 Подписка на события статуса отчета');
+    },
+
+    /**
+     * Запуск периодической проверки статуса отчета
+     */
+    startIntervalPolling() {
         // Останавливаем предыдущую проверку, если она была
         if (this.statusCheckInterval) {
             clearInterval(this.statusCheckInterval);
@@ -190,6 +231,11 @@ window.LoadingPage = {
      * Остановка периодической проверки статуса
      */
     stopStatusPolling() {
+        if (this.statusEventSource) {
+            this.statusEventSource.close();
+            this.statusEventSource = null;
+            console.log('⏹️ Закрыт поток событий статуса отчета');
+        }
         if (this.statusCheckInterval) {
             clearInterval(this.statusCheckInterval);
             this.statusCheckInterval = null;
@@ -205,6 +251,17 @@ window.LoadingPage = {
             const telegramId = window.TelegramWebApp ? window.TelegramWebApp.getUserId() : 123456789;
             
             const status = await ApiClient.getReportsStatus(telegramId);
+            this.handleReportStatus(status, telegramId);
+        } catch (error) {
+            console.error('❌ Ошибка при проверке статуса отчета:', error);
+        }
+    },
+
+    /**
+     * Обработка статуса отчета (из опроса или из потока событий)
+     */
+    handleReportStatus(status, telegramId) {
+        try {
             console.log('📊 Статус отчета:', status);
             console.log('📊 available_report:', status.available_report);
             console.log('📊 free_report:', status.free_report);
@@ -331,7 +388,7 @@ window.LoadingPage = {
             });
             
         } catch (error) {
-            console.error('❌ Ошибка при проверке статуса отчета:', error);
+            console.error('❌ Ошибка при обработке статуса отчета:', error);
             // Продолжаем проверку - polling уже работает, просто пропускаем эту итерацию
         }
     }
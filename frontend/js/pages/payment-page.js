@@ -37,29 +37,30 @@ window.PaymentPage = {
     },
 
     /**
-     * Запуск мониторинга статуса платежа
+     * Запуск мониторинга статуса платежа.
+     * Каждый запрос ждет на сервере смены статуса до 30 секунд (long-poll)
+     * и возвращается сразу после подтверждения оплаты.
      */
-    startPaymentStatusMonitoring() {
+    async startPaymentStatusMonitoring() {
         console.log('🔍 Запуск мониторинга статуса платежа');
         
-        // Проверяем статус каждые 3 секунды
-        const checkInterval = setInterval(async () => {
+        const telegramId = window.TelegramWebApp ? window.TelegramWebApp.getUserId() : 123456789;
+        // Останавливаем мониторинг через 5 минут
+        const deadline = Date.now() + 300000;
+        
+        while (Date.now() < deadline) {
             try {
-                const telegramId = window.TelegramWebApp ? window.TelegramWebApp.getUserId() : 123456789;
-                
-                const status = await ApiClient.getUserProfile(telegramId);
+                const status = await ApiClient.getPaymentStatus(telegramId, 30);
                 console.log('💳 Статус платежа:', status);
                 
                 if (status.payment_status === 'completed') {
                     console.log('✅ Платеж завершен, перенаправляем на complete-payment');
-                    clearInterval(checkInterval);
                     window.location.href = 'complete-payment.html';
                     return;
                 }
                 
                 if (status.payment_status === 'failed') {
                     console.log('❌ Платеж не удался, перенаправляем на uncomplete-payment');
-                    clearInterval(checkInterval);
                     window.location.href = 'uncomplete-payment.html';
                     return;
                 }
@@ -69,13 +70,11 @@ window.PaymentPage = {
                 
             } catch (error) {
                 console.error('❌ Ошибка при проверке статуса платежа:', error);
+                // Пауза перед повтором, чтобы не повторять запрос без остановки
+                await new Promise(resolve => setTimeout(resolve, 3000));
             }
-        }, 3000);
+        }
         
-        // Останавливаем мониторинг через 5 минут
-        setTimeout(() => {
-            clearInterval(checkInterval);
-            console.log('⏰ Таймаут мониторинга платежа');
-        }, 300000); // 5 минут
+        console.log('⏰ Таймаут мониторинга платежа');
     }
 }; 
\ No newline at end of file
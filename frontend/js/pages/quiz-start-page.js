@@ -10,6 +10,9 @@ const QuizStartPage = {
     async init() {
         console.log('🚀 Инициализация Quiz Start Page');
         
+        // Все данные стартовой страницы одним запросом
+        this.bootstrap = await this.loadBootstrap();
+        
         // Проверяем статус пользователя и перенаправляем при необходимости
         const shouldRedirect = await this.checkUserStatus();
         if (shouldRedirect) {
@@ -26,6 +29,21 @@ const QuizStartPage = {
         }
     },
 
+    /**
+     * Загрузить начальные данные (null - используем отдельные запросы)
+     */
+    async loadBootstrap() {
+        const telegramId = this.getTelegramUserId();
+        if (!telegramId) return null;
+        
+        try {
+            return await ApiClient.getBootstrap(telegramId);
+        } catch (error) {
+            console.log('⚠️ Начальные данные недоступны, используем отдельные запросы');
+            return null;
+        }
+    },
+
     /**
      * Инициализация кастомного селекта
      */
@@ -117,7 +135,7 @@ const QuizStartPage = {
             const telegramId = window.TelegramWebApp?.getUserId();
             if (!telegramId) return;
             
-            const profile = await ApiClient.getUserProfile(telegramId);
+            const profile = this.bootstrap?.profile ?? await ApiClient.getUserProfile(telegramId);
             
             if (profile && profile.user) {
                 // Заполняем форму существующими данными
@@ -242,7 +260,8 @@ const QuizStartPage = {
             }
 
             // Получаем информацию о таймере с сервера
-            const timerData = await ApiClient.getSpecialOfferTimer(telegramId);
+            // (при первом визите таймера в начальных данных нет - запрос его запускает)
+            const timerData = this.bootstrap?.special_offer_timer ?? await ApiClient.getSpecialOfferTimer(telegramId);
             
             if (timerData.status === 'success' && timerData.timer) {
                 this.updateTimerDisplay(timerData.timer, timerData.pricing);
@@ -493,12 +512,12 @@ const QuizStartPage = {
             console.log('🔍 Проверяем статус пользователя:', telegramId);
             
             // Сначала проверяем статус отчетов
-            const reportsStatus = await ApiClient.getReportsStatus(telegramId);
+            const reportsStatus = this.bootstrap?.reports_status ?? await ApiClient.getReportsStatus(telegramId);
             console.log('📊 Статус отчетов:', reportsStatus);
             
             // Если тест не завершен, проверяем прогресс
             if (reportsStatus.status === 'test_not_completed') {
-                const progress = await ApiClient.getUserProgress(telegramId);
+                const progress = this.bootstrap?.progress ?? await ApiClient.getUserProgress(telegramId);
                 console.log('👤 Прогресс пользователя:', progress);
 
                 const answered = progress?.progress?.answered ?? 0;
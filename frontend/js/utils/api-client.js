@@ -24,6 +24,25 @@ class ApiClient {
         }
     }
 
+    /**
+     * Получить начальные данные мини-приложения одним запросом:
+     * профиль, прогресс, текущий вопрос, статус отчетов и таймер спецпредложения
+     * @param {number} userId - ID пользователя
+     * @returns {Promise<Object>} Начальные данные
+     */
+    static async getBootstrap(userId) {
+        try {
+            const response = await fetch(`${this.baseUrl}/user/${userId}/bootstrap`);
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            return await response.json();
+        } catch (error) {
+            console.error('❌ Ошибка получения начальных данных:', error);
+            throw error;
+        }
+    }
+
     /**
      * Получить профиль пользователя
      * @param {number} userId - ID пользователя
@@ -52,6 +71,25 @@ class ApiClient {
         }
     }
 
+    /**
+     * Получить статус оплаты (long-poll)
+     * @param {number} userId - ID пользователя
+     * @param {number} wait - Сколько секунд сервер ждет смены статуса
+     * @returns {Promise<Object>} Статус оплаты
+     */
+    static async getPaymentStatus(userId, wait = 0) {
+        try {
+            const response = await fetch(`${this.baseUrl}/user/${userId}/payment-status?wait=${wait}`);
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            return await response.json();
+        } catch (error) {
+            console.error('❌ Ошибка получения статуса оплаты:', error);
+            throw error;
+        }
+    }
+
     /**
      * Сохранить профиль пользователя
      * @param {number} userId - ID пользователя
@@ -179,6 +217,15 @@ class ApiClient {
         }
     }
 
+    /**
+     * URL потока событий генерации отчетов (Server-Sent Events)
+     * @param {number} userId - ID пользователя
+     * @returns {string} URL для EventSource
+     */
+    static getReportsEventsUrl(userId) {
+        return `${this.baseUrl}/user/${userId}/reports-events`;
+    }
+
     /**
      * Получить статус отчетов
      * @param {number} userId - ID пользователя
@@ -235,10 +282,9 @@ class ApiClient {
             
             console.log(`📥 Скачивание отчета: ${endpoint}`);
             
-            // Для премиум отчетов всегда используем принудительное скачивание
-            const downloadUrl = reportType === 'premium' 
-                ? `${endpoint}?download=1&source=telegram&t=${Date.now()}`
-                : `${endpoint}?download=1&source=telegram&t=${Date.now()}`;
+            // Принудительное скачивание. Адрес без метки времени: сервер отдает ETag,
+            // и повторное открытие неизменившегося отчета получает 304 без загрузки файла
+            const downloadUrl = `${endpoint}?download=1&source=telegram`;
             
             console.log(`📥 URL для скачивания: ${downloadUrl}`);
             
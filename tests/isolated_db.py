@@ -0,0 +1,43 @@
+"""
+Временная БД для тестов
+
+Сервисы импортируют engine и async_session по имени при загрузке модуля,
+поэтому переменной DATABASE_URL недостаточно: если bot.database.database уже
+импортирован другим тестом (pytest собирает все файлы в одном процессе),
+запросы уйдут в data/bot.db. use_temp_database() создает отдельный движок
+и подменяет его во всех загруженных модулях bot.*.
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from bot.database import database
+
+
+def use_temp_database(name: str) -> Path:
+    """Переключить приложение на новую временную SQLite БД и вернуть путь к файлу"""
+    db_path = Path(tempfile.mkdtemp()) / name
+    old_engine, old_session = database.engine, database.async_session
+
+    engine = database.build_engine(f"sqlite+aiosqlite:///{db_path}")
+    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    for module_name, module in list(sys.modules.items()):
+        if not module_name.startswith("bot") or module is None:
+            continue
+        if getattr(module, "engine", None) is old_engine:
+            module.engine = engine
+        if getattr(module, "async_session", None) is old_session:
+            module.async_session = async_session
+
+    # Кэши процесса могли заполниться из другой БД
+    from bot.services.question_catalog import question_catalog
+    from bot.services.user_cache import user_cache
+    question_catalog.invalidate()
+    user_cache.clear()
+
+    return db_path
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пула соединений SQLite
+Сравнивает прежний режим (NullPool, журнал по умолчанию) и пул соединений с WAL:
+- накладные расходы на получение соединения (сессия + SELECT 1)
+- пропускную способность параллельных писателей
+"""
+
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Добавляем корневую папку проекта в путь
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from bot.database import database
+from bot.database.database import build_engine
+
+ACQUIRE_ITERATIONS = 300
+WRITERS = 10
+WRITES_PER_WRITER = 30
+
+
+async def run_benchmark(pool_mode: str, tuned: bool) -> dict:
+    """Прогнать бенчмарк на отдельной временной БД"""
+    db_path = Path(tempfile.mkdtemp()) / "bench.db"
+    url = f"sqlite+aiosqlite:///{db_path}"
+
+    if tuned:
+        engine = build_engine(url, pool_mode)
+    else:
+        # Прежняя конфигурация: без PRAGMA, новое соединение на каждую сессию
+        from sqlalchemy.ext.asyncio import create_async_engine
+        from sqlalchemy.pool import NullPool
+        engine = create_async_engine(url, poolclass=NullPool)
+
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        await conn.execute(text("CREATE TABLE bench (id INTEGER PRIMARY KEY, writer INTEGER, value TEXT)"))
+
+    # 1. Получение соединения
+    start = time.perf_counter()
+    for _ in range(ACQUIRE_ITERATIONS):
+        async with session_factory() as session:
+            await session.execute(text("SELECT 1"))
+    acquire_ms = (time.perf_counter() - start) / ACQUIRE_ITERATIONS * 1000
+
+    # 2. Параллельные писатели: каждая запись - отдельная сессия и транзакция
+    errors = []
+
+    async def writer(writer_id: int):
+        for i in range(WRITES_PER_WRITER):
+            try:
+                async with session_factory() as session:
+                    await session.execute(
+                        text("INSERT INTO bench (writer, value) VALUES (:writer, :value)"),
+                        {"writer": writer_id, "value": f"{writer_id}-{i}"}
+                    )
+                    await session.commit()
+            except Exception as e:
+                errors.append(str(e))
+
+    start = time.perf_counter()
+    await asyncio.gather(*[writer(w) for w in range(WRITERS)])
+    write_seconds = time.perf_counter() - start
+
+    async with session_factory() as session:
+        rows = (await session.execute(text("SELECT COUNT(*) FROM bench"))).scalar_one()
+        journal_mode = (await session.execute(text("PRAGMA journal_mode"))).scalar_one()
+
+    await engine.dispose()
+
+    return {
+        "acquire_ms": acquire_ms,
+        "writes_per_sec": rows / write_seconds,
+        "rows": rows,
+        "errors": len(errors),
+        "journal_mode": journal_mode,
+    }
+
+
+def test_db_pool_benchmark():
+    """Пул + WAL должен записывать все строки без ошибок блокировки"""
+
+    print("🧪 Бенчмарк соединений SQLite...")
+
+    baseline = asyncio.run(run_benchmark("null", tuned=False))
+    pooled = asyncio.run(run_benchmark("queue", tuned=True))
+
+    expected_rows = WRITERS * WRITES_PER_WRITER
+    for name, result in (("NullPool (прежний режим)", baseline), ("Пул + PRAGMA", pooled)):
+        print(f"📊 {name}: получение соединения {result['acquire_ms']:.2f} мс, "
+              f"запись {result['writes_per_sec']:.0f} строк/сек, "
+              f"строк {result['rows']}/{expected_rows}, ошибок {result['errors']}, "
+              f"journal_mode={result['journal_mode']}")
+
+    print(f"⚡ Ускорение получения соединения: x{baseline['acquire_ms'] / pooled['acquire_ms']:.1f}")
+    print(f"⚡ Ускорение параллельной записи: x{pooled['writes_per_sec'] / baseline['writes_per_sec']:.1f}")
+
+    assert pooled["errors"] == 0, "Параллельные писатели получили ошибки блокировки"
+    assert pooled["rows"] == expected_rows
+    assert pooled["journal_mode"].lower() == database.SQLITE_JOURNAL_MODE.lower()
+
+
+def main():
+    """Основная функция тестирования"""
+
+    print("🚀 Запуск бенчмарка пула соединений")
+    print("=" * 50)
+
+    test_db_pool_benchmark()
+
+    print("\n" + "=" * 50)
+    print("🎉 Бенчмарк завершен!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Регрессионный тест планов запросов
+Выполняет методы DatabaseService на временной БД, перехватывает отправленный SQL
+и проверяет через EXPLAIN QUERY PLAN, что ни один запрос не читает таблицу целиком.
+"""
+
+import asyncio
+import sqlite3
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Добавляем корневую папку проекта в путь
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from sqlalchemy import event, select
+
+from isolated_db import use_temp_database
+from bot.database import database
+from bot.database.models import Question, QuestionType, User, Payment, PaymentStatus, ReportGenerationStatus
+from bot.services.database_service import db_service
+
+TELEGRAM_ID = 900001
+
+# Путь к временной БД (задается в test_query_plans)
+DB_PATH = None
+
+# Запросы, которым полный проход разрешен намеренно
+ALLOWED_FULL_SCANS = {
+    # Каталог вопросов загружает таблицу целиком один раз
+    "SELECT questions.",
+    # Счетчик для заголовка страницы пользователей в админке (фильтры с OR не индексируются)
+    "SELECT count(users.id) FILTER",
+}
+
+
+def capture_statements():
+    """Подписаться на отправку SQL и вернуть список (sql, parameters)"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().split()[0].upper() in ("SELECT", "UPDATE", "DELETE"):
+            statements.append((statement, parameters))
+
+    event.listen(database.engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    return statements
+
+
+async def seed():
+    """Минимальные данные: вопросы обеих версий, пользователь, платеж"""
+    await database.init_db()
+    async with database.async_session() as session:
+        for number in range(1, 5):
+            session.add(Question(
+                text=f"Вопрос {number}",
+                type=QuestionType.FREE if number <= 2 else QuestionType.PAID,
+                order_number=number,
+                test_version="free" if number <= 2 else "premium"
+            ))
+        await session.commit()
+
+
+async def run_service_queries():
+    """Горячие запросы сервиса и фоновых задач"""
+    user = await db_service.get_or_create_user(telegram_id=TELEGRAM_ID, first_name="Plan")
+    await db_service.start_test(TELEGRAM_ID)
+    await db_service.submit_answer(TELEGRAM_ID, "ответ", "text", None)
+
+    await db_service.get_user_answers(TELEGRAM_ID)
+    await db_service.get_user_answers_by_test_version(TELEGRAM_ID, "free")
+    await db_service.update_user(TELEGRAM_ID, {"special_offer_started_at": datetime.utcnow()})
+
+    payment = await db_service.create_payment(
+        user.id, 100, "RUB", "plan test", "plan-invoice", PaymentStatus.PENDING
+    )
+    await db_service.get_payment_by_invoice_id("plan-invoice")
+    await db_service.get_latest_payment(user.id)
+    await db_service.update_payment_status(payment.id, PaymentStatus.COMPLETED)
+
+    await db_service.update_report_generation_status(TELEGRAM_ID, "free", ReportGenerationStatus.PROCESSING)
+    await db_service.get_report_generation_status(TELEGRAM_ID, "free")
+    await db_service.get_free_reports_count()
+    await db_service.get_premium_reports_count()
+    await db_service.get_report_status_overview("free", limit=20)
+    await db_service.get_report_status_overview("premium", limit=20, offset=20)
+    await db_service.get_latest_report_artifact(TELEGRAM_ID, "free")
+    await db_service.get_report_artifact_by_hash(TELEGRAM_ID, "free", "0" * 64)
+    await db_service.get_analysis_checkpoints(TELEGRAM_ID, "0" * 64)
+    await db_service.get_users_page(filter_premium="yes", filter_free_report="no", limit=5)
+    await db_service.get_users_page(limit=5, after=(user.created_at, user.id))
+    await db_service.get_users_page(limit=5, before=(user.created_at, user.id))
+
+    async with database.async_session() as session:
+        # Фоновая проверка таймеров спецпредложения (web_app)
+        await session.execute(select(User).where(User.special_offer_started_at.isnot(None)))
+        # Пользователи с оплатой (админка)
+        await session.execute(
+            select(Payment.user_id).where(Payment.status == PaymentStatus.COMPLETED).distinct()
+        )
+        await session.execute(
+            select(Payment.user_id).where(
+                Payment.user_id.in_([user.id]),
+                Payment.status == PaymentStatus.COMPLETED
+            )
+        )
+
+    await db_service.clear_user_answers(TELEGRAM_ID)
+
+
+def explain(statement: str, parameters) -> list:
+    """Строки EXPLAIN QUERY PLAN (колонка detail)"""
+    with sqlite3.connect(DB_PATH) as conn:
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ()).fetchall()
+    return [row[-1] for row in rows]
+
+
+def is_full_scan(detail: str) -> bool:
+    """SCAN <таблица> без индекса - полный проход по таблице (SCAN (subquery-N) - проход по результату подзапроса)"""
+    return detail.startswith("SCAN ") and " USING " not in detail and "subquery" not in detail.lower()
+
+
+def test_query_plans():
+    """Запросы сервиса должны использовать индексы"""
+
+    global DB_PATH
+
+    print("🧪 Проверка планов запросов...")
+
+    # Отдельная временная БД, даже если bot.database.database уже импортирован другим тестом
+    DB_PATH = use_temp_database("query_plans.db")
+    statements = capture_statements()
+
+    async def run():
+        await seed()
+        statements.clear()
+        await run_service_queries()
+        await database.engine.dispose()
+
+    asyncio.run(run())
+
+    full_scans = []
+    checked = 0
+    for statement, parameters in statements:
+        if any(statement.lstrip().startswith(prefix) for prefix in ALLOWED_FULL_SCANS):
+            continue
+        checked += 1
+        for detail in explain(statement, parameters):
+            if is_full_scan(detail):
+                full_scans.append((detail, " ".join(statement.split())[:160]))
+
+    print(f"📊 Проверено запросов: {checked}")
+    for detail, statement in full_scans:
+        print(f"❌ {detail}: {statement}")
+
+    assert checked > 0, "Не перехвачено ни одного запроса"
+    assert not full_scans, f"Полный проход таблицы в {len(full_scans)} запросах"
+    print("✅ Все запросы используют индексы")
+
+
+def main():
+    """Основная функция тестирования"""
+
+    print("🚀 Запуск проверки планов запросов")
+    print("=" * 50)
+
+    test_query_plans()
+
+    print("\n" + "=" * 50)
+    print("🎉 Проверка завершена!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Тест повторных попыток очереди отчетов
+Обработчик, завершившийся ошибкой, не должен отмечать задачу выполненной:
+очередь возвращает ее в очередь, пока есть попытки, а затем переводит в FAILED
+и один раз вызывает обработчик окончательной ошибки. Воркер, потерявший аренду,
+не меняет задачу нового владельца; параллельный enqueue не создает дублей.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Добавляем корневую папку проекта в путь
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from isolated_db import use_temp_database
+from bot.database import database
+from bot.database.models import ReportJob, ReportJobStatus
+from bot.services.report_queue import ReportQueueService
+from sqlalchemy import func, select, update
+
+TELEGRAM_ID = 900101
+
+
+async def run_job_until_finished(queue: ReportQueueService, report_type: str):
+    """Поставить задачу на пустой временной БД, дождаться финального статуса и вернуть задачу"""
+    use_temp_database("report_queue.db")
+    await database.init_db()
+
+    job = await queue.enqueue(TELEGRAM_ID, report_type)
+    await queue.start()
+    try:
+        for _ in range(200):
+            job = await queue.get_job(job.id)
+            if job.status in (ReportJobStatus.COMPLETED, ReportJobStatus.FAILED):
+                return job
+            await asyncio.sleep(0.05)
+    finally:
+        await queue.stop()
+        await database.engine.dispose()
+    raise AssertionError(f"Задача {job.id} не завершилась: {job.status.value}")
+
+
+def test_failed_handler_is_retried():
+    """Ошибка обработчика: повтор, затем FAILED с текстом ошибки"""
+
+    print("🧪 Обработчик всегда завершается ошибкой...")
+
+    calls = []
+    final_failures = []
+
+    async def failing_handler(telegram_id: int):
+        # Пока попытки не исчерпаны, окончательной ошибки еще нет
+        assert not final_failures
+        calls.append(telegram_id)
+        raise RuntimeError("AI недоступен")
+
+    async def on_final_failure(telegram_id: int, report_type: str, error: str):
+        final_failures.append((telegram_id, report_type, error))
+
+    async def run():
+        queue = ReportQueueService(workers_count=1, max_attempts=2, poll_seconds=0.05)
+        queue.register_handler("free", failing_handler)
+        queue.register_failure_handler("free", on_final_failure)
+        return await run_job_until_finished(queue, "free")
+
+    job = asyncio.run(run())
+
+    print(f"📊 Вызовов обработчика: {len(calls)}, статус: {job.status.value}, попыток: {job.attempts}")
+    assert len(calls) == 2, "Задача должна быть повторена"
+    assert job.status == ReportJobStatus.FAILED
+    assert job.attempts == 2
+    assert job.error == "AI недоступен"
+    assert final_failures == [(TELEGRAM_ID, "free", "AI недоступен")], "Окончательная ошибка - ровно один раз"
+    print("✅ Задача повторена и завершилась FAILED")
+
+
+def test_retry_succeeds():
+    """Ошибка в первой попытке, успех во второй: COMPLETED"""
+
+    print("🧪 Обработчик падает один раз...")
+
+    calls = []
+
+    async def flaky_handler(telegram_id: int):
+        calls.append(telegram_id)
+        if len(calls) == 1:
+            raise RuntimeError("таймаут AI")
+        return "report.pdf"
+
+    async def run():
+        queue = ReportQueueService(workers_count=1, max_attempts=2, poll_seconds=0.05)
+        queue.register_handler("premium", flaky_handler)
+        return await run_job_until_finished(queue, "premium")
+
+    job = asyncio.run(run())
+
+    print(f"📊 Вызовов обработчика: {len(calls)}, статус: {job.status.value}, попыток: {job.attempts}")
+    assert len(calls) == 2
+    assert job.status == ReportJobStatus.COMPLETED
+    print("✅ Повторная попытка выполнила задачу")
+
+
+def test_lost_lease_does_not_touch_new_owner():
+    """Аренду забрал другой воркер: обработчик остановлен, задача остается за новым владельцем"""
+
+    print("🧪 Потеря аренды во время выполнения...")
+
+    cancelled = []
+
+    async def slow_handler(telegram_id: int):
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            cancelled.append(telegram_id)
+            raise
+
+    async def run():
+        use_temp_database("report_queue.db")
+        await database.init_db()
+
+        queue = ReportQueueService(workers_count=1, heartbeat_seconds=0.1, max_attempts=2, poll_seconds=0.05)
+        queue.register_handler("free", slow_handler)
+        job = await queue.enqueue(TELEGRAM_ID, "free")
+        await queue.start()
+        try:
+            for _ in range(100):
+                job = await queue.get_job(job.id)
+                if job.status == ReportJobStatus.RUNNING:
+                    break
+                await asyncio.sleep(0.02)
+            # Задачу перехватывает воркер другого процесса
+            async with database.async_session() as session:
+                await session.execute(update(ReportJob).where(ReportJob.id == job.id).values(worker_id="other:0"))
+                await session.commit()
+            for _ in range(100):
+                if cancelled:
+                    break
+                await asyncio.sleep(0.02)
+
+            # Переходы от имени старого владельца не применяются
+            assert not await queue.complete(job.id, "stale:0")
+            assert not await queue.fail(job.id, "stale:0", "ошибка")
+            return await queue.get_job(job.id)
+        finally:
+            await queue.stop()
+            await database.engine.dispose()
+
+    job = asyncio.run(run())
+
+    print(f"📊 Обработчик остановлен: {bool(cancelled)}, статус: {job.status.value}, воркер: {job.worker_id}")
+    assert cancelled, "Обработчик должен быть остановлен после потери аренды"
+    assert job.status == ReportJobStatus.RUNNING
+    assert job.worker_id == "other:0"
+    print("✅ Задача нового владельца не изменена")
+
+
+def test_concurrent_enqueue():
+    """Параллельная постановка одной задачи: одна активная задача на пользователя и тип"""
+
+    print("🧪 Параллельный enqueue...")
+
+    async def run():
+        use_temp_database("report_queue.db")
+        await database.init_db()
+        try:
+            queue = ReportQueueService(workers_count=1)
+            jobs = list(await asyncio.gather(*[queue.enqueue(TELEGRAM_ID, "free") for _ in range(5)]))
+
+            # Гонка: проверка не видит задачу, которую параллельный запрос уже записал
+            get_active_job = queue._get_active_job
+            lookups = []
+
+            async def stale_first_lookup(session, telegram_id, report_type):
+                lookups.append(report_type)
+                if len(lookups) == 1:
+                    return None
+                return await get_active_job(session, telegram_id, report_type)
+
+            queue._get_active_job = stale_first_lookup
+            jobs.append(await queue.enqueue(TELEGRAM_ID, "free"))
+            assert len(lookups) == 2, "Повторный поиск после IntegrityError"
+            async with database.async_session() as session:
+                count = (await session.execute(select(func.count(ReportJob.id)))).scalar_one()
+            return {job.id for job in jobs}, count
+        finally:
+            await database.engine.dispose()
+
+    job_ids, count = asyncio.run(run())
+
+    print(f"📊 Разных задач: {len(job_ids)}, строк в report_jobs: {count}")
+    assert len(job_ids) == 1
+    assert count == 1
+    print("✅ Дублей нет")
+
+
+def main():
+    """Основная функция тестирования"""
+
+    print("🚀 Запуск теста повторных попыток очереди отчетов")
+    print("=" * 50)
+
+    test_failed_handler_is_retried()
+    test_retry_succeeds()
+    test_lost_lease_does_not_touch_new_owner()
+    test_concurrent_enqueue()
+
+    print("\n" + "=" * 50)
+    print("🎉 Тест завершен!")
+
+
+if __name__ == "__main__":
+    main()